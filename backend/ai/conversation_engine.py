@@ -59,16 +59,8 @@ class ConversationEngine:
         return response
     
     def get_active_players(self):
-        now = time.time()
-        active = []
-        for name, data in self.memory.player_memories.items():
-            # Filter by server if set
-            if self.server_name:
-                if not data.get("server") == self.server_name:
-                    continue
-            if now - data.get("last_seen", 0) < 300:
-                active.append(data.get("name", name))
-        return active
+        players = self.memory.get_active_players(self.server_name)
+        return [data.get("name") for data in players]
 
 
 conversation_engine = ConversationEngine()
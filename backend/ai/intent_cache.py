@@ -0,0 +1,151 @@
+import copy
+import json
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+
+PLAYER_TOKEN = "{player}"
+
+_PUNCTUATION = re.compile(r"[!?.,;]+$")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _name_pattern(player_name):
+    return re.compile(rf"(?<![A-Za-z0-9_]){re.escape(player_name)}(?![A-Za-z0-9_])", re.IGNORECASE)
+
+
+def _replace_strings(value, fn):
+    if isinstance(value, str):
+        return fn(value)
+    if isinstance(value, dict):
+        return {k: _replace_strings(v, fn) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_replace_strings(v, fn) for v in value]
+    return value
+
+
+class IntentCache:
+    """
+    LRU + TTL cache for AI intent parses:
+    - Keyed by the pronoun-resolved message with the speaker's name abstracted,
+      plus the command catalog fingerprint (new plugins/mods invalidate old answers)
+      and the coarse world state the answer may depend on (weather, time of day).
+    - Stored results are player-neutral; the speaker's name is put back on lookup.
+    - Persisted to disk (at most every save_interval seconds) so restarts start warm.
+    """
+
+    def __init__(self, path, max_entries=1000, ttl=86400, save_interval=30):
+        self.path = path
+        self.max_entries = max(1, int(max_entries))
+        self.ttl = ttl
+        self.save_interval = save_interval
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._dirty = False
+        self._last_save = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expired = 0
+        self._load()
+
+    def make_key(self, resolved_message, player_name, fingerprint, world=None):
+        text = _WHITESPACE.sub(" ", (resolved_message or "").lower()).strip()
+        text = _PUNCTUATION.sub("", text).strip()
+        if player_name:
+            text = _name_pattern(player_name).sub(PLAYER_TOKEN, text)
+        return f"{fingerprint or '-'}|{world or '-'}|{text}"
+
+    def get(self, key, player_name):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if self.ttl and now - entry["time"] > self.ttl:
+                del self._entries[key]
+                self._dirty = True
+                self.expired += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            result = copy.deepcopy(entry["result"])
+        if player_name:
+            result = _replace_strings(result, lambda s: s.replace(PLAYER_TOKEN, player_name))
+        result["cached"] = True
+        return result
+
+    def put(self, key, result, player_name):
+        if not isinstance(result, dict):
+            return
+        stored = copy.deepcopy(result)
+        stored.pop("raw", None)
+        if player_name:
+            pattern = _name_pattern(player_name)
+            stored = _replace_strings(stored, lambda s: pattern.sub(PLAYER_TOKEN, s))
+        with self._lock:
+            self._entries[key] = {"result": stored, "time": time.time()}
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+            self._dirty = True
+        self.save()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._dirty = True
+        self.save(force=True)
+
+    def save(self, force=False):
+        with self._lock:
+            if not self._dirty:
+                return
+            if not force and time.time() - self._last_save < self.save_interval:
+                return
+            snapshot = list(self._entries.items())
+            self._dirty = False
+            self._last_save = time.time()
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump({"entries": snapshot}, f)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f"[IntentCache] Save failed: {e}")
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            now = time.time()
+            for key, entry in data.get("entries", []):
+                if self.ttl and now - entry.get("time", 0) > self.ttl:
+                    continue
+                self._entries[key] = entry
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        except Exception as e:
+            print(f"[IntentCache] Load failed: {e}")
+
+    def get_stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+                "evictions": self.evictions,
+                "expired": self.expired
+            }
@@ -6,6 +6,8 @@ import difflib
 from core.gateway import gateway
 from core.memory_engine import memory_engine
 from engine.command_catalog import command_catalog
+from ai.intent_cache import IntentCache
+from ai.item_index import ItemIndex, read_jar_items, jar_signature
 
 
 COMMON_ITEMS = [
@@ -90,6 +92,19 @@ COMMON_ITEMS = [
 ]
 
 
+def _get_current_profile_path():
+    try:
+        data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
+        config_path = os.path.join(data_dir, "current_profile.json")
+        if os.path.exists(config_path):
+            with open(config_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+                return data.get("path")
+    except Exception:
+        pass
+    return None
+
+
 class ItemResolver:
     """AI-powered item resolver that finds the best Minecraft item match"""
     
@@ -97,6 +112,45 @@ class ItemResolver:
         self.gateway = gateway
         self.common_items = COMMON_ITEMS
         self._item_cache = {}
+        # Vanilla index is built once; the active profile's mod items are layered on a copy
+        self._base_index = ItemIndex()
+        for item in self.common_items:
+            self._base_index.add_item(item)
+        for alias, item in ITEM_MAP.items():
+            self._base_index.add_alias(alias, item)
+        self.index = self._base_index
+        self._mods_signature = ()
+        self._mods_checked = 0
+        self._mods_check_interval = 10
+        self._jar_items = {}
+    
+    def _refresh_mod_items(self):
+        now = time.time()
+        if now - self._mods_checked < self._mods_check_interval:
+            return
+        self._mods_checked = now
+        profile_path = _get_current_profile_path()
+        mods_dir = os.path.join(profile_path, "mods") if profile_path else None
+        signature = jar_signature(mods_dir)
+        if signature == self._mods_signature:
+            return
+        index = self._base_index.copy()
+        jar_items = {}
+        for name, mtime, size in signature:
+            key = (name, mtime, size)
+            # Jars that didn't change since the last scan are not reopened
+            items = self._jar_items.get(key)
+            if items is None:
+                items = read_jar_items(os.path.join(mods_dir, name))
+            jar_items[key] = items
+            for item_id, display_name in items:
+                index.add_item(item_id, [display_name] if display_name else ())
+        self._jar_items = jar_items
+        self._mods_signature = signature
+        self.index = index
+        self._item_cache = {}
+        if signature:
+            print(f"[ItemResolver] Indexed {len(index) - len(self._base_index)} modded items from {len(signature)} jars")
     
     def resolve(self, user_text):
         """
@@ -106,6 +160,7 @@ class ItemResolver:
         if not user_text:
             return None
         
+        self._refresh_mod_items()
         user_text_lower = user_text.lower().strip().replace("netharite", "netherite")
         user_text_lower = self._normalize_item_text(user_text_lower)
         
@@ -113,11 +168,11 @@ class ItemResolver:
         if user_text_lower in self._item_cache:
             return self._item_cache[user_text_lower]
         
-        # First try exact match in common items
-        for item in self.common_items:
-            if item.replace("_", " ") == user_text_lower or item == user_text_lower.replace(" ", "_"):
-                self._item_cache[user_text_lower] = item
-                return item
+        # First try exact match on item ids, names and aliases
+        item = self.index.exact(user_text_lower)
+        if item:
+            self._item_cache[user_text_lower] = item
+            return item
 
         # Fuzzy local match for misspellings/aliases
         fuzzy = self._resolve_fuzzy_local(user_text_lower)
@@ -199,19 +254,8 @@ Return ONLY the item ID (e.g., "golden_apple"), nothing else. If unsure, return
     def _resolve_fuzzy_local(self, normalized_text):
         if not normalized_text:
             return None
-        candidates = {}
-        for item in self.common_items:
-            candidates[item] = item
-            candidates[item.replace("_", " ")] = item
-        keys = list(candidates.keys())
         # Use permissive threshold so minor spelling errors still map.
-        match = difflib.get_close_matches(normalized_text, keys, n=1, cutoff=0.72)
-        if match:
-            return candidates[match[0]]
-        return None
-
-
-item_resolver = ItemResolver()
+        return self.index.fuzzy(normalized_text, cutoff=0.72)
 
 INTENT_SYSTEM_PROMPT = """You are a Minecraft command intent parser. Analyze player messages and extract the intended command.
 
@@ -364,6 +408,33 @@ MOB_MAP = {
     "snow_golem": "snow_golem",
 }
 
+# SIMPLE_PATTERNS compiled once, searched in table order. Kept as separate patterns rather
+# than one alternation: each keeps its literal-prefix scan, which is what makes the common
+# case (chat that matches nothing) cheap; see benchmarks/intent_patterns.py.
+_SIMPLE_COMPILED = [(re.compile(pattern), result) for pattern, result in SIMPLE_PATTERNS.items()]
+
+_GIVE_RE = re.compile(r"\b(give|gimme)\b")
+_GIVE_PREFIX_RE = re.compile(r"^(give me|give|gimme)\s+", re.IGNORECASE)
+_GIVE_SPLIT_RE = re.compile(r"\s+and\s+|,\s*")
+_ARTICLE_RE = re.compile(r"^(a|an|the|some)\s+", re.IGNORECASE)
+_AMOUNT_RE = re.compile(r"(\d+)\s+(.+)")
+_GIVE_AMOUNT_RE = re.compile(r"(\d+)\s+(?:of\s+)?(?:the\s+)?(?:a\s+)?(?:some\s+)?(.+)", re.IGNORECASE)
+_SUMMON_AMOUNT_RE = re.compile(r"(\d+)\s+(?:of\s+)?(.+)", re.IGNORECASE)
+_TP_RE = re.compile(r"(tp|teleport|warp)\s+(me\s+)?(to\s+)?(.+?)(?:\s*$|\s+please)")
+_GO_TO_RE = re.compile(r"(go\s+to|travel\s+to|take\s+me\s+to|find\s+me\s+the|take me to)")
+_GO_TO_DEST_RE = re.compile(r"(go\s+to|travel\s+to|take\s+me\s+to|find\s+me\s+the)\s+(.+?)(?:\s*$|\s+please)")
+_LOCATE_RE = re.compile(r"\b(where is|nearest|closest|locate)\b")
+GIVE_KEYWORDS = ("give", "spawn", "want", "need", "get", "receive", "have", "can i get", "i want", "i need", "gimme", "summon", "create")
+SUMMON_KEYWORDS = ("spawn", "summon", "create", "make")
+_STRUCTURE_KEYS = list(STRUCTURE_MAP.keys())
+# Context fields that differ per player and moment; intent parses drawing on them aren't cached
+LIVE_CONTEXT_FIELDS = ("online_players", "mobs_near_players", "structures_near", "recent_events")
+# Player names and resource ids; the "minecraft" namespace tells nothing about where a value came from
+_CONTEXT_TOKEN = re.compile(r"\b(?!minecraft\b)[a-z0-9_]{3,}")
+_STRUCTURE_KEYS_LONGEST = sorted(_STRUCTURE_KEYS, key=len, reverse=True)
+
+item_resolver = ItemResolver()
+
 
 class IntentEngine:
     def __init__(self):
@@ -372,6 +443,12 @@ class IntentEngine:
         self._commands_cache = None
         self._commands_cache_time = 0
         self._commands_cache_ttl = 10
+        ai_config = self.gateway.ai_config
+        self.ai_cache = IntentCache(
+            os.path.join(os.path.dirname(os.path.dirname(__file__)), "data", "intent_cache.json"),
+            max_entries=ai_config.get("intent_cache_size", 1000),
+            ttl=ai_config.get("intent_cache_ttl", 86400)
+        )
     
     def parse(self, message, player_name, context=None):
         message_lower = message.lower().strip()
@@ -397,7 +474,18 @@ class IntentEngine:
             pattern_result.setdefault("raw", message)
             return pattern_result
         
-        result = self._parse_with_ai(message, player_name, context or {})
+        # Repeated requests ("make it day") skip the LLM round trip
+        context = context or {}
+        world = f"{context.get('weather', '-')}/{context.get('time', '-')}"
+        cache_key = self.ai_cache.make_key(resolved_message, player_name, command_catalog.get_fingerprint(), world)
+        result = self.ai_cache.get(cache_key, player_name)
+        if result is None:
+            result = self._parse_with_ai(message, player_name, context)
+            if (
+                isinstance(result, dict) and result.get("intent") != "error"
+                and not self._uses_live_context(result, resolved_message, context)
+            ):
+                self.ai_cache.put(cache_key, result, player_name)
         if isinstance(result, dict):
             result.setdefault("raw", message)
         if result and result.get("intent") in ["none", "unknown"]:
@@ -412,6 +500,33 @@ class IntentEngine:
                 }
         return result
     
+    def _uses_live_context(self, result, resolved_message, context):
+        """
+        Whether the parse took a parameter from the live parts of the context (who is online,
+        nearby mobs and structures, recent events) rather than from the message: replaying it
+        for another player or moment would act on stale targets.
+        """
+        live = set()
+
+        def collect(value, into):
+            if isinstance(value, str):
+                into.update(_CONTEXT_TOKEN.findall(value.lower()))
+            elif isinstance(value, dict):
+                for k, v in value.items():
+                    collect(k, into)
+                    collect(v, into)
+            elif isinstance(value, list):
+                for v in value:
+                    collect(v, into)
+
+        for field in LIVE_CONTEXT_FIELDS:
+            collect(context.get(field), live)
+        if not live:
+            return False
+        params = set()
+        collect(result.get("parameters"), params)
+        return bool((params & live) - set(_CONTEXT_TOKEN.findall(resolved_message.lower())))
+
     def _resolve_pronouns(self, message, player_name, last_target):
         # Avoid breaking teleport-style commands by injecting player name into destination
         if not re.search(r"\b(tp|teleport|warp|take me to|go to|travel to|find me the)\b", message):
@@ -502,28 +617,30 @@ class IntentEngine:
     
     def _try_patterns(self, message):
         # Simple patterns first
-        for pattern, result in SIMPLE_PATTERNS.items():
-            if re.search(pattern, message):
+        for pattern, result in _SIMPLE_COMPILED:
+            if pattern.search(message):
                 return {
                     "intent": result["intent"],
-                    "parameters": result["params"],
+                    "parameters": dict(result["params"]),
                     "confidence": 0.9,
                     "source": "pattern"
                 }
         
+        message_lower = message.lower()
+        
         # Multi-item give patterns (e.g., "give me a pickaxe and a sword")
-        if re.search(r"\b(give|gimme)\b", message):
-            cleaned = re.sub(r"^(give me|give|gimme)\s+", "", message, flags=re.IGNORECASE).strip()
+        if _GIVE_RE.search(message):
+            cleaned = _GIVE_PREFIX_RE.sub("", message).strip()
             if " and " in cleaned or "," in cleaned:
-                parts = re.split(r"\s+and\s+|,\s*", cleaned)
+                parts = _GIVE_SPLIT_RE.split(cleaned)
                 items = []
                 for part in parts:
                     part = part.strip()
                     if not part:
                         continue
-                    part = re.sub(r"^(a|an|the|some)\s+", "", part, flags=re.IGNORECASE).strip()
+                    part = _ARTICLE_RE.sub("", part).strip()
                     amount = 1
-                    amt_match = re.match(r"(\d+)\s+(.+)", part)
+                    amt_match = _AMOUNT_RE.match(part)
                     if amt_match:
                         amount = min(int(amt_match.group(1)), 64)
                         part = amt_match.group(2).strip()
@@ -539,16 +656,15 @@ class IntentEngine:
                     }
         
         # For give/spawn requests, try AI resolver for better item matching
-        give_keywords = ["give", "spawn", "want", "need", "get", "receive", "have", "can i get", "i want", "i need", "gimme", "summon", "create"]
-        if any(kw in message.lower() for kw in give_keywords):
+        if any(kw in message_lower for kw in GIVE_KEYWORDS):
             # Check for amount
             amount = 1
-            num_match = re.search(r"(\d+)\s+(?:of\s+)?(?:the\s+)?(?:a\s+)?(?:some\s+)?(.+)", message, re.IGNORECASE)
+            num_match = _GIVE_AMOUNT_RE.search(message)
             if num_match:
                 amount = min(int(num_match.group(1)), 64)
-            elif "some" in message.lower() or "a " in message.lower():
+            elif "some" in message_lower or "a " in message_lower:
                 amount = 5
-            elif "many" in message.lower() or "lots" in message.lower():
+            elif "many" in message_lower or "lots" in message_lower:
                 amount = 32
             
             # Resolve item phrase (not the whole sentence) and tolerate misspellings.
@@ -563,10 +679,10 @@ class IntentEngine:
                 }
         
         # Summon - use AI for entity resolution
-        if any(kw in message.lower() for kw in ["spawn", "summon", "create", "make"]):
+        if any(kw in message_lower for kw in SUMMON_KEYWORDS):
             # Check for amount
             amount = 1
-            num_match = re.search(r"(\d+)\s+(?:of\s+)?(.+)", message, re.IGNORECASE)
+            num_match = _SUMMON_AMOUNT_RE.search(message)
             if num_match and num_match.group(1).isdigit():
                 amount = min(int(num_match.group(1)), 20)
             
@@ -581,7 +697,7 @@ class IntentEngine:
                 }
         
         # Teleport patterns
-        tp_match = re.search(r"(tp|teleport|warp)\s+(me\s+)?(to\s+)?(.+?)(?:\s*$|\s+please)", message)
+        tp_match = _TP_RE.search(message)
         if tp_match:
             destination = tp_match.group(4).strip() if tp_match.group(4) else None
             if destination:
@@ -594,8 +710,8 @@ class IntentEngine:
             }
         
         # Location keywords
-        if re.search(r"(go\s+to|travel\s+to|take\s+me\s+to|find\s+me\s+the|take me to)", message):
-            dest_match = re.search(r"(go\s+to|travel\s+to|take\s+me\s+to|find\s+me\s+the)\s+(.+?)(?:\s*$|\s+please)", message)
+        if _GO_TO_RE.search(message):
+            dest_match = _GO_TO_DEST_RE.search(message)
             if dest_match:
                 destination = self._clean_destination(dest_match.group(2).strip(), player_name)
                 return {
@@ -605,9 +721,11 @@ class IntentEngine:
                     "source": "pattern"
                 }
         
+        # Both the locate and structure checks below use the same fuzzy lookup
+        fuzzy_structure = self._resolve_structure_fuzzy(message)
+        
         # Locate requests (where is/nearest/closest)
-        if re.search(r"\b(where is|nearest|closest|locate)\b", message):
-            fuzzy_structure = self._resolve_structure_fuzzy(message)
+        if _LOCATE_RE.search(message):
             if fuzzy_structure:
                 return {
                     "intent": "locate",
@@ -615,7 +733,7 @@ class IntentEngine:
                     "confidence": 0.88,
                     "source": "pattern"
                 }
-            for struct_name in STRUCTURE_MAP.keys():
+            for struct_name in _STRUCTURE_KEYS:
                 if struct_name in message:
                     return {
                         "intent": "locate",
@@ -625,7 +743,6 @@ class IntentEngine:
                     }
         
         # Structure names
-        fuzzy_structure = self._resolve_structure_fuzzy(message)
         if fuzzy_structure:
             return {
                 "intent": "teleport",
@@ -633,7 +750,7 @@ class IntentEngine:
                 "confidence": 0.85,
                 "source": "pattern"
             }
-        for struct_name, struct_id in STRUCTURE_MAP.items():
+        for struct_name in _STRUCTURE_KEYS:
             if struct_name in message:
                 return {
                     "intent": "teleport",
@@ -672,9 +789,9 @@ class IntentEngine:
         if not tokens:
             return None
         text = " ".join(tokens)
-        keys = list(STRUCTURE_MAP.keys())
+        keys = _STRUCTURE_KEYS
         # Prefer explicit key containment first (specific phrases like "desert village").
-        for key in sorted(keys, key=len, reverse=True):
+        for key in _STRUCTURE_KEYS_LONGEST:
             if key in text:
                 return key
         m = difflib.get_close_matches(text, keys, n=1, cutoff=0.72)
@@ -778,16 +895,7 @@ Return JSON:"""
         return commands
 
     def _get_current_profile_path(self):
-        try:
-            data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
-            config_path = os.path.join(data_dir, "current_profile.json")
-            if os.path.exists(config_path):
-                with open(config_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    return data.get("path")
-        except Exception:
-            pass
-        return None
+        return _get_current_profile_path()
 
 
 intent_engine = IntentEngine()
@@ -0,0 +1,152 @@
+import heapq
+import json
+import os
+import re
+import zipfile
+from collections import Counter, defaultdict
+from difflib import SequenceMatcher
+
+_LANG_FILE = re.compile(r"^assets/([a-z0-9_.-]+)/lang/en_us\.json$")
+_LANG_KEY = re.compile(r"^(?:item|block)\.([a-z0-9_.-]+)\.([a-z0-9_/]+)$")
+
+
+def _trigrams(text):
+    padded = f"  {text} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class ItemIndex:
+    """
+    Prebuilt lookup for item names:
+    - exact: phrase -> item id ("golden apple", "golden_apple", "mod:id", aliases, display names)
+    - trigram inverted index over the spaced phrases ("golden apple") for typo-tolerant lookups
+    First registration of a phrase wins, so vanilla names are never shadowed by mods.
+    """
+
+    def __init__(self, max_candidates=25):
+        self.max_candidates = max_candidates
+        self._exact = {}
+        self._phrases = []
+        self._grams = []
+        self._postings = defaultdict(list)
+        self.item_ids = []
+        self._known = set()
+
+    def __len__(self):
+        return len(self.item_ids)
+
+    def copy(self):
+        clone = ItemIndex(self.max_candidates)
+        clone._exact = dict(self._exact)
+        clone._phrases = list(self._phrases)
+        clone._grams = list(self._grams)
+        clone._postings = defaultdict(list, {gram: list(ids) for gram, ids in self._postings.items()})
+        clone.item_ids = list(self.item_ids)
+        clone._known = set(self._known)
+        return clone
+
+    def _add_phrase(self, phrase, item_id, fuzzy=True):
+        phrase = phrase.strip().lower()
+        if not phrase or phrase in self._exact:
+            return
+        self._exact[phrase] = item_id
+        if not fuzzy or "_" in phrase or ":" in phrase:
+            # Underscored/namespaced forms are exact-only; their spaced twin is indexed
+            return
+        index = len(self._phrases)
+        grams = _trigrams(phrase)
+        self._phrases.append(phrase)
+        self._grams.append(len(grams))
+        for gram in grams:
+            self._postings[gram].append(index)
+
+    def add_item(self, item_id, names=()):
+        item_id = item_id.lower()
+        if item_id not in self._known:
+            self._known.add(item_id)
+            self.item_ids.append(item_id)
+        short = item_id.split(":", 1)[-1]
+        self._add_phrase(short.replace("_", " "), item_id)
+        self._add_phrase(short, item_id)
+        self._add_phrase(item_id, item_id)
+        for name in names:
+            self._add_phrase(name, item_id)
+
+    def add_alias(self, alias, item_id):
+        self._add_phrase(alias.replace("_", " "), item_id.lower())
+
+    def exact(self, text):
+        if not text:
+            return None
+        text = text.strip().lower()
+        return self._exact.get(text) or self._exact.get(text.replace(" ", "_"))
+
+    def fuzzy(self, text, cutoff=0.72):
+        """Closest phrase by difflib ratio, scoring only the phrases sharing the most trigrams"""
+        if not text:
+            return None
+        text = text.strip().lower().replace("_", " ")
+        grams = _trigrams(text)
+        counts = Counter()
+        for gram in grams:
+            postings = self._postings.get(gram)
+            if postings:
+                counts.update(postings)
+        if not counts:
+            return None
+        # Dice coefficient on trigrams ranks candidates; difflib picks the winner like before
+        size = len(grams)
+        lengths = self._grams
+        ranked = heapq.nlargest(self.max_candidates, counts.items(), key=lambda kv: kv[1] / (size + lengths[kv[0]]))
+        matcher = SequenceMatcher()
+        matcher.set_seq2(text)
+        best = None
+        best_ratio = cutoff
+        for index, _ in ranked:
+            matcher.set_seq1(self._phrases[index])
+            if matcher.real_quick_ratio() < best_ratio or matcher.quick_ratio() < best_ratio:
+                continue
+            ratio = matcher.ratio()
+            if ratio > best_ratio or (best is None and ratio >= best_ratio):
+                best, best_ratio = index, ratio
+        if best is None:
+            return None
+        return self._exact[self._phrases[best]]
+
+
+def read_jar_items(jar_path):
+    """(item id, display name) pairs from a mod jar's en_us lang files"""
+    items = []
+    try:
+        with zipfile.ZipFile(jar_path) as jar:
+            for entry in jar.namelist():
+                lang = _LANG_FILE.match(entry)
+                if not lang:
+                    continue
+                try:
+                    data = json.loads(jar.read(entry).decode("utf-8", errors="ignore"))
+                except ValueError:
+                    continue
+                for key, name in data.items():
+                    match = _LANG_KEY.match(key)
+                    if match and match.group(1) == lang.group(1):
+                        items.append((f"{match.group(1)}:{match.group(2)}", name if isinstance(name, str) else None))
+    except (OSError, zipfile.BadZipFile):
+        pass
+    return items
+
+
+def jar_signature(mods_dir):
+    """Tuple of (name, mtime, size) for every jar in mods_dir; changes when mods are added/removed"""
+    if not mods_dir or not os.path.isdir(mods_dir):
+        return ()
+    signature = []
+    for name in sorted(os.listdir(mods_dir)):
+        if not name.lower().endswith(".jar"):
+            continue
+        try:
+            st = os.stat(os.path.join(mods_dir, name))
+        except OSError:
+            continue
+        signature.append((name, st.st_mtime, st.st_size))
+    return tuple(signature)
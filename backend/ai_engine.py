@@ -309,7 +309,9 @@ class MC_AI:
             "mode": self.mode,
             "ai_name": self.ai_name,
             "personality": self.personality_engine.get_personality(),
-            "available_personalities": self.personality_engine.get_available_personalities()
+            "available_personalities": self.personality_engine.get_available_personalities(),
+            "http": self.gateway.get_http_stats(),
+            "intent_cache": self.intent_engine.ai_cache.get_stats()
         }
     
     def set_mode(self, mode):
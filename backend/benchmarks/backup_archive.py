@@ -0,0 +1,139 @@
+"""
+Archive throughput: ParallelZipWriter against zipfile.ZipFile(ZIP_DEFLATED), the writer
+backups used before it.
+
+Builds a synthetic server folder shaped like a real one: region files holding
+zlib-compressed chunks in 4 KiB sectors, gzipped level.dat and playerdata, JSON stats and
+advancements, and plain-text logs. Every archive is read back and CRC-checked.
+
+    cd backend && python -m benchmarks.backup_archive [--mb 256] [--workers 1,2,4]
+"""
+import argparse
+import gzip
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+import zipfile
+import zlib
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from integrations.backup_archive import ParallelZipWriter
+
+SECTOR = 4096
+REGION_SIZE = 8 * 1024 * 1024
+
+
+def _chunk_nbt(rng):
+    """Bytes standing in for a chunk's NBT: repetitive palettes plus noisy light and heightmaps"""
+    palette = b"".join(rng.choice([b"minecraft:stone", b"minecraft:deepslate", b"minecraft:air", b"minecraft:dirt"]) for _ in range(64))
+    noise = rng.randbytes(rng.randint(2048, 6144))
+    return palette * rng.randint(20, 60) + noise
+
+
+def _write_region(path, rng):
+    with open(path, "wb") as f:
+        f.write(rng.randbytes(2 * SECTOR))  # location and timestamp tables
+        written = 2 * SECTOR
+        while written < REGION_SIZE:
+            packed = zlib.compress(_chunk_nbt(rng))
+            sectors = (len(packed) + 5 + SECTOR - 1) // SECTOR
+            record = len(packed).to_bytes(4, "big") + b"\x02" + packed
+            f.write(record.ljust(sectors * SECTOR, b"\x00"))
+            written += sectors * SECTOR
+
+
+def build_world(root, total_mb, seed=11):
+    """Create the synthetic server folder; returns its file count and byte size"""
+    rng = random.Random(seed)
+    regions = max(1, total_mb * 1024 * 1024 * 9 // 10 // REGION_SIZE)
+    for dimension, share in (("world/region", 0.7), ("world_nether/DIM-1/region", 0.2), ("world_the_end/DIM1/region", 0.1)):
+        os.makedirs(os.path.join(root, dimension), exist_ok=True)
+        for i in range(max(1, int(regions * share))):
+            _write_region(os.path.join(root, dimension, f"r.{i % 8 - 4}.{i // 8 - 4}.mca"), rng)
+    for folder in ("world/playerdata", "world/stats", "world/advancements", "logs"):
+        os.makedirs(os.path.join(root, folder), exist_ok=True)
+    with gzip.open(os.path.join(root, "world", "level.dat"), "wb") as f:
+        f.write(_chunk_nbt(rng))
+    for i in range(40):
+        uuid = f"{rng.getrandbits(128):032x}"
+        with gzip.open(os.path.join(root, "world", "playerdata", f"{uuid}.dat"), "wb") as f:
+            f.write(_chunk_nbt(rng))
+        stats = {"stats": {"minecraft:mined": {f"minecraft:block_{n}": rng.randint(0, 9999) for n in range(300)}}}
+        with open(os.path.join(root, "world", "stats", f"{uuid}.json"), "w") as f:
+            json.dump(stats, f, indent=2)
+        advancements = {f"minecraft:story/step_{n}": {"criteria": {"done": "2026-01-01 00:00:00 +0000"}, "done": True} for n in range(120)}
+        with open(os.path.join(root, "world", "advancements", f"{uuid}.json"), "w") as f:
+            json.dump(advancements, f, indent=2)
+    with open(os.path.join(root, "logs", "latest.log"), "w") as f:
+        for n in range(200000):
+            f.write(f"[12:{n // 3600 % 60:02d}:{n % 60:02d}] [Server thread/INFO]: Player{n % 40} issued server command: /home {n % 7}\n")
+
+    files, size = 0, 0
+    for dirpath, _, filenames in os.walk(root):
+        for name in filenames:
+            files += 1
+            size += os.path.getsize(os.path.join(dirpath, name))
+    return files, size
+
+
+def _world_files(root):
+    for dirpath, _, filenames in os.walk(root):
+        for name in sorted(filenames):
+            path = os.path.join(dirpath, name)
+            yield path, os.path.relpath(path, root)
+
+
+def archive_zipfile(root, output):
+    with zipfile.ZipFile(output, "w", zipfile.ZIP_DEFLATED) as zf:
+        for path, rel in _world_files(root):
+            zf.write(path, rel)
+
+
+def archive_parallel(root, output, workers):
+    with open(output, "wb") as fh, ParallelZipWriter(fh, workers=workers) as writer:
+        for path, rel in _world_files(root):
+            writer.add_file(path, rel)
+
+
+def _verify(output):
+    with zipfile.ZipFile(output) as zf:
+        return zf.testzip() is None
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--mb", type=int, default=256, help="approximate world size")
+    parser.add_argument("--workers", default=None, help="comma separated worker counts (default 1 and the CPU count)")
+    args = parser.parse_args()
+    cpus = os.cpu_count() or 1
+    workers = [int(w) for w in args.workers.split(",")] if args.workers else sorted({1, cpus})
+
+    workdir = tempfile.mkdtemp()
+    try:
+        root = os.path.join(workdir, "server")
+        files, size = build_world(root, args.mb)
+        print(f"{files} files, {size / 1024 / 1024:.0f} MB, {cpus} CPUs")
+        print(f"{'writer':<22} {'seconds':>8} {'MB/s':>7} {'ratio':>6} {'valid':>6}")
+        runs = [("zipfile", lambda out: archive_zipfile(root, out))]
+        runs += [(f"parallel workers={w}", lambda out, w=w: archive_parallel(root, out, w)) for w in workers]
+        for label, run in runs:
+            output = os.path.join(workdir, "out.zip")
+            started = time.perf_counter()
+            run(output)
+            seconds = time.perf_counter() - started
+            print(
+                f"{label:<22} {seconds:>8.2f} {size / seconds / 1024 / 1024:>7.1f} "
+                f"{os.path.getsize(output) / size:>6.3f} {'yes' if _verify(output) else 'NO':>6}"
+            )
+            os.remove(output)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
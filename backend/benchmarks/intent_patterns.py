@@ -0,0 +1,85 @@
+"""
+Per-message cost of the SIMPLE_PATTERNS stage of IntentEngine._try_patterns.
+
+Runs the chat lines in fixtures/chat_corpus.txt (commands and ordinary chat) through three
+ways of finding the first matching table entry, and checks they all pick the same one:
+- loop: re.search(pattern, message) per entry, the original code
+- alternation: one named-group alternation over the table, then the entries ahead of the
+  hit; tried before the current code, and slowest on chat that matches nothing
+- compiled: the precompiled patterns in table order, what _try_patterns does now
+
+    cd backend && python -m benchmarks.intent_patterns [rounds]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ai.intent_engine import SIMPLE_PATTERNS, _SIMPLE_COMPILED
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "chat_corpus.txt")
+_SIMPLE_ANY = re.compile("|".join(f"(?P<p{i}>{pattern})" for i, pattern in enumerate(SIMPLE_PATTERNS)))
+
+
+def search_each(message):
+    """The original loop: re.search per table entry, in table order"""
+    for pattern, result in SIMPLE_PATTERNS.items():
+        if re.search(pattern, message):
+            return result
+    return None
+
+
+def search_alternation(message):
+    """One alternation scan, then the earlier entries on a hit to keep table order"""
+    hit = _SIMPLE_ANY.search(message)
+    if not hit:
+        return None
+    index = int(hit.lastgroup[1:])
+    for pattern, result in _SIMPLE_COMPILED[:index]:
+        if pattern.search(message):
+            return result
+    return _SIMPLE_COMPILED[index][1]
+
+
+def search_compiled(message):
+    """The _try_patterns lookup"""
+    for pattern, result in _SIMPLE_COMPILED:
+        if pattern.search(message):
+            return result
+    return None
+
+
+def _per_message_us(matcher, messages, rounds):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        for message in messages:
+            matcher(message)
+    return (time.perf_counter() - started) * 1e6 / (rounds * len(messages))
+
+
+def main(rounds=2000):
+    with open(CORPUS, encoding="utf-8") as f:
+        # parse() lowercases before the pattern stage
+        messages = [line.strip().lower() for line in f if line.strip()]
+    hits = [m for m in messages if search_each(m) is not None]
+    misses = [m for m in messages if search_each(m) is None]
+    mismatches = [
+        m for m in messages
+        if not (search_each(m) is search_alternation(m) is search_compiled(m))
+    ]
+
+    print(f"{len(messages)} messages, {len(hits)} pattern hits, {len(misses)} misses, {len(mismatches)} mismatches")
+    for m in mismatches:
+        print(f"  mismatch: {m!r}")
+    print(f"{'messages':<9} {'loop us':>8} {'alternation us':>15} {'compiled us':>12}")
+    for label, subset in (("all", messages), ("hits", hits), ("misses", misses)):
+        loop_us = _per_message_us(search_each, subset, rounds)
+        alt_us = _per_message_us(search_alternation, subset, rounds)
+        compiled_us = _per_message_us(search_compiled, subset, rounds)
+        print(f"{label:<9} {loop_us:>8.2f} {alt_us:>15.2f} {compiled_us:>12.2f}")
+
+
+if __name__ == "__main__":
+    main(*[int(a) for a in sys.argv[1:2]])
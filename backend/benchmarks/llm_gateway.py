@@ -0,0 +1,156 @@
+"""
+LLM calls through the pooled Gateway against the per-call requests.post it replaced.
+
+Both clients talk to StandInLLM, a local OpenAI-compatible chat endpoint. It charges a
+fixed handshake on every new connection (standing in for the TCP+TLS setup to a hosted
+API), answers after a fixed model latency and can reject a share of requests with 429.
+
+    cd backend && python -m benchmarks.llm_gateway [--calls N] [--threads N] [--handshake-ms MS]
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from core.gateway import Gateway
+
+REPLY = json.dumps({"choices": [{"message": {"role": "assistant", "content": "ok"}}]}).encode()
+
+
+class StandInLLM:
+    """
+    Local stand-in for a chat completions provider:
+    - HTTP/1.1 with keep-alive and TCP_NODELAY, so pooled clients reuse their connections.
+    - handshake_ms is slept once per accepted connection, latency_ms once per request.
+    - reject_rate of requests get a 429 with no Retry-After.
+    """
+
+    def __init__(self, handshake_ms=30, latency_ms=20, reject_rate=0.0):
+        self.handshake = handshake_ms / 1000
+        self.latency = latency_ms / 1000
+        self.reject_rate = reject_rate
+        self.connections = 0
+        self.requests = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def _handler(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out as two writes; with Nagle on, every kept-alive reply
+            # would also wait out the client's delayed ACK
+            disable_nagle_algorithm = True
+
+            def setup(self):
+                super().setup()
+                with stand_in._lock:
+                    stand_in.connections += 1
+                time.sleep(stand_in.handshake)
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                with stand_in._lock:
+                    stand_in.requests += 1
+                time.sleep(stand_in.latency)
+                if random.random() < stand_in.reject_rate:
+                    body, status = b'{"error": {"message": "rate limited"}}', 429
+                else:
+                    body, status = REPLY, 200
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+def _bare_call(url):
+    """The gateway's request path before pooling: a fresh requests.post per call"""
+    data = {"model": "bench", "messages": [{"role": "user", "content": "hi"}], "temperature": 0.7, "max_tokens": 256}
+    try:
+        resp = requests.post(f"{url}/v1/chat/completions", headers={"Content-Type": "application/json"}, json=data, timeout=15)
+        result = resp.json()
+        if "choices" in result:
+            return result["choices"][0]["message"]["content"], None
+        return None, str(result)
+    except Exception as e:
+        return None, str(e)
+
+
+def _gateway(url, concurrency):
+    gateway = Gateway()
+    gateway.ai_config = {"retry_backoff": 0.05}
+    gateway.providers_config = {"local": {"url": url, "max_concurrency": concurrency}}
+    return gateway
+
+
+def _run(call, calls, threads):
+    started = time.perf_counter()
+    if threads == 1:
+        results = [call() for _ in range(calls)]
+    else:
+        with ThreadPoolExecutor(threads) as pool:
+            results = list(pool.map(lambda _: call(), range(calls)))
+    return (time.perf_counter() - started) * 1000, sum(1 for text, _ in results if text is None)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--calls", type=int, default=60)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--concurrency", type=int, default=4, help="gateway max_concurrency")
+    parser.add_argument("--handshake-ms", type=float, default=30)
+    parser.add_argument("--latency-ms", type=float, default=20)
+    parser.add_argument("--reject-rate", type=float, default=0.1)
+    args = parser.parse_args()
+    random.seed(3)
+
+    scenarios = [("sequential", 1, 0.0), ("concurrent", args.threads, 0.0), ("429s", args.threads, args.reject_rate)]
+    print(f"{'scenario':<11} {'client':<8} {'total ms':>9} {'ms/call':>8} {'conns':>6} {'requests':>9} {'failed':>7}")
+    for scenario, threads, reject_rate in scenarios:
+        for client in ("bare", "gateway"):
+            with StandInLLM(args.handshake_ms, args.latency_ms, reject_rate) as stand_in:
+                if client == "bare":
+                    call = lambda: _bare_call(stand_in.url)
+                else:
+                    gateway = _gateway(stand_in.url, args.concurrency)
+                    call = lambda: gateway._call_local("bench", "system", "hi", 0.7)
+                total_ms, failed = _run(call, args.calls, threads)
+                print(
+                    f"{scenario:<11} {client:<8} {total_ms:>9.0f} {total_ms / args.calls:>8.1f} "
+                    f"{stand_in.connections:>6} {stand_in.requests:>9} {failed:>7}"
+                )
+
+
+if __name__ == "__main__":
+    main()
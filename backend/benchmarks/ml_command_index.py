@@ -0,0 +1,149 @@
+"""
+Root prediction latency of MLCommandEngine against the sample count.
+
+Learns templated chat requests (slot values plus random filler words), then predicts the
+root of fresh ones under an intent the model has never seen, so every prediction goes
+through the sample index. Each size is also checked against a full cosine scan, and
+"truncated" is the share of queries where a posting was cut at SCAN_LIMIT.
+
+    cd backend && python -m benchmarks.ml_command_index [sizes...]
+"""
+import math
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from engine.command_catalog import command_catalog
+from engine.ml_command_engine import MIN_SCORE, MLCommandEngine
+
+ITEMS = [f"item{i}" for i in range(800)]
+PLAYERS = [f"player{i}" for i in range(300)]
+MOBS = [f"mob{i}" for i in range(70)]
+STRUCTURES = [f"struct{i}" for i in range(40)]
+EFFECTS = [f"effect{i}" for i in range(30)]
+FILLER = [f"word{i}" for i in range(5000)]
+FILLER_WEIGHTS = [1.0 / (i + 1) for i in range(len(FILLER))]
+
+TEMPLATES = {
+    "give": (
+        ["give me {amount} {item}", "can i have some {item}", "i need {item} please", "gimme {amount} {item}"],
+        lambda: {"item": random.choice(ITEMS), "amount": random.randint(1, 64)}
+    ),
+    "time": (
+        ["make it {value}", "set time to {value}", "can you make it {value} please"],
+        lambda: {"value": random.choice(["day", "night", "noon", "midnight"])}
+    ),
+    "weather": (
+        ["make it {type}", "stop the rain", "clear weather please", "{type} weather now"],
+        lambda: {"type": random.choice(["clear", "rain", "thunder"])}
+    ),
+    "tp": (
+        ["tp me to {destination}", "teleport me to {destination}", "take me to {destination}"],
+        lambda: {"target": "@s", "destination": random.choice(PLAYERS)}
+    ),
+    "gamemode": (
+        ["put me in {mode}", "switch to {mode} mode", "i want {mode}"],
+        lambda: {"mode": random.choice(["creative", "survival", "spectator", "adventure"])}
+    ),
+    "effect": (
+        ["give me {effect}", "i want {effect} effect", "can i get {effect} for a while"],
+        lambda: {"effect": random.choice(EFFECTS)}
+    ),
+    "summon": (
+        ["spawn a {entity}", "summon {amount} {entity} near me", "can you spawn some {entity}"],
+        lambda: {"entity": random.choice(MOBS), "amount": random.randint(1, 5)}
+    ),
+    "kill": (
+        ["kill all {entity}", "clear the {entity} please", "get rid of the {entity}"],
+        lambda: {"entity": random.choice(MOBS)}
+    ),
+    "locate": (
+        ["where is the nearest {structure}", "find a {structure}", "locate {structure} for me"],
+        lambda: {"structure": random.choice(STRUCTURES)}
+    ),
+    "xp": (
+        ["give me {amount} levels", "i want xp", "can i have {amount} levels please"],
+        lambda: {"amount": random.randint(1, 30)}
+    ),
+}
+
+
+def _request(intent=None):
+    root = random.choice(list(TEMPLATES))
+    templates, make_params = TEMPLATES[root]
+    params = make_params()
+    words = random.choice(templates).format(**params).split()
+    for _ in range(random.choice([0, 0, 1, 1, 2, 3])):
+        words.insert(random.randint(0, len(words)), random.choices(FILLER, FILLER_WEIGHTS)[0])
+    return root, {
+        "intent": intent or f"intent_{random.randint(0, 40)}",
+        "original_message": " ".join(words),
+        "parameters": params
+    }
+
+
+def _scan(engine, features, allowed):
+    """The prediction loop before the index: cosine against every stored sample"""
+    query_norm = math.sqrt(sum(v * v for v in features.values()))
+    best_root, best_score = None, 0.0
+    for sample in engine.model["samples"]:
+        if sample["root"] not in allowed:
+            continue
+        other = sample["features"]
+        norm = math.sqrt(sum(v * v for v in other.values()))
+        score = sum(v * other.get(k, 0.0) for k, v in features.items()) / (query_norm * norm)
+        if score > best_score:
+            best_root, best_score = sample["root"], score
+    return best_root if best_score > MIN_SCORE else None
+
+
+def run(size, queries=300, scans=100):
+    workdir = tempfile.mkdtemp()
+    engine = MLCommandEngine(max_samples=size, flush_interval=3600, flush_samples=10 ** 9,
+                             data_path=os.path.join(workdir, "model.jsonl"))
+    try:
+        for _ in range(int(size * 1.2)):
+            root, request = _request()
+            engine.learn(request, f"{root} x", True)
+        allowed = command_catalog.get_command_set()
+        requests = [_request("unseen_intent") for _ in range(queries)]
+
+        started = time.perf_counter()
+        predicted = [engine._predict_root(request) for _, request in requests]
+        index_ms = (time.perf_counter() - started) * 1000 / queries
+
+        started = time.perf_counter()
+        scanned = [_scan(engine, engine._features(request), allowed) for _, request in requests[:scans]]
+        scan_ms = (time.perf_counter() - started) * 1000 / scans
+
+        return {
+            "samples": len(engine.model["samples"]),
+            "index_ms": index_ms,
+            "scan_ms": scan_ms,
+            "agree": sum(p == s for p, s in zip(predicted, scanned)) / scans,
+            "accuracy": sum(p == root for p, (root, _) in zip(predicted, requests)) / queries,
+            "truncated": engine.index.truncated / max(1, engine.index.queries)
+        }
+    finally:
+        engine.close()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+def main(sizes):
+    random.seed(7)
+    print(f"{'samples':>8} {'index ms':>9} {'scan ms':>8} {'agree':>6} {'accuracy':>9} {'truncated':>10}")
+    for size in sizes:
+        r = run(size)
+        print(
+            f"{r['samples']:>8} {r['index_ms']:>9.3f} {r['scan_ms']:>8.1f} {r['agree']:>6.0%} "
+            f"{r['accuracy']:>9.0%} {r['truncated']:>10.0%}"
+        )
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [1000, 10000, 30000, 100000])
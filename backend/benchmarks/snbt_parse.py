@@ -0,0 +1,236 @@
+"""
+Entity data decoding: world.snbt against the regex helpers it replaced.
+
+Runs every `data get entity` reply under fixtures/entity_data through both paths, for the
+player summary (Pos, gamemode, Health, food, XP) and for the full inventory. The shulker
+fixtures hold 36 filled shulker boxes, the largest reply a survival player produces.
+
+    cd backend && python -m benchmarks.snbt_parse [fixture names...]
+"""
+import os
+import re
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from server_manager import ServerManager
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "entity_data")
+
+
+class RegexHelpers:
+    """The ServerManager entity helpers before world.snbt, kept as they were"""
+
+    def parse_entity_data(self, line):
+        if not line:
+            return None
+        match = re.search(r"entity data:\s*(.*)$", line)
+        if not match:
+            return None
+        return match.group(1).strip()
+
+    def summarize_player(self, player_name, fields):
+        return {
+            "name": player_name,
+            "coords": self.parse_pos(fields.get("Pos")),
+            "gamemode": self.parse_gamemode(fields.get("playerGameType") or fields.get("gameType") or fields.get("PlayerGameType")),
+            "health": self.parse_nbt_number(fields.get("Health"), float),
+            "hunger": self.parse_nbt_number(fields.get("foodLevel"), int),
+            "xp_level": self.parse_nbt_number(fields.get("xpLevel"), int)
+        }
+
+    def parse_pos(self, data):
+        if not data:
+            return None
+        match = re.search(r"\[([^\]]+)\]", data)
+        if not match:
+            return None
+        parts = [p.strip().rstrip('dD') for p in match.group(1).split(",")]
+        if len(parts) != 3:
+            return None
+        try:
+            return {"x": float(parts[0]), "y": float(parts[1]), "z": float(parts[2])}
+        except Exception:
+            return None
+
+    def parse_nbt_number(self, data, cast=float):
+        if not data:
+            return None
+        match = re.search(r"-?\d+(?:\.\d+)?", data)
+        if not match:
+            return None
+        try:
+            return cast(float(match.group(0)))
+        except Exception:
+            return None
+
+    def parse_gamemode(self, data):
+        if not data:
+            return None
+        match = re.search(r"(-?\d+)", data)
+        if not match:
+            return None
+        try:
+            val = int(match.group(1))
+        except Exception:
+            return None
+        return {0: "survival", 1: "creative", 2: "adventure", 3: "spectator"}.get(val, "unknown")
+
+    def parse_inventory(self, data):
+        if not data:
+            return []
+        items = []
+
+        for chunk in self.split_nbt_list(data):
+            slot_match = re.search(r"Slot:\s*(-?\d+)b?", chunk)
+            id_match = re.search(r'id:\s*"([^"]+)"', chunk)
+            count_match = re.search(r"Count:\s*(\d+)b?", chunk)
+            if id_match and count_match and slot_match:
+                name = id_match.group(1).replace("minecraft:", "")
+                items.append({
+                    "slot": int(slot_match.group(1)),
+                    "item": name,
+                    "count": int(count_match.group(1))
+                })
+
+        if items:
+            return items
+
+        pattern2 = r'id:\s*"([^"]+)",\s*Count:\s*(\d+)b?'
+        matches = re.findall(pattern2, data)
+        if matches:
+            counts = {}
+            for item_id, count in matches:
+                name = item_id.replace("minecraft:", "")
+                counts[name] = counts.get(name, 0) + int(count)
+            slot = 0
+            for k, v in counts.items():
+                items.append({"slot": slot, "item": k, "count": v})
+                slot += 1
+            return items
+
+        return []
+
+    def split_nbt_compound(self, data):
+        if not data:
+            return {}
+        start = data.find('{')
+        if start == -1:
+            return {}
+        fields = {}
+        depth = 0
+        quote = None
+        key = None
+        token_start = start + 1
+        i = start
+        while i < len(data):
+            ch = data[i]
+            if quote:
+                if ch == '\\':
+                    i += 2
+                    continue
+                if ch == quote:
+                    quote = None
+            elif ch in ('"', "'"):
+                quote = ch
+            elif ch in '{[':
+                depth += 1
+            elif ch in '}]':
+                depth -= 1
+                if depth == 0:
+                    if key is not None:
+                        fields[key] = data[token_start:i].strip()
+                    break
+            elif depth == 1:
+                if ch == ':' and key is None:
+                    key = data[token_start:i].strip().strip('"\'')
+                    token_start = i + 1
+                elif ch == ',':
+                    if key is not None:
+                        fields[key] = data[token_start:i].strip()
+                    key = None
+                    token_start = i + 1
+            i += 1
+        return fields
+
+    def split_nbt_list(self, data):
+        if not data:
+            return []
+        start = data.find('[')
+        end = data.rfind(']')
+        if start == -1 or end == -1 or end <= start:
+            return [data]
+        inner = data[start + 1:end]
+        chunks = []
+        buf = []
+        depth = 0
+        i = 0
+        while i < len(inner):
+            ch = inner[i]
+            if ch == '{':
+                depth += 1
+            elif ch == '}':
+                depth = max(0, depth - 1)
+            if ch == ',' and depth == 0:
+                chunk = ''.join(buf).strip()
+                if chunk:
+                    chunks.append(chunk)
+                buf = []
+                i += 1
+                continue
+            buf.append(ch)
+            i += 1
+        tail = ''.join(buf).strip()
+        if tail:
+            chunks.append(tail)
+        return chunks
+
+
+def _time(fn, budget=0.25):
+    """Mean milliseconds per call, repeating for roughly budget seconds"""
+    runs = 0
+    result = None
+    started = time.perf_counter()
+    while runs < 3 or time.perf_counter() - started < budget:
+        result = fn()
+        runs += 1
+    return (time.perf_counter() - started) * 1000 / runs, result
+
+
+def _cases(server, legacy, line):
+    """(operation, regex path, snbt path) for one reply line"""
+    payload = legacy.parse_entity_data(line)
+    if not payload.startswith("{"):
+        return [("pos", lambda: legacy.parse_pos(legacy.parse_entity_data(line)),
+                 lambda: server._parse_pos(server._parse_entity_data(line)))]
+    return [
+        ("summary",
+         lambda: legacy.summarize_player("p", legacy.split_nbt_compound(legacy.parse_entity_data(line))),
+         lambda: server._summarize_player("p", server._parse_entity_data(line))),
+        ("inventory",
+         lambda: legacy.parse_inventory(legacy.split_nbt_compound(legacy.parse_entity_data(line)).get("Inventory")),
+         lambda: server._parse_inventory(server._parse_entity_data(line).get("Inventory"))),
+    ]
+
+
+def main(names):
+    server = ServerManager()
+    legacy = RegexHelpers()
+    names = names or sorted(os.listdir(FIXTURES))
+    print(f"{'fixture':<30} {'KB':>5} {'operation':<10} {'regex ms':>9} {'snbt ms':>8} {'same':>5} {'items':>11}")
+    for name in names:
+        with open(os.path.join(FIXTURES, name), encoding="utf-8") as f:
+            line = f.read().strip()
+        for operation, old, new in _cases(server, legacy, line):
+            old_ms, old_result = _time(old)
+            new_ms, new_result = _time(new)
+            items = f"{len(old_result)}/{len(new_result)}" if operation == "inventory" else ""
+            print(
+                f"{name:<30} {len(line) / 1024:>5.0f} {operation:<10} {old_ms:>9.3f} {new_ms:>8.3f} "
+                f"{'yes' if old_result == new_result else 'no':>5} {items:>11}"
+            )
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -1,28 +1,112 @@
+import atexit
+import gzip
 import json
 import os
+import shutil
+import threading
 import time
+from collections import deque
 from datetime import datetime
 
+from core.audit_store import AuditStore
+
+DEFAULT_TAIL_SIZE = 1000
+DEFAULT_BATCH_BYTES = 64 * 1024
+DEFAULT_FLUSH_INTERVAL = 1.0
+# "always": fsync every event before log() returns; "batch": fsync each flushed batch; "never": leave it to the OS
+FSYNC_POLICIES = ("always", "batch", "never")
+
+
 class AuditLogger:
-    def __init__(self, log_dir=None):
+    """
+    Append-only audit log:
+    - One JSON object per line in logs/audit_YYYYMMDD.jsonl; log() only queues the entry.
+    - A background flusher writes queued entries in batches, once batch_bytes are pending or
+      flush_interval has passed, together with the per-profile activity.log lines.
+    - Files of past days are gzipped (audit_YYYYMMDD.jsonl.gz) when the day rolls over.
+    - The last tail_size entries stay in memory for /activity and the AI.
+    - Each flushed batch is also indexed in an AuditStore (logs/audit.db) for queries over
+      the whole history.
+    """
+
+    def __init__(self, log_dir=None, tail_size=DEFAULT_TAIL_SIZE, batch_bytes=DEFAULT_BATCH_BYTES,
+                 flush_interval=DEFAULT_FLUSH_INTERVAL, fsync=None):
         self.log_dir = log_dir or os.path.join(os.path.dirname(os.path.dirname(__file__)), "logs")
+        self.servers_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "servers")
         os.makedirs(self.log_dir, exist_ok=True)
-        self.current_log_file = os.path.join(self.log_dir, f"audit_{datetime.now().strftime('%Y%m%d')}.json")
-        self.logs = []
+        self.batch_bytes = batch_bytes
+        self.flush_interval = flush_interval
+        fsync = fsync or os.environ.get("AUDIT_FSYNC", "batch")
+        self.fsync = fsync if fsync in FSYNC_POLICIES else "batch"
+        self.logs = deque(maxlen=tail_size)
+        # log() is called from the AI worker pool as well as request handlers
+        self._lock = threading.Lock()
+        self._wake = threading.Condition(self._lock)
+        self._pending = []
+        self._pending_bytes = 0
+        # Serializes file writes between the flusher and "always" / flush() callers
+        self._write_lock = threading.Lock()
+        self._day = None
+        self._file = None
+        self._closed = False
+        self.stats = {"events": 0, "batches": 0, "bytes": 0, "fsyncs": 0, "rotations": 0}
         self.load_today_logs()
-    
+        self._compress_old_days()
+        self.store = AuditStore(os.path.join(self.log_dir, "audit.db"))
+        self._import_history()
+        self._flusher = threading.Thread(target=self._flush_loop, name="audit-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
+    def _day_path(self, day, ext="jsonl"):
+        return os.path.join(self.log_dir, f"audit_{day}.{ext}")
+
     def load_today_logs(self):
-        if os.path.exists(self.current_log_file):
+        day = datetime.now().strftime('%Y%m%d')
+        # Files from before the JSONL format hold one JSON list
+        legacy = self._day_path(day, "json")
+        if os.path.exists(legacy):
             try:
-                with open(self.current_log_file, "r") as f:
-                    self.logs = json.load(f)
-            except:
-                self.logs = []
-    
-    def save_logs(self):
-        with open(self.current_log_file, "w") as f:
-            json.dump(self.logs, f, indent=2)
-    
+                with open(legacy, "r") as f:
+                    self.logs.extend(json.load(f))
+            except Exception:
+                pass
+        path = self._day_path(day)
+        if not os.path.exists(path):
+            return
+        with open(path, "r", encoding="utf-8") as f:
+            for line in deque(f, maxlen=self.logs.maxlen):
+                try:
+                    self.logs.append(json.loads(line))
+                except ValueError:
+                    # Torn last line from a crash
+                    continue
+
+    def _import_history(self):
+        """One-time indexing of the audit files written before the store existed"""
+        if self.store.get_meta("imported"):
+            return
+        names = sorted(n for n in os.listdir(self.log_dir) if n.startswith("audit_") and n.endswith((".json", ".jsonl", ".jsonl.gz")))
+        imported = self.store.import_files([os.path.join(self.log_dir, n) for n in names])
+        self.store.set_meta("imported", int(time.time()))
+        if imported:
+            print(f"[Audit] Indexed {imported} events from {len(names)} audit files")
+
+    def _compress_old_days(self):
+        today = datetime.now().strftime('%Y%m%d')
+        for name in os.listdir(self.log_dir):
+            if name.startswith("audit_") and name.endswith(".jsonl") and name != f"audit_{today}.jsonl":
+                self._compress(os.path.join(self.log_dir, name))
+
+    def _compress(self, path):
+        try:
+            with open(path, "rb") as src, gzip.open(f"{path}.gz.tmp", "wb") as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(f"{path}.gz.tmp", f"{path}.gz")
+            os.remove(path)
+        except OSError as e:
+            print(f"[Audit] Could not compress {path}: {e}")
+
     def log(self, event_type, player, message, intent=None, command=None, success=True, metadata=None, profile=None):
         entry = {
             "timestamp": time.time(),
@@ -36,53 +120,134 @@ class AuditLogger:
             "metadata": metadata or {},
             "profile": profile
         }
-        self.logs.append(entry)
-        self.logs = self.logs[-1000:]
-        self.save_logs()
-        
-        if profile:
-            self.save_profile_log(profile, entry)
-        
+        line = json.dumps(entry, default=str) + "\n"
+        with self._lock:
+            self.logs.append(entry)
+            self._pending.append((entry, line))
+            self._pending_bytes += len(line)
+            if self._pending_bytes >= self.batch_bytes:
+                self._wake.notify()
+        if self.fsync == "always":
+            self.flush()
         return entry
-    
-    def save_profile_log(self, profile, entry):
-        profile_log_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "servers", profile)
+
+    def _flush_loop(self):
+        while True:
+            with self._lock:
+                if self._pending_bytes < self.batch_bytes and not self._closed:
+                    # Let a trickle of events gather for up to flush_interval
+                    self._wake.wait(self.flush_interval)
+                if self._closed and not self._pending:
+                    return
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[Audit] Flush failed: {e}")
+                time.sleep(self.flush_interval)
+
+    def flush(self):
+        """Write everything queued so far"""
+        with self._write_lock:
+            with self._lock:
+                batch, self._pending = self._pending, []
+                self._pending_bytes = 0
+            if not batch:
+                return 0
+            by_profile = {}
+            written = 0
+            for entry, line in batch:
+                self._write_line(entry, line)
+                written += len(line)
+                if entry.get("profile"):
+                    by_profile.setdefault(entry["profile"], []).append(entry)
+            self._file.flush()
+            if self.fsync != "never":
+                os.fsync(self._file.fileno())
+                self.stats["fsyncs"] += 1
+            for profile, entries in by_profile.items():
+                self.save_profile_log(profile, entries)
+            self.store.add_many(entry for entry, _ in batch)
+            self.stats["events"] += len(batch)
+            self.stats["batches"] += 1
+            self.stats["bytes"] += written
+            return len(batch)
+
+    def _write_line(self, entry, line):
+        day = datetime.fromtimestamp(entry["timestamp"]).strftime('%Y%m%d')
+        if self._day is not None and day < self._day:
+            # Queued just before midnight but written after; yesterday's file is being compressed
+            day = self._day
+        if day != self._day:
+            previous = self._day
+            if self._file is not None:
+                self._file.close()
+            self._day = day
+            self._file = open(self._day_path(day), "a", encoding="utf-8")
+            if previous is not None and previous < day:
+                self.stats["rotations"] += 1
+                threading.Thread(target=self._compress, args=(self._day_path(previous),), daemon=True).start()
+        self._file.write(line)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            self._wake.notify()
+        self._flusher.join(timeout=10)
+        self.flush()
+        with self._write_lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def save_profile_log(self, profile, entries):
+        profile_log_dir = os.path.join(self.servers_dir, profile)
         os.makedirs(profile_log_dir, exist_ok=True)
         log_file = os.path.join(profile_log_dir, "activity.log")
-        
-        timestamp = entry.get("datetime", datetime.now().isoformat())
-        msg = entry.get("message", "")
-        log_line = f"[{timestamp}] {msg}\n"
-        
+        lines = []
+        for entry in entries:
+            timestamp = entry.get("datetime", datetime.now().isoformat())
+            lines.append(f"[{timestamp}] {entry.get('message', '')}\n")
         with open(log_file, "a") as f:
-            f.write(log_line)
-    
+            f.writelines(lines)
+
     def log_command(self, player, message, intent, command, success=True):
         return self.log("command", player, message, intent, command, success)
-    
+
     def log_chat(self, player, message, response):
         return self.log("chat", player, message, None, None, True, {"response": response[:100]})
-    
+
     def log_event(self, event_type, metadata):
         return self.log("event", "system", event_type, None, None, True, metadata)
-    
+
+    def _tail(self):
+        with self._lock:
+            return list(self.logs)
+
+    def query(self, profile=None, player=None, event_type=None, intent=None, since=None, until=None,
+              text=None, cursor=None, limit=50):
+        """Indexed query over the whole history; (entries newest first, cursor of the next page)"""
+        # Make events logged in the last flush_interval visible
+        self.flush()
+        return self.store.query(profile, player, event_type, intent, since, until, text, cursor, limit)
+
     def get_player_logs(self, player_name, limit=50):
-        return [l for l in reversed(self.logs) if l.get("player") == player_name][-limit:]
-    
+        return self.query(player=player_name, limit=limit)[0]
+
     def get_recent(self, limit=20, profile=None):
+        logs = self._tail()
         if profile:
-            filtered = [l for l in self.logs if l.get("profile") == profile]
-            return filtered[-limit:]
-        return self.logs[-limit:]
-    
+            logs = [l for l in logs if l.get("profile") == profile]
+        if len(logs) >= limit:
+            return logs[-limit:]
+        return list(reversed(self.query(profile=profile, limit=limit)[0]))
+
     def search(self, query, limit=50):
-        results = []
-        for log in reversed(self.logs):
-            if query.lower() in str(log).lower():
-                results.append(log)
-            if len(results) >= limit:
-                break
-        return results
+        return self.query(text=query, limit=limit)[0]
+
+    def get_stats(self):
+        with self._lock:
+            pending = len(self._pending)
+        return dict(self.stats, pending=pending, fsync=self.fsync, tail=len(self.logs))
 
 
 audit_logger = AuditLogger()
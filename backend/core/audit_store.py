@@ -0,0 +1,172 @@
+import gzip
+import json
+import os
+import sqlite3
+import threading
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    datetime TEXT,
+    type TEXT,
+    player TEXT,
+    profile TEXT,
+    intent TEXT,
+    command TEXT,
+    message TEXT,
+    success INTEGER,
+    metadata TEXT
+);
+CREATE INDEX IF NOT EXISTS events_ts ON events (ts);
+-- Single-column indexes end in the rowid, so "col = ? ORDER BY id DESC" pages without sorting
+CREATE INDEX IF NOT EXISTS events_player ON events (player);
+CREATE INDEX IF NOT EXISTS events_profile ON events (profile);
+CREATE INDEX IF NOT EXISTS events_type ON events (type);
+CREATE INDEX IF NOT EXISTS events_intent ON events (intent);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+# External-content FTS index over message and command, filled by a trigger (events are never updated)
+_FTS_SCHEMA = """
+CREATE VIRTUAL TABLE IF NOT EXISTS events_fts USING fts5(message, command, content='events', content_rowid='id');
+CREATE TRIGGER IF NOT EXISTS events_ai AFTER INSERT ON events BEGIN
+    INSERT INTO events_fts (rowid, message, command) VALUES (new.id, new.message, new.command);
+END;
+"""
+
+_COLUMNS = ("ts", "datetime", "type", "player", "profile", "intent", "command", "message", "success", "metadata")
+
+
+def _fts_query(text):
+    # Every word as a quoted prefix term, so user input can't be parsed as FTS syntax
+    terms = [w.replace('"', '""') for w in str(text).split() if w.strip()]
+    return " ".join(f'"{t}"*' for t in terms)
+
+
+class AuditStore:
+    """
+    SQLite index of audit events next to the JSONL files:
+    - Indexed on time, player, profile, type and intent; an FTS5 table covers message and command
+      (plain LIKE matching where SQLite was built without FTS5).
+    - query() pages newest first by event id; the returned cursor fetches the next older page.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+        try:
+            self._db.executescript(_FTS_SCHEMA)
+            self.fts = True
+        except sqlite3.OperationalError:
+            self.fts = False
+
+    def add_many(self, entries):
+        rows = [
+            (
+                e.get("timestamp"), e.get("datetime"), e.get("type"), e.get("player"), e.get("profile"),
+                e.get("intent"), e.get("command"), e.get("message"),
+                None if e.get("success") is None else int(bool(e.get("success"))),
+                json.dumps(e.get("metadata") or {}, default=str)
+            )
+            for e in entries
+        ]
+        with self._lock, self._db:
+            self._db.executemany(
+                f"INSERT INTO events ({', '.join(_COLUMNS)}) VALUES ({', '.join('?' * len(_COLUMNS))})", rows
+            )
+        return len(rows)
+
+    def import_files(self, paths):
+        """Load audit files that predate the store: JSONL (optionally gzipped) or the older JSON lists"""
+        imported = 0
+        for path in paths:
+            opener = gzip.open if path.endswith(".gz") else open
+            batch = []
+            try:
+                with opener(path, "rt", encoding="utf-8") as f:
+                    if path.endswith(".json"):
+                        try:
+                            batch = json.load(f)
+                        except ValueError:
+                            batch = []
+                    for line in f:
+                        try:
+                            batch.append(json.loads(line))
+                        except ValueError:
+                            continue
+            except OSError as e:
+                print(f"[Audit] Could not import {path}: {e}")
+                continue
+            imported += self.add_many(e for e in batch if isinstance(e, dict) and e.get("timestamp"))
+        return imported
+
+    def query(self, profile=None, player=None, event_type=None, intent=None, since=None, until=None,
+              text=None, cursor=None, limit=50):
+        """(entries newest first, cursor for the next page or None)"""
+        where, args = [], []
+        for column, value in (("e.profile", profile), ("e.player", player), ("e.type", event_type), ("e.intent", intent)):
+            if value:
+                where.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            where.append("e.ts >= ?")
+            args.append(float(since))
+        if until is not None:
+            where.append("e.ts < ?")
+            args.append(float(until))
+        if cursor:
+            where.append("e.id < ?")
+            args.append(int(cursor))
+        sql = "SELECT e.* FROM events e"
+        if text and self.fts and _fts_query(text):
+            sql += " JOIN events_fts ON events_fts.rowid = e.id"
+            where.append("events_fts MATCH ?")
+            args.append(_fts_query(text))
+        elif text:
+            where.append("(e.message LIKE ? OR e.command LIKE ?)")
+            args += [f"%{text}%", f"%{text}%"]
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        limit = max(1, min(1000, int(limit)))
+        sql += " ORDER BY e.id DESC LIMIT ?"
+        args.append(limit + 1)
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        more = len(rows) > limit
+        rows = rows[:limit]
+        entries = [self._entry(r) for r in rows]
+        return entries, (rows[-1]["id"] if more else None)
+
+    def _entry(self, row):
+        return {
+            "id": row["id"],
+            "timestamp": row["ts"],
+            "datetime": row["datetime"],
+            "type": row["type"],
+            "player": row["player"],
+            "message": row["message"],
+            "intent": row["intent"],
+            "command": row["command"],
+            "success": None if row["success"] is None else bool(row["success"]),
+            "metadata": json.loads(row["metadata"] or "{}"),
+            "profile": row["profile"]
+        }
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key, value):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
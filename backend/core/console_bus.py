@@ -0,0 +1,169 @@
+import asyncio
+import threading
+import time
+
+from core.ring_buffer import SequencedRingBuffer
+
+
+class ConsoleSubscription:
+    """A consumer cursor on the console bus. New lines wake it through its asyncio loop."""
+
+    def __init__(self, bus, name, cursor, loop, max_batch=500):
+        self.bus = bus
+        self.name = name
+        self.cursor = cursor
+        self.loop = loop
+        self.max_batch = max_batch
+        self.delivered = 0
+        self.dropped = 0
+        self.overflows = 0
+        self.created_at = time.time()
+        self.last_read = 0
+        self.closed = False
+        self._event = asyncio.Event()
+        self._wake_pending = False
+
+    def _notify(self):
+        # Called with the bus lock held, usually from the server reader thread.
+        if self._wake_pending or self.closed:
+            return
+        self._wake_pending = True
+        try:
+            self.loop.call_soon_threadsafe(self._event.set)
+        except RuntimeError:
+            # Event loop is gone, nobody is listening anymore
+            self.closed = True
+
+    @property
+    def lag(self):
+        return max(0, self.bus.last_seq - self.cursor)
+
+    def read(self, limit=None):
+        """Non-blocking read of everything after the cursor (up to limit lines)"""
+        lines, cursor, missed = self.bus.read_since(self.cursor, limit or self.max_batch)
+        self.cursor = cursor
+        self.last_read = time.time()
+        if missed:
+            self.dropped += missed
+            self.overflows += 1
+            print(f"[ConsoleBus] Consumer '{self.name}' fell behind, {missed} lines dropped")
+        self.delivered += len(lines)
+        return lines
+
+    async def next_batch(self, timeout=None):
+        """Wait until new lines are published and return them. Returns [] on timeout or close."""
+        while not self.closed:
+            # Clear before reading so a publish racing with the read still wakes us
+            self._event.clear()
+            with self.bus._lock:
+                self._wake_pending = False
+            lines = self.read()
+            if lines:
+                return lines
+            if timeout is None:
+                await self._event.wait()
+            else:
+                try:
+                    await asyncio.wait_for(self._event.wait(), timeout)
+                except asyncio.TimeoutError:
+                    return []
+        return []
+
+    def close(self):
+        self.bus.unsubscribe(self)
+
+    def get_stats(self):
+        return {
+            "name": self.name,
+            "cursor": self.cursor,
+            "lag": self.lag,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "overflows": self.overflows,
+            "last_read": self.last_read,
+            "closed": self.closed
+        }
+
+
+class ConsoleBus:
+    """
+    Sequence-numbered console log bus:
+    - Every published line gets a monotonic sequence number.
+    - Consumers hold a cursor and are woken when new lines arrive (no snapshot diffing).
+    - Lines that leave the backlog before a consumer reads them are counted as drops.
+    """
+
+    def __init__(self, capacity=2000):
+        self._lock = threading.Lock()
+        self._buffer = SequencedRingBuffer(capacity)
+        self.published = 0
+        self._subscribers = []
+
+    @property
+    def last_seq(self):
+        return self._buffer.last_seq
+
+    @property
+    def capacity(self):
+        return self._buffer.capacity
+
+    def publish(self, line):
+        with self._lock:
+            seq = self._buffer.append(line)
+            self.published += 1
+            for sub in self._subscribers:
+                sub._notify()
+            return seq
+
+    def read_since(self, cursor, limit=None):
+        """Return (lines after cursor, new cursor, lines missed because they left the backlog)"""
+        with self._lock:
+            return self._buffer.since(cursor, limit)
+
+    def tail(self, count=500):
+        with self._lock:
+            return self._buffer.tail(count)
+
+    def clear(self):
+        """Drop the backlog. Sequence numbers keep counting and consumers skip ahead."""
+        with self._lock:
+            self._buffer.clear()
+            for sub in self._subscribers:
+                sub.cursor = max(sub.cursor, self._buffer.last_seq)
+
+    def resize(self, capacity):
+        with self._lock:
+            self._buffer.resize(capacity)
+
+    def subscribe(self, name, replay=0, loop=None, max_batch=500):
+        """Register a consumer. replay > 0 makes the first read include that many backlog lines."""
+        loop = loop or asyncio.get_running_loop()
+        with self._lock:
+            cursor = max(self._buffer.first_seq - 1, self._buffer.last_seq - max(0, replay))
+            sub = ConsoleSubscription(self, name, cursor, loop, max_batch)
+            self._subscribers.append(sub)
+        return sub
+
+    def unsubscribe(self, sub):
+        with self._lock:
+            sub.closed = True
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+        # Release anyone still waiting on it
+        try:
+            sub.loop.call_soon_threadsafe(sub._event.set)
+        except RuntimeError:
+            pass
+
+    def get_stats(self):
+        with self._lock:
+            subscribers = list(self._subscribers)
+            stats = {
+                "last_seq": self._buffer.last_seq,
+                "first_seq": self._buffer.first_seq,
+                "buffered": len(self._buffer),
+                "capacity": self._buffer.capacity,
+                "published": self.published
+            }
+        stats["subscribers"] = [sub.get_stats() for sub in subscribers]
+        return stats
@@ -0,0 +1,131 @@
+import asyncio
+import re
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
+
+
+class PendingQuery:
+    """A registered response matcher. future resolves with the first console line it accepts."""
+
+    def __init__(self, pattern=None, predicate=None, name=None):
+        if isinstance(pattern, str):
+            pattern = re.compile(pattern, re.IGNORECASE)
+        self.pattern = pattern
+        self.predicate = predicate
+        self.name = name or (pattern.pattern if pattern else "query")
+        self.future = Future()
+        self.created_at = time.time()
+
+    def matches(self, line):
+        match = None
+        if self.pattern is not None:
+            match = self.pattern.search(line)
+            if not match:
+                return False
+        if self.predicate is not None:
+            return bool(self.predicate(line, match))
+        return True
+
+
+class ConsoleCorrelator:
+    """
+    Request/response correlation for console commands:
+    - Callers register a matcher (regex and/or predicate) before sending a command.
+    - The server reader thread feeds every line and resolves the oldest matching query directly.
+    - A line satisfies at most one query, so identical queries in flight resolve in send order.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = []
+        self.registered = 0
+        self.matched = 0
+        self.timed_out = 0
+        self._latency_total = 0.0
+
+    def expect(self, pattern=None, predicate=None, name=None):
+        query = PendingQuery(pattern, predicate, name)
+        with self._lock:
+            self._pending.append(query)
+            self.registered += 1
+        return query
+
+    def feed(self, line):
+        """Called from the reader thread for every console line"""
+        if not self._pending:
+            return
+        resolved = None
+        with self._lock:
+            for query in self._pending:
+                if query.future.done():
+                    continue
+                try:
+                    if query.matches(line):
+                        resolved = query
+                        break
+                except Exception:
+                    continue
+            if resolved:
+                self._pending.remove(resolved)
+                self.matched += 1
+                self._latency_total += time.time() - resolved.created_at
+            self._pending = [q for q in self._pending if not q.future.done()]
+        if resolved:
+            try:
+                resolved.future.set_result(line)
+            except Exception:
+                pass
+
+    def wait(self, query, timeout=1.0):
+        """Block until the query resolves. Returns the matching line or None on timeout."""
+        if query is None:
+            return None
+        try:
+            return query.future.result(timeout=timeout)
+        except FutureTimeoutError:
+            self._expire(query)
+            return None
+        except Exception:
+            return None
+
+    async def wait_async(self, query, timeout=1.0):
+        if query is None:
+            return None
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(query.future), timeout)
+        except asyncio.TimeoutError:
+            self._expire(query)
+            return None
+        except Exception:
+            return None
+
+    def cancel(self, query):
+        with self._lock:
+            if query in self._pending:
+                self._pending.remove(query)
+        query.future.cancel()
+
+    def cancel_all(self):
+        with self._lock:
+            pending = self._pending
+            self._pending = []
+        for query in pending:
+            query.future.cancel()
+
+    def _expire(self, query):
+        with self._lock:
+            if query in self._pending:
+                self._pending.remove(query)
+                self.timed_out += 1
+        query.future.cancel()
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "in_flight": len(self._pending),
+                "registered": self.registered,
+                "matched": self.matched,
+                "timed_out": self.timed_out,
+                "avg_latency_ms": round(self._latency_total / self.matched * 1000, 1) if self.matched else None
+            }
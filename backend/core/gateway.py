@@ -1,6 +1,11 @@
+import asyncio
 import json
 import os
+import random
+import threading
+import time
 import requests
+from requests.adapters import HTTPAdapter
 
 def get_config():
     config_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), "config.json")
@@ -16,6 +21,14 @@ PROVIDER_ENDPOINTS = {
     "google": "https://generativelanguage.googleapis.com/v1beta/models/{model}:generateContent",
 }
 
+# HTTP defaults; each can be overridden in ai.<key> or ai.providers.<provider>.<key>
+DEFAULT_TIMEOUT = 15
+DEFAULT_LOCAL_TIMEOUT = 60
+DEFAULT_MAX_RETRIES = 2
+DEFAULT_RETRY_BACKOFF = 0.5
+DEFAULT_MAX_CONCURRENCY = 4
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
 class Gateway:
     def __init__(self):
         self.config = get_config()
@@ -27,6 +40,11 @@ class Gateway:
         self.mode = self.ai_config.get("mode", "chat")
         self.providers_config = self.ai_config.get("providers", {})
         self.server_context = {}
+        # One keep-alive session and one concurrency cap per provider
+        self._sessions = {}
+        self._limits = {}
+        self._http_lock = threading.Lock()
+        self.http_stats = {}
     
     def reload(self):
         self.config = get_config()
@@ -37,6 +55,14 @@ class Gateway:
         self.enabled = self.ai_config.get("enabled", True)
         self.mode = self.ai_config.get("mode", "chat")
         self.providers_config = self.ai_config.get("providers", {})
+        with self._http_lock:
+            # Caps and pool sizes may have changed; requests already running keep their old
+            # semaphore and session, whose connections are dropped as they come back
+            sessions = self._sessions
+            self._sessions = {}
+            self._limits = {}
+        for session in sessions.values():
+            session.close()
     
     def is_enabled(self):
         return self.enabled and self.mode != "off"
@@ -98,6 +124,88 @@ class Gateway:
         else:
             return None, f"Unknown provider: {provider}"
     
+    async def call_ai_async(self, system_prompt, user_message, temperature=0.7, provider=None, model=None):
+        """call_ai for coroutines: runs on a worker thread, sharing the pooled sessions"""
+        return await asyncio.to_thread(self.call_ai, system_prompt, user_message, temperature, provider, model)
+    
+    def _http_setting(self, provider, key, default):
+        provider_cfg = self.providers_config.get(provider, {})
+        if key in provider_cfg:
+            return provider_cfg[key]
+        return self.ai_config.get(key, default)
+    
+    def _get_session(self, provider):
+        with self._http_lock:
+            session = self._sessions.get(provider)
+            if session is None:
+                pool_size = max(1, int(self._http_setting(provider, "max_concurrency", DEFAULT_MAX_CONCURRENCY)))
+                # Retries are handled in _post so they can back off with jitter
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+                session = requests.Session()
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[provider] = session
+                self.http_stats.setdefault(provider, {"requests": 0, "retries": 0, "errors": 0, "in_flight": 0})
+            return session
+    
+    def _get_limit(self, provider):
+        with self._http_lock:
+            limit = self._limits.get(provider)
+            if limit is None:
+                cap = max(1, int(self._http_setting(provider, "max_concurrency", DEFAULT_MAX_CONCURRENCY)))
+                limit = threading.BoundedSemaphore(cap)
+                self._limits[provider] = limit
+            return limit
+    
+    def _count(self, provider, key, amount=1):
+        with self._http_lock:
+            self.http_stats[provider][key] += amount
+    
+    def _retry_delay(self, attempt, backoff, retry_after=None):
+        if retry_after:
+            try:
+                return min(float(retry_after), 30)
+            except ValueError:
+                pass
+        # Full jitter so queued callers don't retry in lockstep
+        return random.uniform(0, backoff * (2 ** attempt))
+    
+    def _post(self, provider, url, headers, data, timeout=None):
+        """POST through the provider's pooled session, retrying 429/5xx and connection failures"""
+        session = self._get_session(provider)
+        default_timeout = DEFAULT_LOCAL_TIMEOUT if provider == "local" else DEFAULT_TIMEOUT
+        timeout = timeout or self._http_setting(provider, "timeout", default_timeout)
+        retries = max(0, int(self._http_setting(provider, "max_retries", DEFAULT_MAX_RETRIES)))
+        backoff = float(self._http_setting(provider, "retry_backoff", DEFAULT_RETRY_BACKOFF))
+        
+        with self._get_limit(provider):
+            self._count(provider, "in_flight")
+            try:
+                for attempt in range(retries + 1):
+                    self._count(provider, "requests")
+                    try:
+                        resp = session.post(url, headers=headers, json=data, timeout=timeout)
+                    except requests.ConnectionError:
+                        if attempt >= retries:
+                            raise
+                        delay = self._retry_delay(attempt, backoff)
+                    else:
+                        if resp.status_code not in RETRY_STATUS_CODES or attempt >= retries:
+                            return resp
+                        delay = self._retry_delay(attempt, backoff, resp.headers.get("Retry-After"))
+                        resp.close()
+                    self._count(provider, "retries")
+                    time.sleep(delay)
+            except Exception:
+                self._count(provider, "errors")
+                raise
+            finally:
+                self._count(provider, "in_flight", -1)
+    
+    def get_http_stats(self):
+        with self._http_lock:
+            return {provider: dict(stats) for provider, stats in self.http_stats.items()}
+    
     def _call_groq(self, api_key, model, system_prompt, user_message, temperature):
         url = "https://api.groq.com/openai/v1/chat/completions"
         headers = {
@@ -113,7 +221,7 @@ class Gateway:
             "temperature": temperature,
             "max_tokens": 256
         }
-        return self._make_request(url, headers, data)
+        return self._make_request(url, headers, data, "groq")
     
     def _call_openai(self, api_key, model, system_prompt, user_message, temperature):
         url = "https://api.openai.com/v1/chat/completions"
@@ -130,7 +238,7 @@ class Gateway:
             "temperature": temperature,
             "max_tokens": 256
         }
-        return self._make_request(url, headers, data)
+        return self._make_request(url, headers, data, "openai")
     
     def _call_anthropic(self, api_key, model, system_prompt, user_message, temperature):
         url = "https://api.anthropic.com/v1/messages"
@@ -149,7 +257,7 @@ class Gateway:
             "max_tokens": 256
         }
         try:
-            resp = requests.post(url, headers=headers, json=data, timeout=15)
+            resp = self._post("anthropic", url, headers, data)
             result = resp.json()
             if "content" in result:
                 return result["content"][0]["text"], None
@@ -172,7 +280,7 @@ class Gateway:
             }
         }
         try:
-            resp = requests.post(url, headers=headers, json=data, timeout=15)
+            resp = self._post("google", url, headers, data)
             result = resp.json()
             if "candidates" in result:
                 return result["candidates"][0]["content"]["parts"][0]["text"], None
@@ -204,7 +312,7 @@ class Gateway:
             "temperature": temperature,
             "max_tokens": 256
         }
-        return self._make_request(url, headers, data)
+        return self._make_request(url, headers, data, "azure")
     
     def _call_local(self, model, system_prompt, user_message, temperature):
         local_cfg = self.providers_config.get("local", {})
@@ -229,7 +337,7 @@ class Gateway:
         }
         
         try:
-            resp = requests.post(url, headers=headers, json=data, timeout=60)
+            resp = self._post("local", url, headers, data)
             result = resp.json()
             if "choices" in result:
                 return result["choices"][0]["message"]["content"], None
@@ -242,9 +350,9 @@ class Gateway:
         except Exception as e:
             return None, str(e)
     
-    def _make_request(self, url, headers, data):
+    def _make_request(self, url, headers, data, provider):
         try:
-            resp = requests.post(url, headers=headers, json=data, timeout=15)
+            resp = self._post(provider, url, headers, data)
             result = resp.json()
             if "choices" in result:
                 return result["choices"][0]["message"]["content"], None
@@ -1,143 +1,379 @@
+import atexit
 import json
 import os
+import threading
 import time
+from collections import OrderedDict
 from datetime import datetime
 
+FLUSH_INTERVAL = 2.0
+# Journal size at which it is folded into a new memory.json
+COMPACT_BYTES = 1024 * 1024
+# Players idle this long, or beyond MAX_HOT_PLAYERS per server, are packed away until next seen
+IDLE_EVICT_SECONDS = 600
+MAX_HOT_PLAYERS = 500
+
+
+def _new_player(player_name, server_name):
+    now = time.time()
+    return {
+        "name": player_name,
+        "server": server_name,
+        "first_seen": now,
+        "last_seen": now,
+        "role": "player",
+        "playstyle": None,
+        "trust_score": 0.5,
+        "preferred_tone": "casual",
+        "frequent_commands": [],
+        "risk_flag": False,
+        "conversation_count": 0,
+        "last_intent": None,
+        "last_target": None
+    }
+
+
+class _ServerShard:
+    """
+    One server's memory:
+    - players is ordered by last_seen (every touch moves a player to the end), so it is both
+      the LRU for eviction and the last_seen index: recently active players are a walk back
+      from the end that stops at the first one older than the cutoff.
+    - Evicted players sit in cold as compact JSON text and are decoded again on next access.
+      On load only players evict() would keep start hot; everyone else starts in cold.
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.players = OrderedDict()
+        self.conversations = {}
+        self.cold = {}
+        self.world_context = {}
+        self.journal_bytes = 0
+        # Set when the journal ends in a torn record; anything appended after it would be lost
+        self.journal_torn = False
+
+    def load(self, players, conversations, world_context):
+        # Players evict() would still keep hot go back into players, oldest first, so
+        # active_since() sees whoever was online just before a restart
+        idle_before = time.time() - IDLE_EVICT_SECONDS
+        recent = sorted(
+            (p.get("last_seen", 0), name) for name, p in players.items()
+            if isinstance(p, dict) and p.get("last_seen", 0) >= idle_before
+        )[-MAX_HOT_PLAYERS:]
+        for _, player_name in recent:
+            self.players[player_name] = players[player_name]
+            if conversations.get(player_name) is not None:
+                self.conversations[player_name] = conversations[player_name]
+        for player_name in set(players) | set(conversations):
+            if player_name in self.players:
+                continue
+            self.cold[player_name] = json.dumps({
+                "player": players.get(player_name),
+                "conversation": conversations.get(player_name)
+            })
+        self.world_context = world_context or {}
+
+    def get(self, player_name):
+        """Hot player dict, touched; promoted from cold or created as needed"""
+        player = self.players.get(player_name)
+        if player is None:
+            packed = self.cold.pop(player_name, None)
+            if packed is not None:
+                data = json.loads(packed)
+                player = data.get("player")
+                if data.get("conversation") is not None:
+                    self.conversations[player_name] = data["conversation"]
+            if player is None:
+                player = _new_player(player_name, self.name)
+            self.players[player_name] = player
+        player["last_seen"] = time.time()
+        self.players.move_to_end(player_name)
+        return player
+
+    def peek(self, player_name):
+        """(player, conversation) without touching or promoting"""
+        if player_name in self.players:
+            return self.players[player_name], self.conversations.get(player_name)
+        packed = self.cold.get(player_name)
+        if packed is None:
+            return None, None
+        data = json.loads(packed)
+        return data.get("player"), data.get("conversation")
+
+    def active_since(self, cutoff):
+        active = []
+        for player in reversed(self.players.values()):
+            if player.get("last_seen", 0) < cutoff:
+                break
+            active.append(player)
+        return active
+
+    def evict(self, idle_before, max_hot, keep=()):
+        evicted = 0
+        while self.players:
+            player_name, player = next(iter(self.players.items()))
+            if len(self.players) <= max_hot and player.get("last_seen", 0) >= idle_before:
+                break
+            if player_name in keep:
+                # Not journaled yet; next round
+                break
+            self.players.popitem(last=False)
+            self.cold[player_name] = json.dumps({
+                "player": player,
+                "conversation": self.conversations.pop(player_name, None)
+            })
+            evicted += 1
+        return evicted
+
+    def snapshot(self):
+        players, conversations = {}, {}
+        for player_name, packed in self.cold.items():
+            data = json.loads(packed)
+            if data.get("player") is not None:
+                players[player_name] = data["player"]
+            if data.get("conversation") is not None:
+                conversations[player_name] = data["conversation"]
+        players.update(self.players)
+        conversations.update(self.conversations)
+        return {"players": players, "conversations": conversations, "world_context": self.world_context}
+
+
 class MemoryEngine:
-    def __init__(self):
+    """
+    Player / conversation / world memory, one shard per server, persisted write-behind:
+    - A server's shard is loaded on first access; its players stay packed until they are seen
+      and are packed away again once idle (see _ServerShard).
+    - Mutations only mark the player, conversation or world context dirty.
+    - A flusher appends the current state of everything dirty to memory.journal
+      (one JSON record per line) at most flush_interval later.
+    - Once the journal passes COMPACT_BYTES it is folded into memory.json
+      (temp file, fsync, atomic replace) and truncated.
+    - Loading reads memory.json, then replays the journal; a torn last line is skipped.
+    Memory of players outside any server (server_name=None) is kept in memory only.
+    """
+
+    def __init__(self, flush_interval=FLUSH_INTERVAL):
         self.base_dir = os.path.dirname(os.path.dirname(os.path.dirname(__file__)))
         self.servers_dir = os.path.join(self.base_dir, "servers")
-        self.player_memories = {}
-        self.conversation_history = {}
-        self.world_context = {}
-        self.loaded_servers = set()
-    
+        self.shards = {None: _ServerShard(None)}
+        # AI chat runs on several worker threads; saves iterate these dicts
+        self._lock = threading.RLock()
+        self.flush_interval = flush_interval
+        # server -> {("player" | "conversation", name) | ("world", None)}
+        self._dirty = {}
+        # Held while writing files so flush() callers and the flusher don't interleave
+        self._write_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._closed = False
+        self.stats = {"flushes": 0, "records": 0, "compactions": 0, "evictions": 0}
+        self._flusher = threading.Thread(target=self._flush_loop, name="memory-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
+
     def _get_server_path(self, server_name):
         """Get the server-specific data directory"""
         return os.path.join(self.servers_dir, server_name)
-    
+
     def _get_memory_file(self, server_name):
         """Get the memory file path for a server"""
         return os.path.join(self._get_server_path(server_name), "memory.json")
-    
-    def _load_server_memory(self, server_name):
-        """Load memory for a specific server"""
-        if server_name in self.loaded_servers:
-            return
-        
+
+    def _get_journal_file(self, server_name):
+        return os.path.join(self._get_server_path(server_name), "memory.journal")
+
+    def _shard(self, server_name):
+        """The server's shard, loading it from disk the first time"""
+        shard = self.shards.get(server_name)
+        if shard is not None:
+            return shard
+        with self._lock:
+            shard = self.shards.get(server_name)
+            if shard is None:
+                shard = self._load_shard(server_name)
+                self.shards[server_name] = shard
+            return shard
+
+    def _load_shard(self, server_name):
+        shard = _ServerShard(server_name)
+        players, conversations, world_ctx = {}, {}, {}
         memory_file = self._get_memory_file(server_name)
         if os.path.exists(memory_file):
             try:
                 with open(memory_file, "r") as f:
                     data = json.load(f)
-                    # Merge into our dictionaries with server prefix
                     players = data.get("players", {})
-                    for key, val in players.items():
-                        full_key = f"{server_name}:{key}"
-                        self.player_memories[full_key] = val
-                    
                     conversations = data.get("conversations", {})
-                    for key, val in conversations.items():
-                        full_key = f"{server_name}:{key}"
-                        self.conversation_history[full_key] = val
-                    
                     world_ctx = data.get("world_context", {})
-                    if world_ctx:
-                        self.world_context[server_name] = world_ctx
             except Exception as e:
                 print(f"Error loading memory for {server_name}: {e}")
-        
-        self.loaded_servers.add(server_name)
-    
+        journal_file = self._get_journal_file(server_name)
+        if os.path.exists(journal_file):
+            replayed = 0
+            with open(journal_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash; everything before it is intact
+                        shard.journal_torn = True
+                        break
+                    kind, name, data = record.get("kind"), record.get("name"), record.get("data")
+                    if kind == "player":
+                        players[name] = data
+                    elif kind == "conversation":
+                        conversations[name] = data
+                    elif kind == "world":
+                        world_ctx = data
+                    replayed += 1
+            shard.journal_bytes = os.path.getsize(journal_file)
+            if replayed:
+                print(f"[Memory] Replayed {replayed} journal records for {server_name}")
+        shard.load(players, conversations, world_ctx)
+        return shard
+
+    def _mark_dirty(self, server_name, kind, name=None):
+        if server_name is None:
+            return
+        with self._lock:
+            self._dirty.setdefault(server_name, set()).add((kind, name))
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+                self._evict_idle()
+            except Exception as e:
+                print(f"[Memory] Flush failed: {e}")
+
+    def flush(self):
+        """Journal everything dirty now"""
+        with self._write_lock:
+            with self._lock:
+                dirty, self._dirty = self._dirty, {}
+                # Serialize under the lock; worker threads keep mutating these dicts
+                batches = {server: self._records(server, items) for server, items in dirty.items()}
+            for server_name, lines in batches.items():
+                shard = self.shards.get(server_name)
+                if shard is None:
+                    continue
+                if shard.journal_torn:
+                    # The snapshot already holds these changes
+                    self._compact(server_name, shard)
+                    continue
+                self._append_journal(server_name, shard, lines)
+                if shard.journal_bytes >= COMPACT_BYTES:
+                    self._compact(server_name, shard)
+            return sum(len(lines) for lines in batches.values())
+
+    def _records(self, server_name, items):
+        shard = self.shards.get(server_name)
+        if shard is None:
+            return []
+        lines = []
+        for kind, name in items:
+            if kind == "world":
+                data = shard.world_context
+            else:
+                player, conversation = shard.peek(name)
+                data = player if kind == "player" else conversation
+            if data is not None:
+                lines.append(json.dumps({"kind": kind, "name": name, "data": data}) + "\n")
+        return lines
+
+    def _append_journal(self, server_name, shard, lines):
+        if not lines:
+            return
+        os.makedirs(self._get_server_path(server_name), exist_ok=True)
+        with open(self._get_journal_file(server_name), "a", encoding="utf-8") as f:
+            f.writelines(lines)
+            f.flush()
+            os.fsync(f.fileno())
+        shard.journal_bytes += sum(len(l) for l in lines)
+        self.stats["flushes"] += 1
+        self.stats["records"] += len(lines)
+
+    def _compact(self, server_name, shard):
+        """Fold the journal into memory.json; called with _write_lock held"""
+        self._save_server_memory(server_name)
+        # A crash before this point replays the journal over an equally new snapshot: harmless
+        open(self._get_journal_file(server_name), "w").close()
+        shard.journal_bytes = 0
+        shard.journal_torn = False
+        self.stats["compactions"] += 1
+
+    def _evict_idle(self):
+        idle_before = time.time() - IDLE_EVICT_SECONDS
+        with self._lock:
+            for server_name, shard in self.shards.items():
+                keep = {name for kind, name in self._dirty.get(server_name, ()) if kind != "world"}
+                self.stats["evictions"] += shard.evict(idle_before, MAX_HOT_PLAYERS, keep)
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+
     def _save_server_memory(self, server_name):
         """Save memory for a specific server"""
         server_path = self._get_server_path(server_name)
         os.makedirs(server_path, exist_ok=True)
-        
-        # Extract just this server's data
-        server_players = {}
-        for key, val in self.player_memories.items():
-            if key.startswith(f"{server_name}:"):
-                player_key = key[len(f"{server_name}:"):]
-                server_players[player_key] = val
-        
-        server_convos = {}
-        for key, val in self.conversation_history.items():
-            if key.startswith(f"{server_name}:"):
-                convo_key = key[len(f"{server_name}:"):]
-                server_convos[convo_key] = val
-        
+
+        with self._lock:
+            snapshot = json.dumps(self._shard(server_name).snapshot())
         memory_file = self._get_memory_file(server_name)
-        with open(memory_file, "w") as f:
-            json.dump({
-                "players": server_players,
-                "conversations": server_convos,
-                "world_context": self.world_context.get(server_name, {})
-            }, f, indent=2)
-    
-    def _get_key(self, player_name, server_name=None):
-        """Get the storage key for player memory"""
-        if server_name:
-            return f"{server_name}:{player_name}"
-        return player_name
-    
+        tmp_file = memory_file + ".tmp"
+        with open(tmp_file, "w") as f:
+            f.write(snapshot)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_file, memory_file)
+
     def get_player(self, player_name, server_name=None):
-        if server_name:
-            self._load_server_memory(server_name)
-        
-        key = self._get_key(player_name, server_name)
-        if key not in self.player_memories:
-            self.player_memories[key] = {
-                "name": player_name,
-                "server": server_name,
-                "first_seen": time.time(),
-                "last_seen": time.time(),
-                "role": "player",
-                "playstyle": None,
-                "trust_score": 0.5,
-                "preferred_tone": "casual",
-                "frequent_commands": [],
-                "risk_flag": False,
-                "conversation_count": 0,
-                "last_intent": None,
-                "last_target": None
-            }
-        else:
-            self.player_memories[key]["last_seen"] = time.time()
-        return self.player_memories[key]
-    
+        shard = self._shard(server_name)
+        with self._lock:
+            return shard.get(player_name)
+
+    def get_active_players(self, server_name=None, within=300):
+        """Players seen in the last `within` seconds, on one server or on every loaded one"""
+        cutoff = time.time() - within
+        with self._lock:
+            if server_name is None:
+                shards = list(self.shards.values())
+            else:
+                shards = [self.shards[server_name]] if server_name in self.shards else []
+            return [player for shard in shards for player in shard.active_since(cutoff)]
+
     def update_player(self, player_name, server_name=None, **kwargs):
         player = self.get_player(player_name, server_name)
         player.update(kwargs)
-        if server_name:
-            self._save_server_memory(server_name)
-    
+        self._mark_dirty(server_name, "player", player_name)
+
     def increment_conversation(self, player_name, server_name=None):
         player = self.get_player(player_name, server_name)
         player["conversation_count"] = player.get("conversation_count", 0) + 1
-        if server_name:
-            self._save_server_memory(server_name)
-    
+        self._mark_dirty(server_name, "player", player_name)
+
     def set_last_intent(self, player_name, intent, target=None, server_name=None):
         player = self.get_player(player_name, server_name)
         player["last_intent"] = intent
         player["last_target"] = target
-        if server_name:
-            self._save_server_memory(server_name)
-    
+        self._mark_dirty(server_name, "player", player_name)
+
     def add_command_usage(self, player_name, command_type, server_name=None):
         player = self.get_player(player_name, server_name)
         freq = player.get("frequent_commands", [])
         if command_type not in freq:
             freq.append(command_type)
             player["frequent_commands"] = freq[-5:]
-        if server_name:
-            self._save_server_memory(server_name)
-    
+        self._mark_dirty(server_name, "player", player_name)
+
     def get_context(self, player_name, server_name=None):
         player = self.get_player(player_name, server_name)
-        key = self._get_key(player_name, server_name)
-        recent_convos = self.conversation_history.get(key, [])[-3:]
+        recent_convos = self._shard(server_name).conversations.get(player_name, [])[-3:]
         server_info = f" on server '{server_name}'" if server_name else ""
         context = f"Player {player_name} has been here{server_info} since {datetime.fromtimestamp(player['first_seen']).strftime('%Y-%m-%d')}. "
         context += f"Conversations: {player.get('conversation_count', 0)}. "
@@ -145,52 +381,40 @@ class MemoryEngine:
         if recent_convos:
             context += "Recent: " + " | ".join([f"'{c['user']}'→'{c['ai'][:30]}'" for c in recent_convos if len(c.get('ai', '')) > 0])
         return context
-    
+
     def add_conversation(self, player_name, user_message, ai_response, server_name=None):
-        key = self._get_key(player_name, server_name)
-        if key not in self.conversation_history:
-            self.conversation_history[key] = []
-        self.conversation_history[key].append({
-            "user": user_message,
-            "ai": ai_response,
-            "time": time.time()
-        })
-        self.conversation_history[key] = self.conversation_history[key][-10:]
-        if server_name:
-            self._save_server_memory(server_name)
-    
+        shard = self._shard(server_name)
+        with self._lock:
+            # Brings the history in from cold storage along with the player
+            shard.get(player_name)
+            history = shard.conversations.get(player_name, [])
+            history.append({
+                "user": user_message,
+                "ai": ai_response,
+                "time": time.time()
+            })
+            shard.conversations[player_name] = history[-10:]
+        self._mark_dirty(server_name, "conversation", player_name)
+
     def update_world_context(self, server_name=None, **kwargs):
-        if server_name:
-            if server_name not in self.world_context:
-                self.world_context[server_name] = {}
-            self.world_context[server_name].update(kwargs)
-            self._save_server_memory(server_name)
-        else:
-            self.world_context.update(kwargs)
-    
+        shard = self._shard(server_name)
+        with self._lock:
+            shard.world_context.update(kwargs)
+        self._mark_dirty(server_name, "world")
+
     def get_world_context(self, server_name=None):
-        if server_name:
-            self._load_server_memory(server_name)
-            return self.world_context.get(server_name, {})
-        return self.world_context if not server_name else {}
-    
+        return self._shard(server_name).world_context
+
     def clear_server_memory(self, server_name):
         """Clear all memory for a specific server"""
-        keys_to_remove = [k for k in self.player_memories.keys() if k.startswith(f"{server_name}:")]
-        for key in keys_to_remove:
-            del self.player_memories[key]
-        
-        convo_keys_to_remove = [k for k in self.conversation_history.keys() if k.startswith(f"{server_name}:")]
-        for key in convo_keys_to_remove:
-            del self.conversation_history[key]
-        
-        if server_name in self.world_context:
-            del self.world_context[server_name]
-        
-        # Delete the memory file
-        memory_file = self._get_memory_file(server_name)
-        if os.path.exists(memory_file):
-            os.remove(memory_file)
+        with self._write_lock:
+            with self._lock:
+                self.shards.pop(server_name, None)
+                self._dirty.pop(server_name, None)
+            # Delete the memory file and its journal
+            for path in (self._get_memory_file(server_name), self._get_journal_file(server_name)):
+                if os.path.exists(path):
+                    os.remove(path)
 
 
 memory_engine = MemoryEngine()
@@ -0,0 +1,71 @@
+class SequencedRingBuffer:
+    """
+    Fixed-capacity ring buffer that numbers every item:
+    - append() is O(1) and never copies or shifts existing items.
+    - Item n (1-based, monotonic) lives in slot n % capacity until overwritten.
+    - since(seq) returns the k items after seq in O(k).
+    Not thread-safe on its own; callers hold their own lock.
+    """
+
+    def __init__(self, capacity=2000):
+        self.capacity = max(1, int(capacity))
+        self._slots = [None] * self.capacity
+        self.last_seq = 0
+        self.first_seq = 1
+
+    def __len__(self):
+        return self.last_seq - self.first_seq + 1
+
+    def append(self, item):
+        self.last_seq += 1
+        self._slots[self.last_seq % self.capacity] = item
+        if self.last_seq - self.first_seq >= self.capacity:
+            self.first_seq = self.last_seq - self.capacity + 1
+        return self.last_seq
+
+    def get(self, seq):
+        if seq < self.first_seq or seq > self.last_seq:
+            return None
+        return self._slots[seq % self.capacity]
+
+    def since(self, seq, limit=None):
+        """Return (items after seq, seq of the last returned item, items lost to overwrite)"""
+        start = max(seq + 1, self.first_seq)
+        missed = start - (seq + 1)
+        end = self.last_seq
+        if limit and end - start + 1 > limit:
+            end = start + limit - 1
+        if end < start:
+            return [], max(seq, start - 1), missed
+        return self._range(start, end), end, missed
+
+    def tail(self, count):
+        count = min(max(0, count), len(self))
+        if not count:
+            return []
+        return self._range(self.last_seq - count + 1, self.last_seq)
+
+    def clear(self):
+        """Drop all items. Sequence numbers keep counting."""
+        self._slots = [None] * self.capacity
+        self.first_seq = self.last_seq + 1
+
+    def resize(self, capacity):
+        """Change capacity, keeping the newest items that still fit"""
+        capacity = max(1, int(capacity))
+        if capacity == self.capacity:
+            return
+        keep = self.tail(capacity)
+        self.capacity = capacity
+        self._slots = [None] * capacity
+        self.first_seq = self.last_seq - len(keep) + 1
+        for offset, item in enumerate(keep):
+            self._slots[(self.first_seq + offset) % capacity] = item
+
+    def _range(self, start, end):
+        # At most two contiguous slices of the slot list
+        lo = start % self.capacity
+        hi = end % self.capacity
+        if lo <= hi:
+            return self._slots[lo:hi + 1]
+        return self._slots[lo:] + self._slots[:hi + 1]
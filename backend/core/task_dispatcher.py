@@ -0,0 +1,99 @@
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class KeyedTaskDispatcher:
+    """
+    Bounded worker pool for slow, blocking work (LLM calls, locate, ...):
+    - Tasks sharing a key run one at a time, in submission order.
+    - Different keys run in parallel, up to max_workers.
+    - Queues are capped per key and overall; submit() returns None when a task is rejected.
+    """
+
+    def __init__(self, max_workers=4, max_queue_per_key=8, max_queue_total=64, name="dispatcher"):
+        self.name = name
+        self.max_workers = max(1, int(max_workers))
+        self.max_queue_per_key = max(1, int(max_queue_per_key))
+        self.max_queue_total = max(1, int(max_queue_total))
+        self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=name)
+        self._lock = threading.Lock()
+        self._queues = {}
+        self._active = set()
+        self._queued = 0
+        self.submitted = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self.max_depth_seen = 0
+        self._started = 0
+        self._wait_total = 0.0
+
+    def submit(self, key, fn, *args, **kwargs):
+        future = Future()
+        with self._lock:
+            queue = self._queues.setdefault(key, deque())
+            if self._queued >= self.max_queue_total or len(queue) >= self.max_queue_per_key:
+                self.rejected += 1
+                if not queue:
+                    self._queues.pop(key, None)
+                return None
+            queue.append((fn, args, kwargs, future, time.time()))
+            self._queued += 1
+            self.submitted += 1
+            self.max_depth_seen = max(self.max_depth_seen, self._queued)
+            if key not in self._active:
+                self._active.add(key)
+                self._executor.submit(self._run_next, key)
+        return future
+
+    def _run_next(self, key):
+        with self._lock:
+            queue = self._queues.get(key)
+            if not queue:
+                self._queues.pop(key, None)
+                self._active.discard(key)
+                return
+            fn, args, kwargs, future, queued_at = queue.popleft()
+            self._queued -= 1
+            self._started += 1
+            self._wait_total += time.time() - queued_at
+
+        if future.set_running_or_notify_cancel():
+            try:
+                future.set_result(fn(*args, **kwargs))
+                with self._lock:
+                    self.completed += 1
+            except Exception as e:
+                print(f"[{self.name}] Task for {key} failed: {e}")
+                future.set_exception(e)
+                with self._lock:
+                    self.failed += 1
+
+        # Hand the key back to the pool so one busy key can't hog a worker
+        with self._lock:
+            if self._queues.get(key):
+                self._executor.submit(self._run_next, key)
+            else:
+                self._queues.pop(key, None)
+                self._active.discard(key)
+
+    def get_stats(self):
+        with self._lock:
+            return {
+                "workers": self.max_workers,
+                "queued": self._queued,
+                "active_keys": len(self._active),
+                "max_queue_per_key": self.max_queue_per_key,
+                "max_queue_total": self.max_queue_total,
+                "max_depth_seen": self.max_depth_seen,
+                "submitted": self.submitted,
+                "completed": self.completed,
+                "failed": self.failed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self._wait_total / self._started * 1000, 1) if self._started else None
+            }
+
+    def shutdown(self, wait=False):
+        self._executor.shutdown(wait=wait, cancel_futures=True)
@@ -1,3 +1,4 @@
+import hashlib
 import json
 import os
 import re
@@ -20,7 +21,7 @@ BASE_COMMANDS = {
 class CommandCatalog:
     def __init__(self):
         self._cache = {
-            "commands": set(BASE_COMMANDS),
+            "commands": frozenset(BASE_COMMANDS),
             "meta": {"profile_path": None, "sources": []},
             "timestamp": 0,
             "fingerprint": None,
@@ -31,10 +32,24 @@ class CommandCatalog:
         self._refresh_if_needed()
         return sorted(self._cache["commands"])
 
+    def get_command_set(self):
+        """The discovered commands as a shared frozenset, for membership tests on hot paths"""
+        self._refresh_if_needed()
+        return self._cache["commands"]
+
     def get_meta(self):
         self._refresh_if_needed()
         return self._cache["meta"]
 
+    def get_fingerprint(self):
+        """Short digest of the discovered command set; changes when plugins/mods/commands.txt do"""
+        self._refresh_if_needed()
+        digest = self._cache.get("digest")
+        if digest is None:
+            digest = hashlib.sha1("\n".join(sorted(self._cache["commands"])).encode("utf-8")).hexdigest()[:12]
+            self._cache["digest"] = digest
+        return digest
+
     def suggest(self, message, limit=6):
         self._refresh_if_needed()
         tokens = re.findall(r"[a-z0-9:_-]+", (message or "").lower())
@@ -95,7 +110,7 @@ class CommandCatalog:
                 sources.append("mod_aliases")
 
         self._cache = {
-            "commands": commands,
+            "commands": frozenset(commands),
             "meta": {"profile_path": profile_path, "sources": sources},
             "timestamp": now,
             "fingerprint": fingerprint,
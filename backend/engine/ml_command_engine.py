@@ -1,8 +1,13 @@
+import atexit
 import json
 import math
 import os
 import re
-from typing import Dict, List, Optional
+import threading
+import time
+from collections import deque
+from itertools import islice
+from typing import Dict, List, Optional, Tuple
 
 from engine.command_catalog import command_catalog
 
@@ -25,19 +30,236 @@ def _extract_root(command: str) -> str:
     return first
 
 
+# Large enough that no posting passes _SampleIndex.SCAN_LIMIT on realistic chat, so
+# predictions stay exact (~0.3 ms at 10k samples, see benchmarks/ml_command_index.py)
+MAX_SAMPLES = 10000
+FLUSH_INTERVAL = 5.0
+# Unsaved samples that trigger a flush before FLUSH_INTERVAL is up
+FLUSH_SAMPLES = 100
+MODEL_VERSION = 1
+# Minimum cosine (times successes) for a learned sample to decide the root
+MIN_SCORE = 0.20
+
+
+def _norm(features: Dict[str, float]) -> float:
+    return math.sqrt(sum(v * v for v in features.values()))
+
+
+class _SampleIndex:
+    """
+    Learned samples laid out for cosine scoring:
+    - Samples with the same root, successes and features share one vector that counts them,
+      so repeated phrasings cost one entry.
+    - postings maps a feature to the vectors holding it, with the weight already divided by the
+      vector's norm (and times its successes), so a score is a sum of posting entries.
+    - best() scores the vectors holding the query's rarest feature first, then the next rarest,
+      and stops as soon as the features left could not add up to the best score so far for a
+      vector they alone hold (bounds has the most each feature adds). Common features ("me",
+      "please") are then only looked up for the vectors already found, not walked.
+    - No feature's vectors are walked beyond the SCAN_LIMIT newest. That caps a query at
+      SCAN_LIMIT vectors per query feature, but it is a ceiling, not sublinear scaling: the
+      rare features that decide a query have postings that grow with the sample count, so
+      latency grows with it too until they reach the cap. Below the cap the result is
+      exactly a full scan's; past it, older lookalikes are skipped (counted in truncated).
+    - centroids sum the features of every sample per root.
+    """
+
+    SCAN_LIMIT = 2048
+
+    def __init__(self):
+        self.roots: Dict[int, str] = {}
+        self.counts: Dict[int, int] = {}
+        self.keys: Dict[tuple, int] = {}
+        self.postings: Dict[str, Dict[int, float]] = {}
+        # feature -> largest posting entry; not lowered on removal, so it stays an upper bound
+        self.bounds: Dict[str, float] = {}
+        self.centroids: Dict[str, dict] = {}
+        self._next_id = 0
+        self.queries = 0
+        self.truncated = 0
+
+    def _key(self, sample: dict) -> tuple:
+        successes = max(1, int(sample.get("successes", 1)))
+        return sample.get("root", ""), successes, tuple(sorted(sample.get("features", {}).items()))
+
+    def add(self, sample: dict):
+        key = self._key(sample)
+        root, successes, items = key
+        vid = self.keys.get(key)
+        if vid is not None:
+            self.counts[vid] += 1
+        else:
+            norm = math.sqrt(sum(w * w for _, w in items))
+            vid = self._next_id
+            self._next_id += 1
+            self.keys[key] = vid
+            self.roots[vid] = root
+            self.counts[vid] = 1
+            for feature, weight in items:
+                if not norm:
+                    break
+                value = weight * successes / norm
+                self.postings.setdefault(feature, {})[vid] = value
+                if value > self.bounds.get(feature, 0.0):
+                    self.bounds[feature] = value
+
+        centroid = self.centroids.setdefault(root, {"features": {}, "count": 0, "norm": None})
+        for feature, weight in items:
+            centroid["features"][feature] = centroid["features"].get(feature, 0.0) + weight
+        centroid["count"] += 1
+        centroid["norm"] = None
+
+    def remove(self, sample: dict):
+        key = self._key(sample)
+        root, _, items = key
+        vid = self.keys.get(key)
+        if vid is None:
+            return
+        self.counts[vid] -= 1
+        if self.counts[vid] <= 0:
+            del self.keys[key], self.roots[vid], self.counts[vid]
+            for feature, _ in items:
+                posting = self.postings.get(feature)
+                if posting is not None:
+                    posting.pop(vid, None)
+                    if not posting:
+                        del self.postings[feature], self.bounds[feature]
+
+        centroid = self.centroids.get(root)
+        if centroid is None:
+            return
+        for feature, weight in items:
+            left = centroid["features"].get(feature, 0.0) - weight
+            if left > 1e-9:
+                centroid["features"][feature] = left
+            else:
+                centroid["features"].pop(feature, None)
+        centroid["count"] -= 1
+        centroid["norm"] = None
+        if centroid["count"] <= 0:
+            del self.centroids[root]
+
+    def best(self, query: Dict[str, float], allowed, threshold: float = MIN_SCORE) -> Tuple[Optional[str], float]:
+        """
+        Root of the vector with the highest cosine * successes, and that score. Exact whenever
+        the score is above threshold (i.e. whenever a full scan would have used it) and no
+        posting walked was cut at SCAN_LIMIT.
+        """
+        query_norm = _norm(query)
+        if not query_norm:
+            return None, 0.0
+        terms = sorted(
+            ((f, w / query_norm) for f, w in query.items() if f in self.postings),
+            key=lambda fw: len(self.postings[fw[0]])
+        )
+        # remaining[i]: the most terms i.. can add up to for a vector none of the earlier ones met
+        remaining = [0.0] * (len(terms) + 1)
+        for i in range(len(terms) - 1, -1, -1):
+            feature, weight = terms[i]
+            remaining[i] = remaining[i + 1] + weight * self.bounds[feature]
+
+        scores: Dict[int, float] = {}
+        floor = threshold
+        truncated = False
+        for i, (feature, _) in enumerate(terms):
+            if remaining[i] <= floor:
+                # Vectors not met yet can't get past the best one found
+                break
+            posting = self.postings[feature]
+            truncated = truncated or len(posting) > self.SCAN_LIMIT
+            # Newest first: vectors are added in learning order
+            for vid in islice(reversed(posting), self.SCAN_LIMIT):
+                if vid in scores:
+                    continue
+                score = 0.0
+                for f, w in terms:
+                    value = self.postings[f].get(vid)
+                    if value is not None:
+                        score += w * value
+                scores[vid] = score
+                if score > floor and self.roots[vid] in allowed:
+                    floor = score
+
+        self.queries += 1
+        self.truncated += truncated
+        best_root, best_score, best_vid = None, 0.0, None
+        for vid, score in scores.items():
+            root = self.roots[vid]
+            if root not in allowed:
+                continue
+            if score > best_score or (score == best_score and best_vid is not None and vid < best_vid):
+                best_root, best_score, best_vid = root, score, vid
+        return best_root, best_score
+
+    def nearest_centroid(self, query: Dict[str, float], allowed) -> Tuple[Optional[str], float]:
+        query_norm = _norm(query)
+        best_root, best_score = None, 0.0
+        if not query_norm:
+            return best_root, best_score
+        for root, centroid in self.centroids.items():
+            if root not in allowed:
+                continue
+            if centroid["norm"] is None:
+                centroid["norm"] = _norm(centroid["features"])
+            if not centroid["norm"]:
+                continue
+            features = centroid["features"]
+            dot = sum(w * features.get(f, 0.0) for f, w in query.items())
+            score = dot / (query_norm * centroid["norm"])
+            if score > best_score:
+                best_root, best_score = root, score
+        return best_root, best_score
+
+    def get_stats(self) -> dict:
+        return {
+            "vectors": len(self.roots),
+            "features": len(self.postings),
+            "roots": len(self.centroids),
+            "queries": self.queries,
+            "truncated": self.truncated
+        }
+
+
 class MLCommandEngine:
     """
     Lightweight online learner:
     - Learns successful intent->command mappings.
-    - Predicts command roots from intent/message features using cosine similarity.
+    - Predicts command roots from intent/message features using cosine similarity
+      against an inverted index of the learned samples (see _SampleIndex).
     - Generates Minecraft-valid commands constrained by discovered command roots.
+    - Persists write-behind: learn() only queues the sample; a flusher appends queued samples
+      to the model file every flush_interval, or sooner once flush_samples are waiting.
     """
 
-    def __init__(self):
+    def __init__(self, max_samples=MAX_SAMPLES, flush_interval=FLUSH_INTERVAL, flush_samples=FLUSH_SAMPLES, data_path=None):
         base_dir = os.path.dirname(os.path.dirname(__file__))
-        self.data_path = os.path.join(base_dir, "data", "ml_command_model.json")
-        self.max_samples = 1000
-        self.model = self._load_model()
+        self.data_path = data_path or os.path.join(base_dir, "data", "ml_command_model.jsonl")
+        # Whole model as one indented JSON document, as written before the line format
+        self.legacy_path = os.path.splitext(self.data_path)[0] + ".json"
+        self.max_samples = max_samples
+        self.flush_interval = flush_interval
+        self.flush_samples = flush_samples
+        # Samples oldest first, trimmed from the left as new ones come in
+        self.model = {"samples": deque(), "by_intent": {}}
+        self.index = _SampleIndex()
+        # learn() and predictions run on the AI worker threads; the index must not change mid-query
+        self._lock = threading.Lock()
+        # Held while writing the file so flush() callers and the flusher don't interleave
+        self._write_lock = threading.Lock()
+        # Learned since the last flush
+        self._pending = []
+        # Sample lines in the file; None when it has to be rewritten before anything is appended
+        self._file_samples = None
+        self._wake = threading.Event()
+        self._closed = False
+        self.stats = {
+            "flushes": 0, "compactions": 0, "saved_samples": 0, "file_bytes": 0,
+            "last_flush_ms": 0.0, "max_flush_ms": 0.0, "total_flush_ms": 0.0, "load_ms": 0.0
+        }
+        self._load_model()
+        self._flusher = threading.Thread(target=self._flush_loop, name="ml-model-flusher", daemon=True)
+        self._flusher.start()
+        atexit.register(self.close)
 
     def generate(self, command: Optional[str], intent_data: Optional[dict], player_name: str) -> Optional[str]:
         intent_data = intent_data or {}
@@ -73,27 +295,38 @@ class MLCommandEngine:
         features = self._features(intent_data)
         intent = (intent_data.get("intent") or "unknown").lower()
 
-        self.model["samples"].append({
+        sample = {
             "intent": intent,
             "command": command,
             "root": root,
             "features": features,
             "successes": 1
-        })
-        if len(self.model["samples"]) > self.max_samples:
-            self.model["samples"] = self.model["samples"][-self.max_samples:]
-
-        by_intent = self.model["by_intent"].setdefault(intent, {})
-        by_intent[root] = by_intent.get(root, 0) + 1
-        self._save_model()
+        }
+        with self._lock:
+            self._add_sample(sample)
+            by_intent = self.model["by_intent"].setdefault(intent, {})
+            by_intent[root] = by_intent.get(root, 0) + 1
+            self._pending.append(sample)
+            full = len(self._pending) >= self.flush_samples
+        if full:
+            self._wake.set()
+
+    def _add_sample(self, sample: dict):
+        samples = self.model["samples"]
+        samples.append(sample)
+        self.index.add(sample)
+        while len(samples) > self.max_samples:
+            self.index.remove(samples.popleft())
 
     def _predict_root(self, intent_data: dict) -> Optional[str]:
-        allowed = set(command_catalog.get_commands())
+        allowed = command_catalog.get_command_set()
         if not allowed:
             return None
 
         intent = (intent_data.get("intent") or "unknown").lower()
-        by_intent = self.model["by_intent"].get(intent, {})
+        # learn() adds roots to this dict from the other AI workers
+        with self._lock:
+            by_intent = dict(self.model["by_intent"].get(intent, {}))
         if by_intent:
             sorted_roots = sorted(by_intent.items(), key=lambda kv: kv[1], reverse=True)
             for root, _ in sorted_roots:
@@ -104,19 +337,9 @@ class MLCommandEngine:
         if not features:
             return None
 
-        best_root = None
-        best_score = 0.0
-        for sample in self.model["samples"]:
-            root = sample.get("root", "")
-            if root not in allowed:
-                continue
-            score = self._cosine(features, sample.get("features", {}))
-            score *= max(1, int(sample.get("successes", 1)))
-            if score > best_score:
-                best_score = score
-                best_root = root
-
-        if best_root and best_score > 0.20:
+        with self._lock:
+            best_root, best_score = self.index.best(features, allowed)
+        if best_root and best_score > MIN_SCORE:
             return best_root
 
         # lexical hint from message tokens
@@ -125,6 +348,12 @@ class MLCommandEngine:
             if token in allowed:
                 return token
 
+        # No single sample is close enough; take the root whose samples are closest overall
+        with self._lock:
+            best_root, best_score = self.index.nearest_centroid(features, allowed)
+        if best_root and best_score > MIN_SCORE:
+            return best_root
+
         return None
 
     def _compose_from_root(self, root: str, intent_data: dict, player_name: str) -> Optional[str]:
@@ -196,47 +425,164 @@ class MLCommandEngine:
                 features[f"pv:{token}"] = features.get(f"pv:{token}", 0.0) + 1.0
         return features
 
-    def _cosine(self, a: Dict[str, float], b: Dict[str, float]) -> float:
-        if not a or not b:
-            return 0.0
-        dot = 0.0
-        for k, v in a.items():
-            dot += v * b.get(k, 0.0)
-        na = math.sqrt(sum(v * v for v in a.values()))
-        nb = math.sqrt(sum(v * v for v in b.values()))
-        if na == 0 or nb == 0:
-            return 0.0
-        return dot / (na * nb)
-
     def _is_special_token(self, command: str) -> bool:
         low = command.lower().strip()
         return low.startswith("locate:") or low.startswith("locate_tp:")
 
     def _is_allowed_root(self, root: str) -> bool:
-        allowed = set(command_catalog.get_commands())
-        return root in allowed or root.startswith("locate:")
+        return root in command_catalog.get_command_set() or root.startswith("locate:")
 
     def _load_model(self):
+        """
+        The model file is one JSON object per line: a header holding by_intent and how many
+        sample lines followed it when it was written, then one line per sample. Samples
+        learned since are appended, so their counts are added to by_intent here.
+        """
         os.makedirs(os.path.dirname(self.data_path), exist_ok=True)
-        if not os.path.exists(self.data_path):
-            return {"samples": [], "by_intent": {}}
+        started = time.perf_counter()
+        if os.path.exists(self.data_path):
+            self._load_lines()
+        elif os.path.exists(self.legacy_path):
+            try:
+                with open(self.legacy_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+                for sample in data.get("samples", []):
+                    self._add_sample(sample)
+                self.model["by_intent"] = data.get("by_intent", {})
+                print(f"[MLCommand] Converting {self.legacy_path} to {os.path.basename(self.data_path)}")
+            except Exception as e:
+                print(f"[MLCommand] Load failed: {e}")
+        self.stats["load_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    def _load_lines(self):
+        by_intent = {}
+        loaded = 0
+        clean = False
         try:
             with open(self.data_path, "r", encoding="utf-8") as f:
-                data = json.load(f)
-                if isinstance(data, dict):
-                    data.setdefault("samples", [])
-                    data.setdefault("by_intent", {})
-                    return data
-        except Exception:
-            pass
-        return {"samples": [], "by_intent": {}}
-
-    def _save_model(self):
-        try:
-            with open(self.data_path, "w", encoding="utf-8") as f:
-                json.dump(self.model, f, indent=2)
-        except Exception:
-            pass
-
-
-ml_command_engine = MLCommandEngine()
+                header = json.loads(f.readline())
+                by_intent = header.get("by_intent", {})
+                snapshot = int(header.get("samples", 0))
+                for line in f:
+                    try:
+                        sample = json.loads(line)
+                    except ValueError:
+                        # Torn append from a crash; everything before it is intact
+                        break
+                    if loaded >= snapshot:
+                        counts = by_intent.setdefault(sample.get("intent", "unknown"), {})
+                        counts[sample["root"]] = counts.get(sample["root"], 0) + 1
+                    self._add_sample(sample)
+                    loaded += 1
+                else:
+                    clean = True
+        except (OSError, ValueError, AttributeError) as e:
+            print(f"[MLCommand] Load failed: {e}")
+        self.model["by_intent"] = by_intent
+        # Appending after a torn line would hide everything appended from the next load
+        self._file_samples = loaded if clean else None
+        self.stats["file_bytes"] = os.path.getsize(self.data_path)
+
+    def _flush_loop(self):
+        while not self._closed:
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"[MLCommand] Flush failed: {e}")
+
+    def flush(self):
+        """Write samples learned since the last flush; rewrites the file once it holds twice max_samples"""
+        with self._write_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+                compact = self._file_samples is None or self._file_samples + len(pending) > 2 * self.max_samples
+                if not pending and not compact:
+                    return 0
+                if compact:
+                    # Samples are never changed once learned, so a shallow copy is a consistent snapshot
+                    samples = list(self.model["samples"])
+                    by_intent = {intent: dict(counts) for intent, counts in self.model["by_intent"].items()}
+            started = time.perf_counter()
+            try:
+                if compact:
+                    self._write_snapshot(by_intent, samples)
+                    self._file_samples = len(samples)
+                    self.stats["compactions"] += 1
+                else:
+                    self._append(pending)
+                    self._file_samples += len(pending)
+            except OSError as e:
+                print(f"[MLCommand] Save failed: {e}")
+                with self._lock:
+                    self._pending[:0] = pending
+                # The append may have left half a line behind
+                self._file_samples = None
+                return 0
+            elapsed = (time.perf_counter() - started) * 1000
+            self.stats["flushes"] += 1
+            self.stats["saved_samples"] += len(pending)
+            self.stats["last_flush_ms"] = round(elapsed, 2)
+            self.stats["max_flush_ms"] = round(max(self.stats["max_flush_ms"], elapsed), 2)
+            self.stats["total_flush_ms"] += elapsed
+            self.stats["file_bytes"] = os.path.getsize(self.data_path)
+            return len(pending)
+
+    def _write_snapshot(self, by_intent, samples):
+        header = {"version": MODEL_VERSION, "samples": len(samples), "by_intent": by_intent}
+        tmp_path = self.data_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps(header, separators=(",", ":")) + "\n")
+            f.writelines(json.dumps(sample, separators=(",", ":")) + "\n" for sample in samples)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.data_path)
+
+    def _append(self, samples):
+        with open(self.data_path, "a", encoding="utf-8") as f:
+            f.writelines(json.dumps(sample, separators=(",", ":")) + "\n" for sample in samples)
+            f.flush()
+            os.fsync(f.fileno())
+
+    def close(self):
+        self._closed = True
+        self._wake.set()
+        self._flusher.join(timeout=5)
+        self.flush()
+
+    def get_stats(self) -> dict:
+        with self._lock:
+            pending = len(self._pending)
+            samples = len(self.model["samples"])
+        flushes = self.stats["flushes"]
+        return {
+            "samples": samples,
+            "pending": pending,
+            "file_samples": self._file_samples,
+            "file_bytes": self.stats["file_bytes"],
+            "flushes": flushes,
+            "compactions": self.stats["compactions"],
+            "saved_samples": self.stats["saved_samples"],
+            "last_flush_ms": self.stats["last_flush_ms"],
+            "avg_flush_ms": round(self.stats["total_flush_ms"] / flushes, 2) if flushes else 0.0,
+            "max_flush_ms": self.stats["max_flush_ms"],
+            "load_ms": self.stats["load_ms"],
+            "flush_interval": self.flush_interval,
+            "flush_samples": self.flush_samples
+        }
+
+
+_engine_lock = threading.Lock()
+
+
+def __getattr__(name):
+    # The shared engine is built on first use of the name, so importing this module for
+    # MLCommandEngine alone (benchmarks) doesn't load or write the real model file
+    if name == "ml_command_engine":
+        with _engine_lock:
+            engine = globals().get("ml_command_engine")
+            if engine is None:
+                engine = globals()["ml_command_engine"] = MLCommandEngine()
+        return engine
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
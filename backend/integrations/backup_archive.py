@@ -0,0 +1,285 @@
+import io
+import os
+import struct
+import time
+import zipfile
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+from integrations.backup_compression import CompressionReport, file_kind
+
+DEFAULT_BLOCK_SIZE = 4 * 1024 * 1024
+DEFAULT_LEVEL = 6
+
+ZIP_STORED = 0
+ZIP_DEFLATED = 8
+
+_ZIP64_LIMIT = 0xFFFFFFFF
+_FLAG_DATA_DESCRIPTOR = 0x08
+_FLAG_UTF8 = 0x800
+
+
+def _dos_datetime(timestamp):
+    t = time.localtime(timestamp)
+    year = max(1980, t.tm_year)
+    dos_date = ((year - 1980) << 9) | (t.tm_mon << 5) | t.tm_mday
+    dos_time = (t.tm_hour << 11) | (t.tm_min << 5) | (t.tm_sec // 2)
+    return dos_time, dos_date
+
+
+def _deflate_block(data, level, last):
+    # Raw deflate; SYNC_FLUSH ends each block on a byte boundary so blocks concatenate into one stream
+    started = time.thread_time()
+    compressor = zlib.compressobj(level, zlib.DEFLATED, -15)
+    packed = compressor.compress(data) + compressor.flush(zlib.Z_FINISH if last else zlib.Z_SYNC_FLUSH)
+    return packed, time.thread_time() - started
+
+
+class _Entry:
+    __slots__ = (
+        "name", "kind", "reason", "method", "dos_time", "dos_date", "mode", "zip64",
+        "offset", "crc", "compressed", "size", "cpu"
+    )
+
+    def __init__(self, name, method, mtime, mode, zip64, reason=None):
+        self.kind = file_kind(name)
+        self.reason = reason
+        self.name = name.encode("utf-8")
+        self.method = method
+        self.dos_time, self.dos_date = _dos_datetime(mtime)
+        self.mode = mode
+        self.zip64 = zip64
+        self.offset = 0
+        self.crc = 0
+        self.compressed = 0
+        self.size = 0
+        self.cpu = 0.0
+
+
+class ParallelZipWriter:
+    """
+    Zip writer that deflates on a thread pool:
+    - Files are read in fixed-size blocks; each block is deflated independently by a worker
+      (zlib releases the GIL) and the results are written back in order.
+    - At most max_pending blocks are in flight, which caps memory regardless of file sizes.
+    - Entries use data descriptors and the writer counts its own offsets, so the output
+      only needs write(); it can be a pipe or an upload stream.
+    - With a CompressionPolicy, add_file() stores files that would not shrink; report
+      holds per file-type sizes and deflate CPU time.
+    - throttle(n), if given, is called after every block read (see BackupGovernor).
+    - With a single worker, entries go through zipfile instead: one deflate stream per entry
+      beats independent blocks when nothing runs in parallel (benchmarks/backup_archive.py).
+    """
+
+    def __init__(self, fileobj, workers=None, block_size=DEFAULT_BLOCK_SIZE, level=DEFAULT_LEVEL, max_pending=None, policy=None, throttle=None):
+        self.fileobj = fileobj
+        self.policy = policy
+        self.throttle = throttle
+        self.report = CompressionReport()
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.block_size = block_size
+        self.level = level
+        self.max_pending = max_pending or self.workers * 2
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="zip") if self.workers > 1 else None
+        self._zip = zipfile.ZipFile(fileobj, "w", zipfile.ZIP_DEFLATED, allowZip64=True) if self.workers == 1 else None
+        self._pending = deque()
+        self._pending_blocks = 0
+        self._entries = []
+        self._offset = 0
+        self._closed = False
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.started_at = time.time()
+
+    def _write(self, data):
+        self.fileobj.write(data)
+        self._offset += len(data)
+
+    def add_file(self, path, arcname, compress=None):
+        """compress=None lets the policy decide (deflate when there is no policy)"""
+        st = os.stat(path)
+        reason = None
+        if compress is None:
+            compress, reason = self.policy.decide(path, st.st_size) if self.policy else (True, None)
+        with open(path, "rb") as f:
+            self._add_stream(f, arcname, st.st_size, st.st_mtime, st.st_mode, compress, reason)
+
+    def add_bytes(self, data, arcname, compress=True, mtime=None):
+        self._add_stream(io.BytesIO(data), arcname, len(data), mtime or time.time(), 0o100644, compress)
+
+    def _add_stream(self, stream, arcname, size_hint, mtime, mode, compress, reason=None):
+        method = ZIP_DEFLATED if compress else ZIP_STORED
+        # Leave room for deflate overhead on incompressible data
+        zip64 = size_hint + size_hint // 100 + 65536 >= _ZIP64_LIMIT
+        entry = _Entry(arcname.replace(os.sep, "/"), method, mtime, mode, zip64, reason)
+        if self._zip is not None:
+            self._add_zip_entry(stream, entry, mtime)
+            return
+        self._enqueue(("header", entry, None, None))
+        first = True
+        data = self._read(stream)
+        while True:
+            following = self._read(stream) if data else b""
+            last = not following
+            # An empty file still needs a valid (empty) deflate stream
+            if data or (first and method == ZIP_DEFLATED):
+                if method == ZIP_DEFLATED and self._executor:
+                    result = self._executor.submit(_deflate_block, data, self.level, last)
+                elif method == ZIP_DEFLATED:
+                    result = _deflate_block(data, self.level, last)
+                else:
+                    result = (data, 0.0)
+                self._enqueue(("block", entry, data, result))
+            first = False
+            if last:
+                break
+            data = following
+        self._enqueue(("end", entry, None, None))
+
+    def _add_zip_entry(self, stream, entry, mtime):
+        info = zipfile.ZipInfo(entry.name.decode("utf-8"), date_time=max(time.localtime(mtime)[:6], (1980, 1, 1, 0, 0, 0)))
+        info.compress_type = entry.method
+        # ZipInfo's level attribute; zipfile only fills it in for write()/writestr()
+        info._compresslevel = self.level
+        info.external_attr = (entry.mode & 0xFFFF) << 16
+        with self._zip.open(info, "w", force_zip64=entry.zip64) as dest:
+            while True:
+                data = self._read(stream)
+                if not data:
+                    break
+                started = time.thread_time()
+                dest.write(data)
+                entry.cpu += time.thread_time() - started
+        entry.crc, entry.size, entry.compressed = info.CRC, info.file_size, info.compress_size
+        self.bytes_in += entry.size
+        self.bytes_out += entry.compressed
+        self._entries.append(entry)
+        self.report.record(entry.kind, entry.method == ZIP_DEFLATED, entry.size, entry.compressed, entry.cpu, entry.reason)
+
+    def _read(self, stream):
+        data = stream.read(self.block_size)
+        if self.throttle and data:
+            self.throttle(len(data))
+        return data
+
+    def _enqueue(self, item):
+        self._pending.append(item)
+        if item[0] == "block":
+            self._pending_blocks += 1
+        while self._pending_blocks > self.max_pending or len(self._pending) > self.max_pending * 4:
+            self._drain_one()
+
+    def _drain_one(self):
+        kind, entry, raw, result = self._pending.popleft()
+        if kind == "block":
+            self._pending_blocks -= 1
+        if kind == "header":
+            entry.offset = self._offset
+            self._write(self._local_header(entry))
+        elif kind == "block":
+            compressed, seconds = result.result() if hasattr(result, "result") else result
+            entry.cpu += seconds
+            entry.crc = zlib.crc32(raw, entry.crc)
+            entry.size += len(raw)
+            entry.compressed += len(compressed)
+            self.bytes_in += len(raw)
+            self.bytes_out += len(compressed)
+            self._write(compressed)
+        else:
+            if entry.zip64:
+                self._write(struct.pack("<IIQQ", 0x08074B50, entry.crc, entry.compressed, entry.size))
+            else:
+                if entry.compressed >= _ZIP64_LIMIT or entry.size >= _ZIP64_LIMIT:
+                    raise ValueError(f"{entry.name.decode()} grew past 4 GiB while being archived")
+                self._write(struct.pack("<IIII", 0x08074B50, entry.crc, entry.compressed, entry.size))
+            self._entries.append(entry)
+            self.report.record(entry.kind, entry.method == ZIP_DEFLATED, entry.size, entry.compressed, entry.cpu, entry.reason)
+
+    def _local_header(self, entry):
+        extra = b""
+        sizes = 0
+        version = 20
+        if entry.zip64:
+            extra = struct.pack("<HHQQ", 0x0001, 16, 0, 0)
+            sizes = _ZIP64_LIMIT
+            version = 45
+        return struct.pack(
+            "<IHHHHHIIIHH",
+            0x04034B50, version, _FLAG_DATA_DESCRIPTOR | _FLAG_UTF8, entry.method,
+            entry.dos_time, entry.dos_date, 0, sizes, sizes, len(entry.name), len(extra)
+        ) + entry.name + extra
+
+    def _central_header(self, entry):
+        fields = []
+        compressed = entry.compressed
+        size = entry.size
+        offset = entry.offset
+        if size >= _ZIP64_LIMIT:
+            fields.append(size)
+            size = _ZIP64_LIMIT
+        if compressed >= _ZIP64_LIMIT:
+            fields.append(compressed)
+            compressed = _ZIP64_LIMIT
+        if offset >= _ZIP64_LIMIT:
+            fields.append(offset)
+            offset = _ZIP64_LIMIT
+        extra = b""
+        version = 20
+        if fields:
+            extra = struct.pack(f"<HH{len(fields)}Q", 0x0001, 8 * len(fields), *fields)
+            version = 45
+        return struct.pack(
+            "<IHHHHHHIIIHHHHHII",
+            0x02014B50, (3 << 8) | version, version, _FLAG_DATA_DESCRIPTOR | _FLAG_UTF8, entry.method,
+            entry.dos_time, entry.dos_date, entry.crc, compressed, size,
+            len(entry.name), len(extra), 0, 0, 0, (entry.mode & 0xFFFF) << 16, offset
+        ) + entry.name + extra
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._zip is not None:
+            self._zip.close()
+            return
+        try:
+            while self._pending:
+                self._drain_one()
+            cd_offset = self._offset
+            for entry in self._entries:
+                self._write(self._central_header(entry))
+            cd_size = self._offset - cd_offset
+            count = len(self._entries)
+            if count >= 0xFFFF or cd_offset >= _ZIP64_LIMIT or cd_size >= _ZIP64_LIMIT:
+                eocd64_offset = self._offset
+                self._write(struct.pack("<IQHHIIQQQQ", 0x06064B50, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset))
+                self._write(struct.pack("<IIQI", 0x07064B50, 0, eocd64_offset, 1))
+                self._write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, 0xFFFF, 0xFFFF, _ZIP64_LIMIT, _ZIP64_LIMIT, 0))
+            else:
+                self._write(struct.pack("<IHHHHIIH", 0x06054B50, 0, 0, count, count, cd_size, cd_offset, 0))
+        finally:
+            if self._executor:
+                self._executor.shutdown(wait=True)
+
+    def get_stats(self):
+        seconds = max(0.001, time.time() - self.started_at)
+        return {
+            "files": len(self._entries),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "ratio": round(self.bytes_out / self.bytes_in, 4) if self.bytes_in else None,
+            "seconds": round(seconds, 2),
+            "mb_per_sec": round(self.bytes_in / seconds / (1024 * 1024), 1),
+            "workers": self.workers,
+            "by_type": self.report.summary()
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        elif self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
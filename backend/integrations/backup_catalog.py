@@ -0,0 +1,259 @@
+import json
+import os
+import sqlite3
+import threading
+import zipfile
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    id TEXT PRIMARY KEY,
+    profile TEXT NOT NULL,
+    name TEXT,
+    file_name TEXT,
+    created_at INTEGER NOT NULL,
+    backup_type TEXT,
+    mode TEXT,
+    source TEXT,
+    status TEXT,
+    size INTEGER,
+    duration REAL,
+    providers TEXT,
+    manifest_id TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS backups_profile_created ON backups (profile, created_at);
+CREATE INDEX IF NOT EXISTS backups_created ON backups (created_at);
+CREATE INDEX IF NOT EXISTS backups_manifest ON backups (manifest_id);
+CREATE TABLE IF NOT EXISTS paths (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    name TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS paths_name ON paths (name);
+CREATE TABLE IF NOT EXISTS versions (
+    id INTEGER PRIMARY KEY,
+    path_id INTEGER NOT NULL,
+    digest TEXT NOT NULL,
+    size INTEGER,
+    mtime_ns INTEGER,
+    UNIQUE (path_id, digest)
+);
+CREATE TABLE IF NOT EXISTS backup_files (
+    backup_id TEXT NOT NULL,
+    version_id INTEGER NOT NULL,
+    PRIMARY KEY (backup_id, version_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS backup_files_version ON backup_files (version_id);
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT
+);
+"""
+
+
+def archive_files(zip_path):
+    """(path, size, digest, mtime_ns) for every file in a zip, read from its central directory"""
+    with zipfile.ZipFile(zip_path) as zf:
+        for info in zf.infolist():
+            if not info.is_dir():
+                yield info.filename, info.file_size, "crc32:%08x" % info.CRC, None
+
+
+def manifest_files(manifest):
+    """(path, size, digest, mtime_ns) for every file in a chunk-store manifest"""
+    for rel, entry in manifest.get("files", {}).items():
+        yield rel, entry.get("size"), f"sha256:{entry.get('sha256')}", entry.get("mtime_ns")
+
+
+class BackupCatalog:
+    """
+    SQLite index of backups, so history no longer lives in one JSON file rewritten per backup:
+    - backups: one row per backup with the columns listings filter on, plus the full record as JSON.
+    - paths / versions / backup_files: which version of which file each backup holds. A version is
+      a distinct content hash (sha256 for incremental backups, crc32 for zip archives), so an
+      unchanged region shared by a thousand backups is stored once plus a 2-integer row each.
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.executescript(_SCHEMA)
+
+    def _row_values(self, record):
+        return (
+            record["id"],
+            record.get("profile"),
+            record.get("name"),
+            record.get("file_name"),
+            int(record.get("created_at", 0)),
+            record.get("backup_type"),
+            record.get("mode"),
+            record.get("source"),
+            record.get("status"),
+            int(record.get("size") or 0),
+            record.get("duration_seconds"),
+            ",".join(record.get("providers") or []),
+            (record.get("incremental") or {}).get("manifest_id"),
+            json.dumps(record)
+        )
+
+    def add(self, record, files=None):
+        """Insert or replace a backup record; files is an iterable of (path, size, digest, mtime_ns)"""
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT OR REPLACE INTO backups (id, profile, name, file_name, created_at, backup_type, mode, "
+                "source, status, size, duration, providers, manifest_id, record) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._row_values(record)
+            )
+            if files is not None:
+                self._db.execute("DELETE FROM backup_files WHERE backup_id = ?", (record["id"],))
+                self._add_files(record["id"], files)
+
+    def _add_files(self, backup_id, files):
+        cur = self._db.cursor()
+        rows = []
+        for path, size, digest, mtime_ns in files:
+            path = path.replace("\\", "/")
+            cur.execute("INSERT OR IGNORE INTO paths (path, name) VALUES (?, ?)", (path, path.rsplit("/", 1)[-1]))
+            path_id = cur.execute("SELECT id FROM paths WHERE path = ?", (path,)).fetchone()[0]
+            cur.execute(
+                "INSERT OR IGNORE INTO versions (path_id, digest, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                (path_id, digest, size, mtime_ns)
+            )
+            version_id = cur.execute(
+                "SELECT id FROM versions WHERE path_id = ? AND digest = ?", (path_id, digest)
+            ).fetchone()[0]
+            rows.append((backup_id, version_id))
+        cur.executemany("INSERT OR IGNORE INTO backup_files (backup_id, version_id) VALUES (?, ?)", rows)
+
+    def update(self, record):
+        """Rewrite one record (e.g. after a resumed upload) without touching its file index"""
+        self.add(record)
+
+    def get(self, backup_id):
+        with self._lock:
+            row = self._db.execute("SELECT record FROM backups WHERE id = ?", (backup_id,)).fetchone()
+        return json.loads(row["record"]) if row else None
+
+    def find(self, profile, ref):
+        """Newest backup of a profile whose id, name or file name is ref"""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT record FROM backups WHERE profile = ? AND (id = ? OR name = ? OR file_name = ?) "
+                "ORDER BY created_at DESC LIMIT 1",
+                (profile, ref, ref, ref)
+            ).fetchone()
+        return json.loads(row["record"]) if row else None
+
+    def names(self, profile, prefix):
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT name FROM backups WHERE profile = ? AND name LIKE ? ESCAPE '\\'",
+                (profile, prefix.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%")
+            ).fetchall()
+        return {r["name"] for r in rows}
+
+    def list(self, profile=None, backup_type=None, source=None, mode=None, since=None, until=None, limit=100, offset=0):
+        """Records newest first, filtered and paginated"""
+        where, args = [], []
+        for column, value in (("profile", profile), ("backup_type", backup_type), ("source", source), ("mode", mode)):
+            if value:
+                where.append(f"{column} = ?")
+                args.append(value)
+        if since is not None:
+            where.append("created_at >= ?")
+            args.append(int(since))
+        if until is not None:
+            where.append("created_at < ?")
+            args.append(int(until))
+        sql = "SELECT record FROM backups"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += " ORDER BY created_at DESC, rowid DESC LIMIT ? OFFSET ?"
+        args += [max(1, int(limit)), max(0, int(offset))]
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        return [json.loads(r["record"]) for r in rows]
+
+    def _path_filter(self, path):
+        # A bare file name (r.3.-2.mca) matches it in every folder; anything with a slash is exact
+        path = path.replace("\\", "/")
+        return ("p.path = ?", path) if "/" in path else ("p.name = ?", path)
+
+    def file_versions(self, profile, path):
+        """Distinct versions of a file across a profile's backups, newest first"""
+        clause, value = self._path_filter(path)
+        sql = (
+            "SELECT p.path, v.digest, v.size, v.mtime_ns, COUNT(*) AS backups, "
+            "MIN(b.created_at) AS first_seen, MAX(b.created_at) AS last_seen "
+            "FROM paths p JOIN versions v ON v.path_id = p.id "
+            "JOIN backup_files f ON f.version_id = v.id JOIN backups b ON b.id = f.backup_id "
+            f"WHERE {clause} AND b.profile = ? GROUP BY v.id ORDER BY last_seen DESC"
+        )
+        with self._lock:
+            rows = self._db.execute(sql, (value, profile)).fetchall()
+        return [dict(r) for r in rows]
+
+    def backups_with(self, profile, path, version=None, limit=100, offset=0):
+        """
+        Backups holding a file, optionally only at one version: a digest or a prefix of it,
+        with or without its "sha256:" / "crc32:" label.
+        """
+        clause, value = self._path_filter(path)
+        sql = (
+            "SELECT b.record, p.path, v.digest FROM paths p JOIN versions v ON v.path_id = p.id "
+            "JOIN backup_files f ON f.version_id = v.id JOIN backups b ON b.id = f.backup_id "
+            f"WHERE {clause} AND b.profile = ?"
+        )
+        args = [value, profile]
+        if version:
+            version = str(version)
+            if ":" not in version:
+                sql += " AND (v.digest LIKE ? OR v.digest LIKE ?)"
+                args += [f"sha256:{version}%", f"crc32:{version}%"]
+            else:
+                sql += " AND v.digest LIKE ?"
+                args.append(f"{version}%")
+        sql += " ORDER BY b.created_at DESC LIMIT ? OFFSET ?"
+        args += [max(1, int(limit)), max(0, int(offset))]
+        with self._lock:
+            rows = self._db.execute(sql, args).fetchall()
+        results = []
+        for r in rows:
+            record = json.loads(r["record"])
+            results.append({"backup": record, "path": r["path"], "digest": r["digest"]})
+        return results
+
+    def expire(self, manifest_ids):
+        """Mark incremental backups whose manifests retention dropped; the file index goes, the row stays"""
+        if not manifest_ids:
+            return
+        with self._lock, self._db:
+            for manifest_id in manifest_ids:
+                row = self._db.execute("SELECT id, record FROM backups WHERE manifest_id = ?", (manifest_id,)).fetchone()
+                if row is None:
+                    continue
+                record = json.loads(row["record"])
+                record["status"] = "expired"
+                self._db.execute(
+                    "UPDATE backups SET status = 'expired', record = ? WHERE id = ?", (json.dumps(record), row["id"])
+                )
+                self._db.execute("DELETE FROM backup_files WHERE backup_id = ?", (row["id"],))
+            # Versions no backup references any more
+            self._db.execute(
+                "DELETE FROM versions WHERE NOT EXISTS (SELECT 1 FROM backup_files f WHERE f.version_id = versions.id)"
+            )
+
+    def get_meta(self, key, default=None):
+        with self._lock:
+            row = self._db.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()
+        return row["value"] if row else default
+
+    def set_meta(self, key, value):
+        with self._lock, self._db:
+            self._db.execute("INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (key, str(value)))
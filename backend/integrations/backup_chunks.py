@@ -0,0 +1,320 @@
+import datetime
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+
+from integrations.backup_compression import CompressionReport, file_kind
+
+DEFAULT_CHUNK_SIZE = 1024 * 1024
+DEFAULT_RETENTION = {"hourly": 24, "daily": 7, "weekly": 4}
+
+# One byte in front of every stored object says how the payload is encoded
+_RAW = b"R"
+_ZLIB = b"Z"
+
+
+class ChunkStore:
+    """
+    Content-addressed, deduplicating backup store:
+    - Files are cut into fixed-size chunks named by their sha256 (objects/ab/abcd...).
+      Region files change in place sector by sector, so fixed offsets dedup well.
+    - A backup is only a manifest of path -> chunk hashes (manifests/<profile>/<id>.json).
+    - Files whose size and mtime match the previous manifest are not read at all.
+    - An optional CompressionPolicy decides per file whether new chunks are worth zlib.
+    - Retention drops old manifests; gc() deletes chunks no manifest references.
+    """
+
+    def __init__(self, root, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.objects_dir = os.path.join(root, "objects")
+        self.manifests_dir = os.path.join(root, "manifests")
+        os.makedirs(self.objects_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+        # Held for a whole snapshot or gc so gc never sweeps chunks of a backup in progress
+        self._lock = threading.RLock()
+
+    def _object_path(self, digest):
+        return os.path.join(self.objects_dir, digest[:2], digest)
+
+    def has(self, digest):
+        return os.path.exists(self._object_path(digest))
+
+    def put(self, digest, data, compress=True):
+        """Store a chunk unless it exists. Returns the number of bytes written to disk."""
+        path = self._object_path(digest)
+        if os.path.exists(path):
+            return 0
+        payload = _RAW + data
+        if compress:
+            packed = zlib.compress(data, 1)
+            # Not worth the decompression cost below ~10% savings
+            if len(packed) < len(data) * 0.9:
+                payload = _ZLIB + packed
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return len(payload)
+
+    def get(self, digest):
+        with open(self._object_path(digest), "rb") as f:
+            payload = f.read()
+        if payload[:1] == _ZLIB:
+            return zlib.decompress(payload[1:])
+        return payload[1:]
+
+    def object_path(self, digest):
+        return self._object_path(digest)
+
+    def manifest_path(self, profile, backup_id):
+        return os.path.join(self.manifests_dir, profile, f"{backup_id}.json")
+
+    def list_manifests(self, profile):
+        """Manifest headers (no file tables) for a profile, newest first"""
+        folder = os.path.join(self.manifests_dir, profile)
+        if not os.path.isdir(folder):
+            return []
+        headers = []
+        for name in os.listdir(folder):
+            if not name.endswith(".json"):
+                continue
+            try:
+                manifest = self.load_manifest(profile, name[:-5])
+            except Exception:
+                continue
+            manifest.pop("files", None)
+            headers.append(manifest)
+        headers.sort(key=lambda m: m.get("created_at", 0), reverse=True)
+        return headers
+
+    def load_manifest(self, profile, backup_id):
+        with open(self.manifest_path(profile, backup_id), "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def latest_manifest(self, profile):
+        headers = self.list_manifests(profile)
+        if not headers:
+            return None
+        try:
+            return self.load_manifest(profile, headers[0]["id"])
+        except Exception:
+            return None
+
+    def _save_manifest(self, profile, manifest):
+        path = self.manifest_path(profile, manifest["id"])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f)
+        os.replace(tmp_path, path)
+        return path
+
+    def delete_manifest(self, profile, backup_id):
+        try:
+            os.remove(self.manifest_path(profile, backup_id))
+            return True
+        except OSError:
+            return False
+
+    def snapshot(self, profile, backup_id, files, progress=None, policy=None, throttle=None):
+        """
+        Record a backup of files, an iterable of (absolute path, relative path).
+        throttle(n), if given, is called after every chunk read.
+        Returns (manifest, manifest path, new chunk hashes, stats).
+        """
+        with self._lock:
+            started = time.time()
+            report = CompressionReport()
+            previous = self.latest_manifest(profile)
+            previous_files = (previous or {}).get("files", {})
+            manifest = {
+                "id": backup_id,
+                "profile": profile,
+                "created_at": int(started),
+                "chunk_size": self.chunk_size,
+                "files": {}
+            }
+            new_chunks = []
+            stats = {
+                "files": 0,
+                "files_unchanged": 0,
+                "logical_bytes": 0,
+                "read_bytes": 0,
+                "new_chunks": 0,
+                "new_bytes": 0,
+                "written_bytes": 0
+            }
+            for path, rel in files:
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                rel = rel.replace(os.sep, "/")
+                stats["files"] += 1
+                stats["logical_bytes"] += st.st_size
+                prior = previous_files.get(rel)
+                if (
+                    prior
+                    and prior.get("size") == st.st_size
+                    and prior.get("mtime_ns") == st.st_mtime_ns
+                    and all(self.has(h) for h in prior.get("chunks", []))
+                ):
+                    manifest["files"][rel] = prior
+                    stats["files_unchanged"] += 1
+                    continue
+                entry = self._store_file(path, st, stats, new_chunks, policy, report, throttle)
+                if entry:
+                    manifest["files"][rel] = entry
+                if progress:
+                    progress(stats)
+            stats["seconds"] = round(time.time() - started, 2)
+            stats["dedup_ratio"] = round(1 - stats["new_bytes"] / stats["logical_bytes"], 4) if stats["logical_bytes"] else None
+            stats["by_type"] = report.summary()
+            manifest["stats"] = stats
+            manifest_path = self._save_manifest(profile, manifest)
+            return manifest, manifest_path, new_chunks, stats
+
+    def _store_file(self, path, st, stats, new_chunks, policy=None, report=None, throttle=None):
+        chunks = []
+        file_hash = hashlib.sha256()
+        compress, reason = policy.decide(path, st.st_size) if policy else (True, None)
+        new_bytes = 0
+        written_bytes = 0
+        cpu = 0.0
+        try:
+            with open(path, "rb") as f:
+                while True:
+                    data = f.read(self.chunk_size)
+                    if not data:
+                        break
+                    stats["read_bytes"] += len(data)
+                    if throttle:
+                        throttle(len(data))
+                    file_hash.update(data)
+                    digest = hashlib.sha256(data).hexdigest()
+                    cpu_started = time.thread_time()
+                    written = self.put(digest, data, compress=compress)
+                    cpu += time.thread_time() - cpu_started
+                    if written:
+                        new_bytes += len(data)
+                        written_bytes += written
+                        stats["new_chunks"] += 1
+                        stats["new_bytes"] += len(data)
+                        stats["written_bytes"] += written
+                        new_chunks.append(digest)
+                    chunks.append(digest)
+        except OSError as e:
+            # Files can vanish or be locked while the server is running
+            print(f"[Backup] Skipped {path}: {e}")
+            return None
+        if report is not None:
+            # Deduplicated chunks cost nothing to store, so only new data counts toward the ratio
+            report.record(file_kind(path), compress, new_bytes, written_bytes, cpu, reason)
+        return {
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "sha256": file_hash.hexdigest(),
+            "chunks": chunks
+        }
+
+    def select_expired(self, profile, retention=None):
+        """Manifest ids not kept by the hourly/daily/weekly retention policy"""
+        retention = dict(DEFAULT_RETENTION, **(retention or {}))
+        headers = self.list_manifests(profile)
+        if not headers:
+            return []
+        keep = {headers[0]["id"]}
+        buckets = {
+            "hourly": lambda d: d.strftime("%Y%m%d%H"),
+            "daily": lambda d: d.strftime("%Y%m%d"),
+            "weekly": lambda d: "%d-%02d" % d.isocalendar()[:2],
+        }
+        for period, bucket_of in buckets.items():
+            limit = max(0, int(retention.get(period, 0)))
+            seen = set()
+            for header in headers:
+                if len(seen) >= limit:
+                    break
+                bucket = bucket_of(datetime.datetime.fromtimestamp(header.get("created_at", 0)))
+                if bucket in seen:
+                    continue
+                # Newest backup in each bucket represents it
+                seen.add(bucket)
+                keep.add(header["id"])
+        return [h["id"] for h in headers if h["id"] not in keep]
+
+    def apply_retention(self, profile, retention=None):
+        with self._lock:
+            expired = self.select_expired(profile, retention)
+            for backup_id in expired:
+                self.delete_manifest(profile, backup_id)
+            return expired
+
+    def gc(self):
+        """Delete chunks no manifest references. Returns (chunks removed, bytes freed)."""
+        with self._lock:
+            referenced = set()
+            for profile in os.listdir(self.manifests_dir):
+                folder = os.path.join(self.manifests_dir, profile)
+                if not os.path.isdir(folder):
+                    continue
+                for name in os.listdir(folder):
+                    if not name.endswith(".json"):
+                        continue
+                    try:
+                        with open(os.path.join(folder, name), "r", encoding="utf-8") as f:
+                            manifest = json.load(f)
+                    except Exception:
+                        # An unreadable manifest might still reference anything; don't sweep
+                        print(f"[Backup] GC aborted, unreadable manifest {name}")
+                        return 0, 0
+                    for entry in manifest.get("files", {}).values():
+                        referenced.update(entry.get("chunks", []))
+            removed = 0
+            freed = 0
+            for prefix in os.listdir(self.objects_dir):
+                folder = os.path.join(self.objects_dir, prefix)
+                if not os.path.isdir(folder):
+                    continue
+                for name in os.listdir(folder):
+                    if name in referenced:
+                        continue
+                    path = os.path.join(folder, name)
+                    try:
+                        size = os.path.getsize(path)
+                        os.remove(path)
+                        removed += 1
+                        freed += size
+                    except OSError:
+                        continue
+            return removed, freed
+
+    def get_stats(self):
+        chunks = 0
+        stored = 0
+        for prefix in os.listdir(self.objects_dir):
+            folder = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                try:
+                    stored += os.path.getsize(os.path.join(folder, name))
+                    chunks += 1
+                except OSError:
+                    continue
+        manifests = {}
+        for profile in os.listdir(self.manifests_dir):
+            folder = os.path.join(self.manifests_dir, profile)
+            if os.path.isdir(folder):
+                manifests[profile] = len([n for n in os.listdir(folder) if n.endswith(".json")])
+        return {
+            "chunks": chunks,
+            "stored_bytes": stored,
+            "chunk_size": self.chunk_size,
+            "manifests": manifests
+        }
@@ -0,0 +1,154 @@
+import os
+import threading
+import zlib
+
+DEFAULT_PROBE_BYTES = 64 * 1024
+# Deflating a sample must shave at least this much off to be worth it for the whole file
+DEFAULT_PROBE_THRESHOLD = 0.9
+# Below this a file is just deflated; probing would cost more than it saves
+MIN_PROBE_SIZE = 16 * 1024
+
+# Formats that are compressed internally: region chunks are zlib'd, jars/zips deflated, media encoded
+STORE_EXTENSIONS = {
+    ".mca", ".mcc", ".mcr", ".jar", ".zip", ".gz", ".tgz", ".bz2", ".xz", ".zst", ".7z", ".rar",
+    ".png", ".jpg", ".jpeg", ".webp", ".gif", ".ogg", ".mp3", ".mp4", ".webm"
+}
+DEFLATE_EXTENSIONS = {
+    ".json", ".json5", ".txt", ".log", ".yml", ".yaml", ".properties", ".toml", ".cfg", ".conf",
+    ".ini", ".csv", ".xml", ".html", ".js", ".md", ".mcmeta", ".mcfunction", ".snbt", ".lang",
+    ".sk", ".sql", ".db", ".sqlite", ".mv.db"
+}
+
+# Magic numbers of compressed containers; catches gzipped NBT such as level.dat and playerdata
+_COMPRESSED_MAGIC = (
+    b"\x1f\x8b",            # gzip (level.dat, playerdata/*.dat, structure .nbt)
+    b"PK\x03\x04",          # zip / jar
+    b"\x89PNG",
+    b"\x28\xb5\x2f\xfd",    # zstd
+    b"\xfd7zXZ",            # xz
+    b"BZh",
+    b"OggS",
+    b"\xff\xd8\xff",        # jpeg
+)
+
+POLICY_MODES = ("auto", "deflate_all", "store_all")
+
+
+def file_kind(path):
+    """Grouping key for reports: the lowercase extension, or the file name when it has none"""
+    name = os.path.basename(path).lower()
+    if name.endswith(".mv.db"):
+        return ".mv.db"
+    ext = os.path.splitext(name)[1]
+    return ext or name
+
+
+class CompressionPolicy:
+    """
+    Decides per file whether a backup should deflate or store it:
+    - Extensions known to be compressed already (.mca, .jar, .png, .gz...) are stored.
+    - Text formats (json, yml, properties, logs...) are deflated without looking.
+    - Anything else is sniffed: compressed magic numbers are stored, otherwise a sample is
+      deflated and the file is stored when the sample barely shrinks.
+    """
+
+    def __init__(self, mode="auto", store_extensions=None, deflate_extensions=None, probe=True,
+                 probe_bytes=DEFAULT_PROBE_BYTES, probe_threshold=DEFAULT_PROBE_THRESHOLD):
+        self.mode = mode if mode in POLICY_MODES else "auto"
+        # Configured extensions override the built-in lists in either direction
+        extra_store = {self._ext(e) for e in (store_extensions or [])}
+        extra_deflate = {self._ext(e) for e in (deflate_extensions or [])} - extra_store
+        self.store_extensions = (STORE_EXTENSIONS | extra_store) - extra_deflate
+        self.deflate_extensions = (DEFLATE_EXTENSIONS | extra_deflate) - extra_store
+        self.probe = probe
+        self.probe_bytes = probe_bytes
+        self.probe_threshold = probe_threshold
+
+    @staticmethod
+    def _ext(ext):
+        ext = str(ext).strip().lower()
+        return ext if ext.startswith(".") else f".{ext}"
+
+    @classmethod
+    def from_settings(cls, cfg):
+        def _list(value):
+            if isinstance(value, str):
+                value = value.split(",")
+            return [v for v in (value or []) if str(v).strip()]
+
+        return cls(
+            mode=str(cfg.get("compression_mode", "auto")).lower(),
+            store_extensions=_list(cfg.get("compression_store_extensions")),
+            deflate_extensions=_list(cfg.get("compression_deflate_extensions")),
+            probe=bool(cfg.get("compression_probe", True))
+        )
+
+    def decide(self, path, size=None):
+        """(compress, reason) for a file; reason is one of mode/extension/magic/probe/small/error"""
+        if self.mode == "deflate_all":
+            return True, "mode"
+        if self.mode == "store_all":
+            return False, "mode"
+        kind = file_kind(path)
+        if kind in self.store_extensions:
+            return False, "extension"
+        if kind in self.deflate_extensions:
+            return True, "extension"
+        try:
+            if size is None:
+                size = os.path.getsize(path)
+            with open(path, "rb") as f:
+                sample = f.read(self.probe_bytes if self.probe and size >= MIN_PROBE_SIZE else 8)
+        except OSError:
+            return True, "error"
+        return self.decide_sample(sample, size)
+
+    def decide_sample(self, sample, size):
+        if sample.startswith(_COMPRESSED_MAGIC):
+            return False, "magic"
+        if not self.probe or size < MIN_PROBE_SIZE:
+            return True, "small"
+        packed = zlib.compress(sample, 1)
+        if len(packed) >= len(sample) * self.probe_threshold:
+            return False, "probe"
+        return True, "probe"
+
+
+class CompressionReport:
+    """Per file-kind totals of what a backup stored vs deflated, how much it saved and what it cost"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._kinds = {}
+
+    def record(self, kind, compressed, bytes_in, bytes_out, seconds=0.0, reason=None):
+        with self._lock:
+            row = self._kinds.get(kind)
+            if row is None:
+                row = self._kinds[kind] = {
+                    "files": 0,
+                    "deflated": 0,
+                    "stored": 0,
+                    "bytes_in": 0,
+                    "bytes_out": 0,
+                    "cpu_seconds": 0.0,
+                    "reasons": {}
+                }
+            row["files"] += 1
+            row["deflated" if compressed else "stored"] += 1
+            row["bytes_in"] += bytes_in
+            row["bytes_out"] += bytes_out
+            row["cpu_seconds"] += seconds
+            if reason:
+                row["reasons"][reason] = row["reasons"].get(reason, 0) + 1
+
+    def summary(self):
+        with self._lock:
+            rows = {}
+            for kind, row in self._kinds.items():
+                out = dict(row, reasons=dict(row["reasons"]))
+                out["cpu_seconds"] = round(row["cpu_seconds"], 3)
+                out["ratio"] = round(row["bytes_out"] / row["bytes_in"], 4) if row["bytes_in"] else None
+                rows[kind] = out
+        # Biggest kinds first; that is where tuning pays off
+        return dict(sorted(rows.items(), key=lambda kv: kv[1]["bytes_in"], reverse=True))
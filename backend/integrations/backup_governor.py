@@ -0,0 +1,151 @@
+import os
+import re
+import shutil
+import subprocess
+import threading
+import time
+
+from integrations.backup_upload import TokenBucket
+
+# [Server thread/WARN]: Can't keep up! Is the server overloaded? Running 2534ms or 50 ticks behind
+LAG_PATTERN = re.compile(r"Can't keep up!.*?Running (\d+)ms or (\d+) ticks behind", re.IGNORECASE)
+IO_CLASSES = {"idle": "3", "best_effort": "2", "off": None}
+MIN_FACTOR = 0.05
+# Floor for the adaptive rate when no read limit is set and too little was read to measure one
+MIN_ADAPTIVE_RATE = 2 * 1024 * 1024
+
+
+class BackupGovernor:
+    """
+    Keeps a backup job from starving the game server:
+    - apply_priority() lowers the CPU (nice) and I/O (ionice) priority of the calling thread.
+      On Linux both are per thread and inherited by threads it starts, so the archiver's
+      worker pools run at the same priority. Nobody raises it back, so call it from a
+      thread that exits with the job.
+    - throttle(n) is called after every block the snapshot pre-sync or the archiver reads and
+      caps reads at read_limit.
+    - With a console, "Can't keep up!" lines halve the read rate (down to 5% of it) and pause
+      the job for as long as the server says it is behind; the rate doubles back after
+      recover_seconds without lag.
+    """
+
+    def __init__(self, read_limit_kbps=0, nice=10, io_class="idle", console=None, adaptive=True, recover_seconds=30.0):
+        self.read_limit = float(read_limit_kbps or 0) * 1024
+        self.nice = max(0, int(nice))
+        self.io_class = io_class if io_class in IO_CLASSES else "idle"
+        self.console = console if adaptive else None
+        self.recover_seconds = recover_seconds
+        self._bucket = TokenBucket(self.read_limit) if self.read_limit else None
+        self._lock = threading.Lock()
+        self._cursor = console.last_seq if self.console is not None else 0
+        self._next_check = 0.0
+        self._last_lag = 0.0
+        self.factor = 1.0
+        self._base_rate = self.read_limit or None
+        self.started_at = time.monotonic()
+        self.read_bytes = 0
+        # Read since started_at; the base for the adaptive rate
+        self._clock_bytes = 0
+        self.throttled_seconds = 0.0
+        self.lag_events = 0
+        self.max_behind_ms = 0
+        self.min_factor = 1.0
+        self.priority = {}
+
+    def apply_priority(self):
+        tid = threading.get_native_id()
+        if self.nice and hasattr(os, "setpriority"):
+            try:
+                current = os.getpriority(os.PRIO_PROCESS, tid)
+                os.setpriority(os.PRIO_PROCESS, tid, min(19, current + self.nice))
+                self.priority["nice"] = os.getpriority(os.PRIO_PROCESS, tid)
+            except OSError as e:
+                print(f"[Backup] Could not lower CPU priority: {e}")
+        io_class = IO_CLASSES[self.io_class]
+        ionice = shutil.which("ionice")
+        if io_class and ionice:
+            args = [ionice, "-c", io_class, "-p", str(tid)]
+            if io_class == "2":
+                args[3:3] = ["-n", "7"]
+            try:
+                subprocess.run(args, check=True, capture_output=True, timeout=5)
+                self.priority["io_class"] = self.io_class
+            except (OSError, subprocess.SubprocessError) as e:
+                print(f"[Backup] Could not lower I/O priority: {e}")
+        return self.priority
+
+    def throttle(self, n):
+        now = time.monotonic()
+        with self._lock:
+            self.read_bytes += n
+            self._clock_bytes += n
+            check = self.console is not None and now >= self._next_check
+            if check:
+                self._next_check = now + 1.0
+        if check:
+            self._check_console(now)
+        bucket = self._bucket
+        if bucket is not None:
+            started = time.monotonic()
+            bucket.consume(n)
+            waited = time.monotonic() - started
+            with self._lock:
+                self.throttled_seconds += waited
+
+    def _check_console(self, now):
+        lines, self._cursor, _ = self.console.read_since(self._cursor)
+        behind_ms = 0
+        for line in lines:
+            match = LAG_PATTERN.search(line)
+            if match:
+                behind_ms = max(behind_ms, int(match.group(1)))
+        if behind_ms:
+            with self._lock:
+                self.lag_events += 1
+                self.max_behind_ms = max(self.max_behind_ms, behind_ms)
+                self._last_lag = now
+                self._set_factor(max(MIN_FACTOR, self.factor / 2))
+            # Let the server catch up before reading on
+            pause = min(behind_ms / 1000.0, 5.0)
+            time.sleep(pause)
+            with self._lock:
+                self.throttled_seconds += pause
+        elif self.factor < 1.0 and now - self._last_lag >= self.recover_seconds:
+            with self._lock:
+                self._last_lag = now
+                self._set_factor(min(1.0, self.factor * 2))
+
+    def _set_factor(self, factor):
+        self.factor = factor
+        self.min_factor = min(self.min_factor, factor)
+        if factor >= 1.0 and not self.read_limit:
+            self._bucket = None
+            return
+        if self._base_rate is None:
+            # No configured limit: scale down from what the job read before the first lag
+            elapsed = max(0.001, time.monotonic() - self.started_at)
+            self._base_rate = max(MIN_ADAPTIVE_RATE, self._clock_bytes / elapsed)
+        rate = self._base_rate * factor
+        if self._bucket is None:
+            self._bucket = TokenBucket(rate)
+        else:
+            self._bucket.rate = rate
+
+    def restart_clock(self):
+        """Measure the read rate from now on, e.g. once the snapshot is taken and archiving starts"""
+        with self._lock:
+            self.started_at = time.monotonic()
+            self._clock_bytes = 0
+
+    def get_stats(self):
+        elapsed = max(0.001, time.monotonic() - self.started_at)
+        return {
+            "read_bytes": self.read_bytes,
+            "read_mb_per_sec": round(self._clock_bytes / elapsed / (1024 * 1024), 1),
+            "read_limit_kbps": round(self.read_limit / 1024),
+            "throttled_seconds": round(self.throttled_seconds, 2),
+            "lag_events": self.lag_events,
+            "max_behind_ms": self.max_behind_ms,
+            "min_factor": self.min_factor,
+            "priority": self.priority
+        }
@@ -0,0 +1,302 @@
+import hashlib
+import os
+import shutil
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+
+from integrations.world_snapshot import world_dirs
+
+COPY_BUFFER = 1024 * 1024
+REGION_BLOCKS = 512
+
+_DIMENSION_ALIASES = {
+    "overworld": "overworld",
+    "minecraft:overworld": "overworld",
+    "nether": "the_nether",
+    "the_nether": "the_nether",
+    "minecraft:the_nether": "the_nether",
+    "end": "the_end",
+    "the_end": "the_end",
+    "minecraft:the_end": "the_end",
+}
+# Per-dimension folders; "data" holds maps and raids, which only make sense with the whole dimension
+_DIMENSION_KINDS = {"region", "entities", "poi", "data"}
+_REGION_KINDS = {"region", "entities", "poi"}
+_PLAYER_KINDS = {"playerdata", "stats", "advancements"}
+
+
+class RestoreError(Exception):
+    pass
+
+
+def classify(rel):
+    """(dimension, folder kind, file name) for a path inside a world folder, else None"""
+    parts = rel.replace("\\", "/").split("/")
+    if len(parts) < 2 or not parts[0].lower().startswith("world"):
+        return None
+    rest = parts[1:]
+    dimension = {"world_nether": "the_nether", "world_the_end": "the_end"}.get(parts[0].lower(), "overworld")
+    if rest[0] in ("DIM-1", "DIM1"):
+        dimension = "the_nether" if rest[0] == "DIM-1" else "the_end"
+        rest = rest[1:]
+    elif rest[0] == "dimensions" and len(rest) >= 4:
+        dimension = f"{rest[1]}:{rest[2]}"
+        rest = rest[3:]
+    kind = rest[0] if len(rest) > 1 else "root"
+    return dimension, kind, rest[-1]
+
+
+def regions_in_box(x1, z1, x2, z2):
+    """Region file names (r.X.Z.mca) covering a block-coordinate box"""
+    rx1, rx2 = sorted((int(x1) // REGION_BLOCKS, int(x2) // REGION_BLOCKS))
+    rz1, rz2 = sorted((int(z1) // REGION_BLOCKS, int(z2) // REGION_BLOCKS))
+    return {f"r.{rx}.{rz}.mca" for rx in range(rx1, rx2 + 1) for rz in range(rz1, rz2 + 1)}
+
+
+class RestoreScope:
+    """
+    Which files of a backup to restore. Empty means everything; otherwise any of:
+    - dimension: "overworld", "the_nether", "the_end" or "namespace:name"
+    - regions: region file names, or box {"x1", "z1", "x2", "z2"} in block coordinates
+      (region, entities and poi files of the dimension, overworld by default)
+    - playerdata: player .dat, stats and advancements, optionally only for the given player UUIDs
+    """
+
+    def __init__(self, dimension=None, regions=None, box=None, playerdata=False, players=None):
+        self.dimension = None
+        if dimension:
+            key = str(dimension).strip().lower()
+            self.dimension = _DIMENSION_ALIASES.get(key, key)
+        self.regions = set(regions or [])
+        if box:
+            try:
+                self.regions |= regions_in_box(box["x1"], box["z1"], box["x2"], box["z2"])
+            except (KeyError, TypeError, ValueError):
+                raise RestoreError("box needs numeric x1, z1, x2, z2")
+        self.playerdata = bool(playerdata or players)
+        self.players = {str(p).lower() for p in (players or [])}
+
+    @classmethod
+    def from_request(cls, data):
+        data = data or {}
+        if not isinstance(data, dict):
+            raise RestoreError("scope must be an object with dimension, regions, box, playerdata or players")
+        return cls(
+            dimension=data.get("dimension"),
+            regions=data.get("regions") if isinstance(data.get("regions"), list) else None,
+            box=data.get("box") or (data.get("regions") if isinstance(data.get("regions"), dict) else None),
+            playerdata=data.get("playerdata"),
+            players=data.get("players")
+        )
+
+    @property
+    def full(self):
+        return not (self.dimension or self.regions or self.playerdata)
+
+    def matches(self, rel):
+        if self.full:
+            return True
+        info = classify(rel)
+        if info is None:
+            return False
+        dimension, kind, name = info
+        if self.playerdata and kind in _PLAYER_KINDS and dimension == "overworld":
+            if not self.players or name.split(".", 1)[0].lower() in self.players:
+                return True
+        if self.regions:
+            return dimension == (self.dimension or "overworld") and kind in _REGION_KINDS and name in self.regions
+        if self.dimension:
+            return dimension == self.dimension and kind in _DIMENSION_KINDS
+        return False
+
+    def describe(self):
+        if self.full:
+            return {"full": True}
+        return {
+            "dimension": self.dimension,
+            "regions": sorted(self.regions),
+            "playerdata": self.playerdata,
+            "players": sorted(self.players)
+        }
+
+
+class BackupRestorer:
+    """
+    Restores a zip archive or a chunk-store manifest into a profile folder:
+    - Files are extracted in parallel into temp files next to their targets and verified
+      (zip CRC-32 and size; sha256 per chunk and per file for incremental backups).
+    - Only when every file checked out are they swapped in; one bad file leaves the world untouched.
+    - Replaced files, and files in the restored area that the backup did not have, are moved
+      to undo_dir rather than deleted.
+    """
+
+    def __init__(self, target_root, workers=4, undo_dir=None, progress=None):
+        self.target_root = os.path.abspath(target_root)
+        self.workers = max(1, int(workers))
+        self.undo_dir = undo_dir
+        self.progress = progress
+        self._lock = threading.Lock()
+        self._done_bytes = 0
+        self._done_files = 0
+
+    def _target(self, rel):
+        path = os.path.abspath(os.path.join(self.target_root, rel))
+        if os.path.commonpath([path, self.target_root]) != self.target_root:
+            raise RestoreError(f"Refusing to restore outside the profile: {rel}")
+        return path
+
+    def _stage(self, rel, fill, times=None, ns=None):
+        """Write a file next to its target as <name>.restore.tmp; removed again if fill() fails"""
+        target = self._target(rel)
+        tmp = f"{target}.restore.tmp"
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            with open(tmp, "wb") as dst:
+                written = fill(dst)
+            if ns:
+                os.utime(tmp, ns=ns)
+            elif times:
+                os.utime(tmp, times)
+        except BaseException:
+            try:
+                os.remove(tmp)
+            except OSError:
+                pass
+            raise
+        return tmp, written
+
+    def _tick(self, size, total_files, total_bytes):
+        with self._lock:
+            self._done_files += 1
+            self._done_bytes += size
+            done_files, done_bytes = self._done_files, self._done_bytes
+        if self.progress:
+            self.progress(done_files, total_files, done_bytes, total_bytes)
+
+    def restore_zip(self, zip_path, scope):
+        with zipfile.ZipFile(zip_path) as zf:
+            members = [i for i in zf.infolist() if not i.is_dir() and scope.matches(i.filename)]
+            total = sum(i.file_size for i in members)
+
+            def _extract(info):
+                def _fill(dst):
+                    written = 0
+                    # ZipExtFile checks the CRC-32 once the member is read to the end
+                    with zf.open(info) as src:
+                        while True:
+                            data = src.read(COPY_BUFFER)
+                            if not data:
+                                break
+                            dst.write(data)
+                            written += len(data)
+                    if written != info.file_size:
+                        raise RestoreError(f"{info.filename}: size {written} != {info.file_size}")
+                    return written
+
+                mtime = time.mktime(info.date_time + (0, 0, -1))
+                tmp, written = self._stage(info.filename, _fill, (mtime, mtime))
+                self._tick(written, len(members), total)
+                return info.filename, tmp
+
+            return self._run(members, _extract, scope, total)
+
+    def restore_manifest(self, store, manifest, scope):
+        entries = [(rel, entry) for rel, entry in manifest.get("files", {}).items() if scope.matches(rel)]
+        total = sum(entry.get("size", 0) for _, entry in entries)
+
+        def _extract(item):
+            rel, entry = item
+
+            def _fill(dst):
+                file_hash = hashlib.sha256()
+                written = 0
+                for digest in entry.get("chunks", []):
+                    try:
+                        data = store.get(digest)
+                    except OSError:
+                        raise RestoreError(f"{rel}: chunk {digest[:12]} is missing from the store")
+                    if hashlib.sha256(data).hexdigest() != digest:
+                        raise RestoreError(f"{rel}: chunk {digest[:12]} is corrupt")
+                    file_hash.update(data)
+                    dst.write(data)
+                    written += len(data)
+                if entry.get("sha256") and file_hash.hexdigest() != entry["sha256"]:
+                    raise RestoreError(f"{rel}: sha256 mismatch")
+                if written != entry.get("size", written):
+                    raise RestoreError(f"{rel}: size {written} != {entry.get('size')}")
+                return written
+
+            mtime_ns = entry.get("mtime_ns")
+            tmp, written = self._stage(rel, _fill, ns=(mtime_ns, mtime_ns) if mtime_ns else None)
+            self._tick(written, len(entries), total)
+            return rel, tmp
+
+        return self._run(entries, _extract, scope, total)
+
+    def _run(self, items, extract, scope, total_bytes):
+        started = time.time()
+        staged = []
+        errors = []
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="restore") as pool:
+            futures = [pool.submit(extract, item) for item in items]
+            for future in futures:
+                if future.cancelled():
+                    continue
+                try:
+                    staged.append(future.result())
+                except Exception as e:
+                    errors.append(str(e))
+                    # The restore is off; don't extract the rest for nothing
+                    for pending in futures:
+                        pending.cancel()
+        if errors:
+            for _, tmp in staged:
+                try:
+                    os.remove(tmp)
+                except OSError:
+                    pass
+            raise RestoreError(f"Verification failed, nothing was restored: {errors[0]}" + (f" (+{len(errors) - 1} more)" if len(errors) > 1 else ""))
+
+        restored = {rel.replace("\\", "/") for rel, _ in staged}
+        moved = 0
+        for rel, tmp in staged:
+            target = self._target(rel)
+            if os.path.exists(target):
+                self._set_aside(rel, target)
+            os.replace(tmp, target)
+        # Within the restored area, anything the backup did not have is newer than it
+        for name in world_dirs(self.target_root):
+            for root, _, files in os.walk(os.path.join(self.target_root, name)):
+                for filename in files:
+                    fp = os.path.join(root, filename)
+                    rel = os.path.relpath(fp, self.target_root).replace("\\", "/")
+                    if rel in restored or not scope.matches(rel):
+                        continue
+                    if filename.endswith((".lck", ".restore.tmp")) or filename == "session.lock":
+                        continue
+                    self._set_aside(rel, fp)
+                    moved += 1
+        seconds = max(0.001, time.time() - started)
+        return {
+            "files": len(staged),
+            "bytes": total_bytes,
+            "not_in_backup": moved,
+            "seconds": round(seconds, 2),
+            "mb_per_sec": round(total_bytes / seconds / (1024 * 1024), 1),
+            "workers": self.workers,
+            "undo_dir": self.undo_dir
+        }
+
+    def _set_aside(self, rel, path):
+        if not self.undo_dir:
+            os.remove(path)
+            return
+        dest = os.path.join(self.undo_dir, rel)
+        os.makedirs(os.path.dirname(dest), exist_ok=True)
+        try:
+            os.replace(path, dest)
+        except OSError:
+            # Undo folder on another filesystem
+            shutil.move(path, dest)
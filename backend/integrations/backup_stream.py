@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+
+# Google wants non-final chunks in 256 KiB multiples, OneDrive in 320 KiB multiples
+PART_ALIGN = 1280 * 1024
+DEFAULT_PART_SIZE = 8 * PART_ALIGN
+DEFAULT_MAX_PARTS = 4
+
+_END = object()
+
+
+def align_part_size(size):
+    return max(PART_ALIGN, int(size) // PART_ALIGN * PART_ALIGN)
+
+
+def iter_file_parts(path, part_size=DEFAULT_PART_SIZE):
+    """(offset, data, last) for a file on disk, reading one part at a time"""
+    with open(path, "rb") as f:
+        offset = 0
+        data = f.read(part_size)
+        while True:
+            following = f.read(part_size) if data else b""
+            yield offset, data, not following
+            if not following:
+                return
+            offset += len(data)
+            data = following
+
+
+class StreamAborted(Exception):
+    pass
+
+
+class StreamFanout:
+    """
+    Write-only stream that tees an archive into upload parts for several consumers:
+    - Bytes are cut into part_size parts; each consumer iterates consume(name) as (offset, data, last).
+    - Consumers share the same part objects and each has a queue of at most max_parts,
+      so memory stays around part_size * (max_parts + 2) however big the archive gets.
+      The slowest consumer sets the pace; write() blocks until it catches up.
+    - A consumer that fails calls detach(); the rest carry on without it.
+    - With a spool file, everything written is also kept on disk (local copy / later uploads).
+    """
+
+    def __init__(self, consumers, part_size=DEFAULT_PART_SIZE, max_parts=DEFAULT_MAX_PARTS, spool=None):
+        self.part_size = part_size
+        self.spool = spool
+        self._queues = {name: queue.Queue(maxsize=max(1, int(max_parts))) for name in consumers}
+        self._detached = set()
+        self._lock = threading.Lock()
+        self._buffer = bytearray()
+        self._offset = 0
+        self._closed = False
+        self._error = None
+        self.bytes_written = 0
+        self.parts = 0
+        self.blocked_seconds = 0.0
+
+    def write(self, data):
+        if self._closed:
+            raise ValueError("write to closed stream")
+        if self.spool:
+            self.spool.write(data)
+        self.bytes_written += len(data)
+        self._buffer += data
+        # Hold back one full part so the final part can always be flagged as last
+        while len(self._buffer) > self.part_size:
+            part = bytes(self._buffer[:self.part_size])
+            del self._buffer[:self.part_size]
+            self._publish(part, False)
+        return len(data)
+
+    def flush(self):
+        if self.spool:
+            self.spool.flush()
+
+    def close(self):
+        if self._closed:
+            return
+        self._publish(bytes(self._buffer), True)
+        self._buffer = bytearray()
+        self._closed = True
+        self.flush()
+
+    def abort(self, error):
+        """Stop all consumers without a final part, so none of them commits a truncated upload"""
+        self._closed = True
+        self._error = error
+        for name, q in self._queues.items():
+            self._offer(name, q, _END, block=False)
+
+    def _publish(self, data, last):
+        item = (self._offset, data, last)
+        self._offset += len(data)
+        self.parts += 1
+        for name, q in self._queues.items():
+            self._offer(name, q, item)
+        with self._lock:
+            if self._queues and len(self._detached) == len(self._queues) and not self.spool:
+                raise StreamAborted("every upload failed")
+
+    def _offer(self, name, q, item, block=True):
+        started = time.monotonic()
+        try:
+            while True:
+                with self._lock:
+                    if name in self._detached:
+                        return
+                try:
+                    q.put(item, timeout=0.5 if block else 0)
+                    return
+                except queue.Full:
+                    if not block:
+                        # Make room for the sentinel; the consumer is being stopped anyway
+                        try:
+                            q.get_nowait()
+                        except queue.Empty:
+                            pass
+        finally:
+            self.blocked_seconds += time.monotonic() - started
+
+    def detach(self, name):
+        with self._lock:
+            self._detached.add(name)
+        q = self._queues.get(name)
+        # Free any parts the consumer will never read
+        while q is not None:
+            try:
+                q.get_nowait()
+            except queue.Empty:
+                break
+
+    def consume(self, name):
+        q = self._queues[name]
+        while True:
+            item = q.get()
+            if item is _END:
+                raise StreamAborted(str(self._error or "archive aborted"))
+            yield item
+            if item[2]:
+                return
+
+    def get_stats(self):
+        return {
+            "bytes": self.bytes_written,
+            "parts": self.parts,
+            "part_size": self.part_size,
+            "max_buffered_bytes": self.part_size * (max((q.maxsize for q in self._queues.values()), default=0) + 2),
+            "blocked_seconds": round(self.blocked_seconds, 2),
+            "detached": sorted(self._detached)
+        }
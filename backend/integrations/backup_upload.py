@@ -0,0 +1,660 @@
+import glob
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote
+
+import requests
+
+from integrations.backup_stream import PART_ALIGN
+
+UPLOAD_ATTEMPTS = 3
+# Consecutive failed requests without any progress before an upload gives up (checkpoint is kept)
+MAX_RESUMES = 5
+# Adaptive chunking aims for requests of about this long
+TARGET_REQUEST_SECONDS = 8
+MAX_CHUNK_SIZE = 48 * PART_ALIGN  # 60 MiB, OneDrive's per-request cap
+DROPBOX_ALIGN = 4 * 1024 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class TransientUploadError(UploadError):
+    """Worth resuming: the session is probably still alive"""
+
+
+class SessionExpired(UploadError):
+    pass
+
+
+class TokenBucket:
+    """Caps the combined throughput of every upload sharing it; rate is in bytes per second"""
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.capacity = float(burst or max(self.rate / 4, 64 * 1024))
+        self._tokens = self.capacity
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n):
+        while n > 0:
+            take = min(n, self.capacity)
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.capacity, self._tokens + (now - self._last) * self.rate)
+                self._last = now
+                if self._tokens >= take:
+                    self._tokens -= take
+                    n -= take
+                    continue
+                wait = (take - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class _ThrottledBody:
+    """Request body that draws from a TokenBucket as http.client reads it"""
+
+    def __init__(self, data, bucket):
+        self._view = memoryview(data)
+        self._pos = 0
+        self._bucket = bucket
+
+    def __len__(self):
+        return len(self._view)
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self._view) - self._pos
+        piece = self._view[self._pos:self._pos + size]
+        self._pos += len(piece)
+        if piece:
+            self._bucket.consume(len(piece))
+        return bytes(piece)
+
+    def __iter__(self):
+        while True:
+            piece = self.read(64 * 1024)
+            if not piece:
+                return
+            yield piece
+
+
+def send_with_retry(http, method, url, data=None, bucket=None, timeout=(20, 900), attempts=UPLOAD_ATTEMPTS, **kwargs):
+    """
+    One request, retried on connection errors, 429 and 5xx. Raises TransientUploadError when those persist.
+    Ranged writes use attempts=1: the server may have kept part of the body, so the caller asks it
+    what it has before sending again.
+    """
+    for attempt in range(attempts):
+        body = _ThrottledBody(data, bucket) if bucket is not None and data else data
+        delay = min(30, 2 ** attempt)
+        try:
+            resp = http.request(method, url, data=body, timeout=timeout, **kwargs)
+        except requests.RequestException as e:
+            if attempt == attempts - 1:
+                raise TransientUploadError(str(e))
+        else:
+            if resp.status_code != 429 and resp.status_code < 500:
+                return resp
+            if attempt == attempts - 1:
+                raise TransientUploadError(f"HTTP {resp.status_code}: {resp.text[:200]}")
+            try:
+                delay = min(60, float(resp.headers.get("Retry-After", delay)))
+            except ValueError:
+                pass
+        time.sleep(delay)
+
+
+def _align_down(size, align):
+    return max(align, int(size) // align * align)
+
+
+class GoogleDriveSession:
+    """Resumable upload session; strictly sequential, non-final chunks in 256 KiB multiples"""
+
+    name = "google_drive"
+    alignment = 256 * 1024
+    concurrent = False
+
+    def __init__(self, http, token, api_base, file_name, folder_id=None, bucket=None):
+        self.http = http
+        self.token = token
+        self.api_base = api_base
+        self.file_name = file_name
+        self.folder_id = folder_id
+        self.bucket = bucket
+
+    def start(self, total_size):
+        metadata = {"name": self.file_name}
+        if self.folder_id:
+            metadata["parents"] = [self.folder_id]
+        headers = {
+            "Authorization": f"Bearer {self.token}",
+            "Content-Type": "application/json; charset=UTF-8",
+            "X-Upload-Content-Type": "application/zip",
+        }
+        if total_size is not None:
+            headers["X-Upload-Content-Length"] = str(total_size)
+        resp = send_with_retry(
+            self.http, "POST", f"{self.api_base}/upload/drive/v3/files?uploadType=resumable&fields=id,webViewLink",
+            headers=headers, json=metadata, timeout=(20, 120)
+        )
+        if resp.status_code >= 400:
+            raise UploadError(f"Google upload init failed: {resp.text}")
+        session_url = resp.headers.get("Location")
+        if not session_url:
+            raise UploadError("Google upload init returned no session URL")
+        return {"session_url": session_url}
+
+    def _result(self, resp):
+        data = resp.json()
+        file_id = data.get("id")
+        return {
+            "success": True,
+            "file_id": file_id,
+            "url": data.get("webViewLink") or (f"https://drive.google.com/file/d/{file_id}/view" if file_id else None),
+        }
+
+    @staticmethod
+    def _range_end(resp):
+        # "Range: bytes=0-1234" lists what Google has; absent means nothing yet
+        value = resp.headers.get("Range", "")
+        if "-" not in value:
+            return 0
+        return int(value.rsplit("-", 1)[1]) + 1
+
+    def committed(self, state, total_size, hint):
+        resp = send_with_retry(
+            self.http, "PUT", state["session_url"],
+            headers={"Authorization": f"Bearer {self.token}", "Content-Range": f"bytes */{total_size if total_size is not None else '*'}"},
+            timeout=(20, 120)
+        )
+        if resp.status_code in (200, 201):
+            return total_size, self._result(resp)
+        if resp.status_code == 308:
+            return self._range_end(resp), None
+        if resp.status_code in (404, 410):
+            raise SessionExpired("Google upload session expired")
+        raise UploadError(f"Google upload status failed: {resp.text}")
+
+    def send(self, state, offset, data, last, total_size):
+        end = offset + len(data) - 1
+        # While streaming the total is unknown until the last part
+        if last:
+            total = str(end + 1)
+        else:
+            total = str(total_size) if total_size is not None else "*"
+        resp = send_with_retry(
+            self.http, "PUT", state["session_url"], data=data, bucket=self.bucket, attempts=1,
+            headers={
+                "Authorization": f"Bearer {self.token}",
+                "Content-Type": "application/zip",
+                "Content-Range": f"bytes {offset}-{end}/{total}" if data else f"bytes */{total}",
+            }
+        )
+        if resp.status_code in (200, 201):
+            return end + 1, self._result(resp)
+        if resp.status_code == 308:
+            return self._range_end(resp), None
+        if resp.status_code in (404, 410):
+            raise SessionExpired("Google upload session expired")
+        raise UploadError(f"Google upload failed: {resp.text}")
+
+
+class OneDriveSession:
+    """Graph upload session; sequential, 320 KiB-aligned fragments, total size required"""
+
+    name = "onedrive"
+    alignment = 320 * 1024
+    concurrent = False
+
+    def __init__(self, http, token, api_base, file_name, bucket=None):
+        self.http = http
+        self.token = token
+        self.api_base = api_base
+        self.file_name = file_name
+        self.bucket = bucket
+
+    def start(self, total_size):
+        if total_size is None:
+            raise UploadError("OneDrive uploads need the total size up front")
+        target = quote(f"MCmadeEasy Backups/{self.file_name}")
+        resp = send_with_retry(
+            self.http, "POST", f"{self.api_base}/me/drive/root:/{target}:/createUploadSession",
+            headers={"Authorization": f"Bearer {self.token}"},
+            json={"item": {"@microsoft.graph.conflictBehavior": "rename"}},
+            timeout=(20, 120)
+        )
+        if resp.status_code >= 400:
+            raise UploadError(f"OneDrive upload init failed: {resp.text}")
+        upload_url = resp.json().get("uploadUrl")
+        if not upload_url:
+            raise UploadError("OneDrive upload init returned no upload URL")
+        return {"upload_url": upload_url}
+
+    @staticmethod
+    def _next_expected(resp):
+        ranges = (resp.json() or {}).get("nextExpectedRanges") or []
+        return int(str(ranges[0]).split("-", 1)[0]) if ranges else None
+
+    def committed(self, state, total_size, hint):
+        resp = send_with_retry(self.http, "GET", state["upload_url"], timeout=(20, 120))
+        if resp.status_code == 404:
+            raise SessionExpired("OneDrive upload session expired")
+        if resp.status_code >= 400:
+            raise UploadError(f"OneDrive upload status failed: {resp.text}")
+        offset = self._next_expected(resp)
+        return (hint if offset is None else offset), None
+
+    def send(self, state, offset, data, last, total_size):
+        end = offset + len(data) - 1
+        # The upload URL is pre-authenticated; Graph rejects an Authorization header on it
+        resp = send_with_retry(
+            self.http, "PUT", state["upload_url"], data=data, bucket=self.bucket, attempts=1,
+            headers={"Content-Range": f"bytes {offset}-{end}/{total_size}"}
+        )
+        if resp.status_code in (200, 201):
+            data = resp.json()
+            return end + 1, {"success": True, "file_id": data.get("id"), "web_url": data.get("webUrl")}
+        if resp.status_code == 202:
+            offset = self._next_expected(resp)
+            return (end + 1 if offset is None else offset), None
+        if resp.status_code == 404:
+            raise SessionExpired("OneDrive upload session expired")
+        if resp.status_code == 416:
+            # Fragment overlaps what the server already has; resync from its view
+            raise TransientUploadError("OneDrive range mismatch")
+        raise UploadError(f"OneDrive upload failed: {resp.text}")
+
+
+class DropboxSession:
+    """
+    Dropbox upload session. From a file it opens a concurrent session so several
+    4 MiB-aligned appends can be in flight; a stream uses a sequential one.
+    """
+
+    name = "dropbox"
+
+    def __init__(self, http, token, api_base, file_name, bucket=None, concurrent=False):
+        self.http = http
+        self.token = token
+        self.api_base = api_base
+        self.file_name = file_name
+        self.bucket = bucket
+        self.concurrent = concurrent
+        self.alignment = DROPBOX_ALIGN if concurrent else PART_ALIGN
+
+    def _call(self, endpoint, arg, data=b""):
+        # Concurrent appends name their offset and can simply be repeated
+        attempts = UPLOAD_ATTEMPTS if self.concurrent or not data else 1
+        resp = send_with_retry(
+            self.http, "POST", f"{self.api_base}/2/files/{endpoint}", data=data, bucket=self.bucket, attempts=attempts,
+            headers={
+                "Authorization": f"Bearer {self.token}",
+                "Content-Type": "application/octet-stream",
+                "Dropbox-API-Arg": json.dumps(arg)
+            }
+        )
+        if resp.status_code == 409:
+            error = {}
+            try:
+                error = resp.json().get("error", {})
+            except ValueError:
+                pass
+            lookup = error.get("lookup_failed", error) if isinstance(error, dict) else {}
+            tag = lookup.get(".tag") if isinstance(lookup, dict) else None
+            if tag == "incorrect_offset":
+                return {"correct_offset": int(lookup.get("correct_offset", 0))}
+            if tag in ("not_found", "closed", "not_closed"):
+                raise SessionExpired(f"Dropbox upload session {tag}")
+        if resp.status_code >= 400:
+            raise UploadError(f"Dropbox upload failed: {resp.text}")
+        # append_v2 answers with an empty/null body
+        return (resp.json() if resp.content else None) or {}
+
+    def start(self, total_size):
+        arg = {"close": False}
+        if self.concurrent:
+            arg["session_type"] = "concurrent"
+        return {"session_id": self._call("upload_session/start", arg)["session_id"]}
+
+    def committed(self, state, total_size, hint):
+        # No status call; an empty append at the expected offset reports the real one
+        reply = self._call("upload_session/append_v2", {"cursor": {"session_id": state["session_id"], "offset": hint}, "close": False})
+        return reply.get("correct_offset", hint), None
+
+    def _commit(self):
+        return {
+            "path": f"/MCmadeEasy Backups/{self.file_name}",
+            "mode": "add",
+            "autorename": True,
+            "mute": False
+        }
+
+    def send(self, state, offset, data, last, total_size):
+        cursor = {"session_id": state["session_id"], "offset": offset}
+        if last and not self.concurrent:
+            reply = self._call("upload_session/finish", {"cursor": cursor, "commit": self._commit()}, data)
+            if "correct_offset" in reply:
+                return reply["correct_offset"], None
+            return offset + len(data), {"success": True, "path": reply.get("path_display")}
+        reply = self._call("upload_session/append_v2", {"cursor": cursor, "close": bool(last)}, data)
+        if "correct_offset" in reply:
+            return reply["correct_offset"], None
+        return offset + len(data), None
+
+    def finish(self, state, total_size):
+        cursor = {"session_id": state["session_id"], "offset": total_size}
+        reply = self._call("upload_session/finish", {"cursor": cursor, "commit": self._commit()})
+        return {"success": True, "path": reply.get("path_display")}
+
+
+class UploadCheckpoint:
+    """
+    Acknowledged byte ranges of an upload from a local file, persisted after every chunk
+    so a failed or interrupted upload continues where it stopped instead of from zero.
+    """
+
+    def __init__(self, folder, provider, path, meta=None):
+        key = hashlib.sha1(os.path.abspath(path).encode("utf-8")).hexdigest()[:16]
+        self.path = os.path.join(folder, f"{provider}_{key}.json")
+        self.provider = provider
+        self.file_path = path
+        self.meta = dict(meta or {})
+
+    @staticmethod
+    def list(folder):
+        out = []
+        for path in glob.glob(os.path.join(folder, "*.json")):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    out.append(json.load(f))
+            except Exception:
+                continue
+        return out
+
+    def load(self):
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            st = os.stat(self.file_path)
+        except (OSError, ValueError):
+            return None
+        if data.get("size") != st.st_size or data.get("mtime_ns") != st.st_mtime_ns:
+            # The file changed since; the session holds bytes of another version
+            self.delete()
+            return None
+        self.meta.update(data.get("meta", {}))
+        return data
+
+    def save(self, state, acked):
+        st = os.stat(self.file_path)
+        data = {
+            "provider": self.provider,
+            "path": self.file_path,
+            "size": st.st_size,
+            "mtime_ns": st.st_mtime_ns,
+            "state": state,
+            "acked": acked,
+            "meta": self.meta,
+            "updated_at": int(time.time())
+        }
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(tmp_path, self.path)
+
+    def delete(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def _merge_ranges(ranges):
+    merged = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return merged
+
+
+def _gaps(acked, size):
+    gaps = []
+    pos = 0
+    for start, end in _merge_ranges(acked):
+        if start > pos:
+            gaps.append([pos, start])
+        pos = max(pos, end)
+    if pos < size:
+        gaps.append([pos, size])
+    return gaps
+
+
+class ResumableUpload:
+    """
+    Drives one provider session to completion:
+    - After a failed request it asks the provider how much it really has and continues from there.
+    - From a file, a checkpoint of acknowledged ranges survives restarts; chunk size adapts so
+      requests take about TARGET_REQUEST_SECONDS; concurrent sessions keep several chunks in flight.
+    - From a stream (iterable of (offset, data, last)), parts are sent as they come.
+    """
+
+    def __init__(self, session, chunk_size=8 * PART_ALIGN, parallel=1, checkpoint=None, on_progress=None):
+        self.session = session
+        self.chunk_size = _align_down(chunk_size, session.alignment)
+        self.parallel = max(1, int(parallel)) if session.concurrent else 1
+        self.checkpoint = checkpoint
+        self.on_progress = on_progress
+        self.requests = 0
+        self.resumes = 0
+        self._lock = threading.Lock()
+
+    def _adapt(self, elapsed, length):
+        if length < self.chunk_size:
+            return
+        align = self.session.alignment
+        if elapsed < TARGET_REQUEST_SECONDS / 2:
+            size = self.chunk_size * 2
+        elif elapsed > TARGET_REQUEST_SECONDS * 2:
+            size = self.chunk_size // 2
+        else:
+            return
+        self.chunk_size = min(_align_down(MAX_CHUNK_SIZE, align), _align_down(size, align))
+
+    def _shrink(self):
+        self.chunk_size = _align_down(self.chunk_size // 2, self.session.alignment)
+
+    def _progress(self, done):
+        if self.on_progress:
+            self.on_progress(done)
+
+    def upload_file(self, path):
+        size = os.path.getsize(path)
+        saved = self.checkpoint.load() if self.checkpoint else None
+        state = saved.get("state") if saved else None
+        acked = saved.get("acked", []) if saved else []
+        if state and not self.session.concurrent:
+            try:
+                offset, result = self.session.committed(state, size, acked[0][1] if acked else 0)
+                if result:
+                    self._finish_checkpoint()
+                    return result
+                acked = [[0, offset]] if offset else []
+                self.resumes += 1
+            except SessionExpired:
+                state = None
+        elif state:
+            self.resumes += 1
+        if not state:
+            state = self.session.start(size)
+            acked = []
+            self._save(state, acked)
+
+        try:
+            if self.session.concurrent:
+                result = self._upload_concurrent(path, size, state, acked)
+            else:
+                result = self._upload_sequential(path, size, state, acked[0][1] if acked else 0)
+        except SessionExpired:
+            # Nothing to salvage on the provider side; start a fresh session once
+            self._finish_checkpoint()
+            state = self.session.start(size)
+            self._save(state, [])
+            if self.session.concurrent:
+                result = self._upload_concurrent(path, size, state, [])
+            else:
+                result = self._upload_sequential(path, size, state, 0)
+        self._finish_checkpoint()
+        return result
+
+    def _save(self, state, acked):
+        if self.checkpoint:
+            self.checkpoint.save(state, acked)
+
+    def _finish_checkpoint(self):
+        if self.checkpoint:
+            self.checkpoint.delete()
+
+    def _upload_sequential(self, path, size, state, offset):
+        failures = 0
+        with open(path, "rb") as f:
+            while True:
+                length = min(self.chunk_size, size - offset)
+                f.seek(offset)
+                data = f.read(length)
+                last = offset + length >= size
+                started = time.monotonic()
+                try:
+                    self.requests += 1
+                    acked_end, result = self.session.send(state, offset, data, last, size)
+                except TransientUploadError:
+                    failures += 1
+                    if failures > MAX_RESUMES:
+                        raise
+                    self.resumes += 1
+                    self._shrink()
+                    time.sleep(min(30, 2 ** (failures - 1)))
+                    offset, result = self.session.committed(state, size, offset)
+                    if result:
+                        return result
+                    continue
+                if result:
+                    self._progress(size)
+                    return result
+                if acked_end > offset:
+                    failures = 0
+                self._adapt(time.monotonic() - started, length)
+                offset = acked_end
+                self._save(state, [[0, offset]])
+                self._progress(offset)
+
+    def _upload_concurrent(self, path, size, state, acked):
+        acked = _merge_ranges(acked)
+        pending = _gaps(acked, size)
+        failures = [0]
+        errors = []
+
+        def _next_range():
+            with self._lock:
+                if errors or not pending:
+                    return None
+                start, end = pending[0]
+                length = min(self.chunk_size, end - start)
+                if start + length < end:
+                    pending[0][0] = start + length
+                else:
+                    pending.pop(0)
+                self.requests += 1
+                return start, start + length
+
+        def _worker():
+            with open(path, "rb") as f:
+                while True:
+                    piece = _next_range()
+                    if piece is None:
+                        return
+                    start, end = piece
+                    f.seek(start)
+                    data = f.read(end - start)
+                    began = time.monotonic()
+                    try:
+                        self.session.send(state, start, data, end >= size, size)
+                    except TransientUploadError as e:
+                        with self._lock:
+                            failures[0] += 1
+                            self.resumes += 1
+                            pending.insert(0, [start, end])
+                            if failures[0] > MAX_RESUMES:
+                                errors.append(e)
+                        continue
+                    except Exception as e:
+                        with self._lock:
+                            errors.append(e)
+                        return
+                    with self._lock:
+                        failures[0] = 0
+                        acked.append([start, end])
+                        acked[:] = _merge_ranges(acked)
+                        self._adapt(time.monotonic() - began, end - start)
+                        self._save(state, acked)
+                        done = sum(stop - begin for begin, stop in acked)
+                    self._progress(done)
+
+        with ThreadPoolExecutor(max_workers=self.parallel, thread_name_prefix=f"{self.session.name}-upload") as pool:
+            for _ in range(self.parallel):
+                pool.submit(_worker)
+        if errors:
+            raise errors[0]
+        return self.session.finish(state, size)
+
+    def upload_stream(self, parts):
+        state = self.session.start(None)
+        failures = 0
+        for offset, data, last in parts:
+            pos = offset
+            end = offset + len(data)
+            total = end if last else None
+            while True:
+                try:
+                    self.requests += 1
+                    acked_end, result = self.session.send(state, pos, data[pos - offset:], last, total)
+                except TransientUploadError:
+                    failures += 1
+                    if failures > MAX_RESUMES:
+                        raise
+                    self.resumes += 1
+                    time.sleep(min(30, 2 ** (failures - 1)))
+                    pos, result = self.session.committed(state, total, pos)
+                    if result:
+                        return result
+                    if pos < offset:
+                        raise UploadError(f"{self.session.name} lost data that was already acknowledged")
+                    continue
+                if result:
+                    self._progress(end)
+                    return result
+                if acked_end > pos:
+                    failures = 0
+                pos = acked_end
+                if pos >= end:
+                    break
+            self._progress(end)
+        raise UploadError(f"{self.session.name} upload stream ended without a final part")
+
+    def get_stats(self):
+        return {
+            "requests": self.requests,
+            "resumes": self.resumes,
+            "chunk_size": self.chunk_size,
+            "parallel": self.parallel
+        }
@@ -5,11 +5,31 @@ import threading
 import time
 import uuid
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from urllib import request as urlrequest
 from urllib import parse as urlparse
 import requests
 
+from integrations.backup_chunks import ChunkStore, DEFAULT_RETENTION
+from integrations.backup_archive import ParallelZipWriter
+from integrations.backup_catalog import BackupCatalog, archive_files, manifest_files
+from integrations.backup_compression import CompressionPolicy, POLICY_MODES
+from integrations.backup_governor import BackupGovernor, IO_CLASSES
+from integrations.backup_restore import BackupRestorer, RestoreError, RestoreScope
+from integrations.backup_stream import StreamFanout, align_part_size
+from integrations import world_snapshot
+from integrations.world_snapshot import WorldSnapshot
+from integrations.backup_upload import (
+    DropboxSession,
+    GoogleDriveSession,
+    OneDriveSession,
+    ResumableUpload,
+    TokenBucket,
+    UploadCheckpoint,
+    UploadError,
+)
+
 
 class CloudBackupManager:
     def __init__(self):
@@ -24,11 +44,17 @@ class CloudBackupManager:
         os.makedirs(data_dir, exist_ok=True)
 
         self.config = self._load_config()
-        self.history = self._load_history()
+        self.chunk_store = ChunkStore(os.path.join(self.backups_dir, "store"))
+        self.catalog = BackupCatalog(os.path.join(data_dir, "backup_catalog.db"))
+        self._import_history()
+        self.uploads_dir = os.path.join(self.backups_dir, ".uploads")
+        self.snapshots_dir = os.path.join(self.backups_dir, ".snapshots")
 
         self._lock = threading.Lock()
         self._scheduler_started = False
         self._profile_resolver = None
+        self._server = None
+        self._profile_locks = {}
         self.progress = {}
 
     def _load_config(self):
@@ -182,19 +208,35 @@ class CloudBackupManager:
         self._save_config()
         return self.get_provider_oauth_config(p)
 
-    def _load_history(self):
-        if os.path.exists(self.history_path):
-            try:
-                with open(self.history_path, "r", encoding="utf-8") as f:
-                    data = json.load(f)
-                    return data if isinstance(data, list) else []
-            except Exception:
-                pass
-        return []
+    def _import_history(self):
+        """One-time move of backup_history.json into the catalog; the JSON file is left as it was"""
+        if self.catalog.get_meta("history_imported") or not os.path.exists(self.history_path):
+            return
+        try:
+            with open(self.history_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except Exception:
+            data = []
+        imported = 0
+        for record in data if isinstance(data, list) else []:
+            if isinstance(record, dict) and record.get("id") and record.get("profile"):
+                self.catalog.add(record, self._backup_files(record))
+                imported += 1
+        self.catalog.set_meta("history_imported", int(time.time()))
+        print(f"[Backup] Imported {imported} backups from {os.path.basename(self.history_path)} into the catalog")
 
-    def _save_history(self):
-        with open(self.history_path, "w", encoding="utf-8") as f:
-            json.dump(self.history[-500:], f, indent=2)
+    def _backup_files(self, record):
+        """File index of a backup from its manifest or local zip, None when neither is around"""
+        try:
+            incremental = record.get("incremental")
+            if incremental:
+                return list(manifest_files(self.chunk_store.load_manifest(record["profile"], incremental["manifest_id"])))
+            zip_path = record.get("local_path")
+            if zip_path and zip_path.endswith(".zip") and os.path.isfile(zip_path):
+                return list(archive_files(zip_path))
+        except (OSError, ValueError, KeyError, zipfile.BadZipFile) as e:
+            print(f"[Backup] Could not index files of {record.get('id')}: {e}")
+        return None
 
     def _profile_cfg(self, profile):
         defaults = dict(self.config.get("defaults", {}))
@@ -212,7 +254,28 @@ class CloudBackupManager:
             "backup_interval_hours": int(cfg.get("backup_interval_hours", 24)),
             "backup_on_stop_count": int(cfg.get("backup_on_stop_count", 10)),
             "stop_counter": int(cfg.get("stop_counter", 0)),
-            "last_auto_backup_ts": int(cfg.get("last_auto_backup_ts", 0))
+            "last_auto_backup_ts": int(cfg.get("last_auto_backup_ts", 0)),
+            "backup_mode": cfg.get("backup_mode", "archive"),
+            "backup_workers": int(cfg.get("backup_workers", 0)),
+            "snapshot_mode": cfg.get("snapshot_mode", "auto"),
+            "snapshot_flush_timeout": float(cfg.get("snapshot_flush_timeout", 60)),
+            "stream_uploads": bool(cfg.get("stream_uploads", True)),
+            "keep_local_archive": bool(cfg.get("keep_local_archive", True)),
+            "upload_part_mb": float(cfg.get("upload_part_mb", 10)),
+            "stream_buffer_parts": int(cfg.get("stream_buffer_parts", 4)),
+            "upload_parallel_chunks": int(cfg.get("upload_parallel_chunks", 3)),
+            "upload_limit_kbps": float(cfg.get("upload_limit_kbps", 0) or 0),
+            "compression_mode": cfg.get("compression_mode", "auto"),
+            "compression_probe": bool(cfg.get("compression_probe", True)),
+            "compression_store_extensions": cfg.get("compression_store_extensions", []),
+            "compression_deflate_extensions": cfg.get("compression_deflate_extensions", []),
+            "throttle_read_kbps": float(cfg.get("throttle_read_kbps", 0) or 0),
+            "throttle_nice": int(cfg.get("throttle_nice", 10)),
+            "throttle_io_class": cfg.get("throttle_io_class", "idle"),
+            "throttle_adaptive": bool(cfg.get("throttle_adaptive", True)),
+            "retention_hourly": int(cfg.get("retention_hourly", DEFAULT_RETENTION["hourly"])),
+            "retention_daily": int(cfg.get("retention_daily", DEFAULT_RETENTION["daily"])),
+            "retention_weekly": int(cfg.get("retention_weekly", DEFAULT_RETENTION["weekly"]))
         }
 
     def update_settings(self, profile, settings):
@@ -227,6 +290,32 @@ class CloudBackupManager:
         existing["backup_on_stop_count"] = max(1, int(settings.get("backup_on_stop_count", existing.get("backup_on_stop_count", 10))))
         existing["stop_counter"] = int(existing.get("stop_counter", 0))
         existing["last_auto_backup_ts"] = int(existing.get("last_auto_backup_ts", 0))
+        existing["backup_workers"] = max(0, int(settings.get("backup_workers", existing.get("backup_workers", 0))))
+        existing["snapshot_mode"] = "off" if str(settings.get("snapshot_mode", existing.get("snapshot_mode", "auto"))).lower() == "off" else "auto"
+        existing["snapshot_flush_timeout"] = max(5.0, float(settings.get("snapshot_flush_timeout", existing.get("snapshot_flush_timeout", 60))))
+        for key in ("stream_uploads", "keep_local_archive"):
+            existing[key] = bool(settings.get(key, existing.get(key, True)))
+        existing["upload_part_mb"] = max(1.25, float(settings.get("upload_part_mb", existing.get("upload_part_mb", 10))))
+        existing["stream_buffer_parts"] = max(1, int(settings.get("stream_buffer_parts", existing.get("stream_buffer_parts", 4))))
+        existing["upload_parallel_chunks"] = max(1, min(8, int(settings.get("upload_parallel_chunks", existing.get("upload_parallel_chunks", 3)))))
+        existing["upload_limit_kbps"] = max(0.0, float(settings.get("upload_limit_kbps", existing.get("upload_limit_kbps", 0)) or 0))
+        existing["throttle_read_kbps"] = max(0.0, float(settings.get("throttle_read_kbps", existing.get("throttle_read_kbps", 0)) or 0))
+        existing["throttle_nice"] = max(0, min(19, int(settings.get("throttle_nice", existing.get("throttle_nice", 10)))))
+        io_class = str(settings.get("throttle_io_class", existing.get("throttle_io_class", "idle"))).lower()
+        existing["throttle_io_class"] = io_class if io_class in IO_CLASSES else "idle"
+        existing["throttle_adaptive"] = bool(settings.get("throttle_adaptive", existing.get("throttle_adaptive", True)))
+        mode = str(settings.get("compression_mode", existing.get("compression_mode", "auto"))).lower()
+        existing["compression_mode"] = mode if mode in POLICY_MODES else "auto"
+        existing["compression_probe"] = bool(settings.get("compression_probe", existing.get("compression_probe", True)))
+        for key in ("compression_store_extensions", "compression_deflate_extensions"):
+            value = settings.get(key, existing.get(key, []))
+            if isinstance(value, str):
+                value = value.split(",")
+            existing[key] = [str(v).strip().lower() for v in value if str(v).strip()]
+        existing["backup_mode"] = "incremental" if str(settings.get("backup_mode", existing.get("backup_mode", "archive"))).lower() == "incremental" else "archive"
+        for period, default in DEFAULT_RETENTION.items():
+            key = f"retention_{period}"
+            existing[key] = max(0, int(settings.get(key, existing.get(key, default))))
         profiles_cfg[profile] = existing
         self._save_config()
         return {"success": True, "settings": self.get_settings(profile)}
@@ -246,55 +335,303 @@ class CloudBackupManager:
         date_str = datetime.datetime.now().strftime("%Y%m%d")
         base = f"{profile}_{date_str}"
         counter = 1
-        existing = {str(h.get("name", "")) for h in self.history if h.get("profile") == profile}
+        existing = self.catalog.names(profile, base)
         while f"{base}_{counter}" in existing:
             counter += 1
         return f"{base}_{counter}"
 
-    def _archive_profile(self, profile, backup_name, backup_type):
+    def _iter_backup_files(self, profile_path, backup_type, snapshot=None):
+        """
+        (absolute path, path relative to the profile) for every file a backup should contain.
+        With a snapshot, world folders are read from its consistent copy instead of the live ones.
+        """
+        base_path = Path(profile_path)
+        if snapshot is not None:
+            worlds = set(world_snapshot.world_dirs(profile_path))
+            if backup_type == "world" and not worlds:
+                raise FileNotFoundError("No world folders found in profile")
+            if backup_type != "world":
+                for root, dirs, files in os.walk(profile_path):
+                    if root == profile_path:
+                        dirs[:] = [d for d in dirs if d not in worlds]
+                    rel_root = os.path.relpath(root, profile_path)
+                    if rel_root.startswith("logs") or rel_root.startswith("crash-reports"):
+                        continue
+                    for filename in files:
+                        if filename.endswith(".lck"):
+                            continue
+                        fp = os.path.join(root, filename)
+                        yield fp, os.path.relpath(fp, profile_path)
+            yield from snapshot.iter_files()
+            return
+        if backup_type == "world":
+            world_dirs = []
+            for item in base_path.iterdir():
+                if item.is_dir() and item.name.lower().startswith("world"):
+                    world_dirs.append(item)
+            if not world_dirs:
+                raise FileNotFoundError("No world folders found in profile")
+            for world_dir in world_dirs:
+                for root, _, files in os.walk(world_dir):
+                    for filename in files:
+                        fp = os.path.join(root, filename)
+                        yield fp, os.path.relpath(fp, profile_path)
+        else:
+            for root, dirs, files in os.walk(profile_path):
+                rel_root = os.path.relpath(root, profile_path)
+                if rel_root.startswith("logs") or rel_root.startswith("crash-reports"):
+                    continue
+                for filename in files:
+                    if filename.endswith(".lck"):
+                        continue
+                    fp = os.path.join(root, filename)
+                    yield fp, os.path.relpath(fp, profile_path)
+
+    def _safe_backup_name(self, profile, backup_name):
+        return "".join(c for c in backup_name if c.isalnum() or c in ("-", "_")).strip() or self._next_default_backup_name(profile)
+
+    def _archive_profile(self, profile, backup_name, backup_type, snapshot=None, throttle=None):
         profile_path = os.path.join(self.servers_dir, profile)
         if not os.path.isdir(profile_path):
             raise FileNotFoundError("Server profile not found")
 
-        safe_name = "".join(c for c in backup_name if c.isalnum() or c in ("-", "_")).strip() or self._next_default_backup_name(profile)
+        safe_name = self._safe_backup_name(profile, backup_name)
         ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
         file_name = f"{safe_name}_{ts}.zip"
         output_path = os.path.join(self.backups_dir, file_name)
 
-        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_DEFLATED) as zf:
-            base_path = Path(profile_path)
-            if backup_type == "world":
-                world_dirs = []
-                for item in base_path.iterdir():
-                    if item.is_dir() and item.name.lower().startswith("world"):
-                        world_dirs.append(item)
-                if not world_dirs:
-                    raise FileNotFoundError("No world folders found in profile")
-                for world_dir in world_dirs:
-                    for root, _, files in os.walk(world_dir):
-                        for filename in files:
-                            fp = os.path.join(root, filename)
-                            rel = os.path.relpath(fp, profile_path)
-                            zf.write(fp, rel)
-            else:
-                for root, dirs, files in os.walk(profile_path):
-                    rel_root = os.path.relpath(root, profile_path)
-                    if rel_root.startswith("logs") or rel_root.startswith("crash-reports"):
-                        continue
-                    for filename in files:
-                        if filename.endswith(".lck"):
+        cfg = self._profile_cfg(profile)
+        workers = int(cfg.get("backup_workers", 0)) or os.cpu_count()
+        policy = CompressionPolicy.from_settings(cfg)
+        with open(output_path, "wb") as fh, ParallelZipWriter(fh, workers=workers, policy=policy, throttle=throttle) as writer:
+            for fp, rel in self._iter_backup_files(profile_path, backup_type, snapshot):
+                try:
+                    writer.add_file(fp, rel)
+                except FileNotFoundError:
+                    # Deleted by the running server between listing and reading
+                    continue
+
+        return output_path, file_name, os.path.getsize(output_path), writer.get_stats()
+
+    def _stream_archive(self, profile, backup_name, backup_type, providers, backup_id=None, snapshot=None, throttle=None):
+        """
+        Archive straight into the providers' upload sessions instead of writing the zip first.
+        Google Drive and Dropbox read parts from a bounded in-memory tee while the archive is
+        being built. OneDrive needs the total size up front, so it uploads from the spool file
+        once the archive is finished. The spool doubles as the local copy when keep_local_archive
+        is on. Returns (local path or None, file name, size, archive stats, uploads).
+        """
+        profile_path = os.path.join(self.servers_dir, profile)
+        if not os.path.isdir(profile_path):
+            raise FileNotFoundError("Server profile not found")
+
+        cfg = self._profile_cfg(profile)
+        safe_name = self._safe_backup_name(profile, backup_name)
+        ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        file_name = f"{safe_name}_{ts}.zip"
+        keep_local = bool(cfg.get("keep_local_archive", True))
+        streamed = [p for p in providers if p != "onedrive"]
+        spooled = [p for p in providers if p == "onedrive"]
+        spool_path = None
+        if keep_local:
+            spool_path = os.path.join(self.backups_dir, file_name)
+        elif spooled:
+            spool_path = os.path.join(self.backups_dir, f".{file_name}.spool")
+
+        files = list(self._iter_backup_files(profile_path, backup_type, snapshot))
+        estimated = 0
+        for fp, _ in files:
+            try:
+                estimated += os.path.getsize(fp)
+            except OSError:
+                continue
+
+        part_size = self._part_size(profile)
+        workers = int(cfg.get("backup_workers", 0)) or os.cpu_count()
+        policy = CompressionPolicy.from_settings(cfg)
+        report = self._upload_progress(profile, providers, estimated)
+        bucket = self._upload_bucket(profile)
+        spool = open(spool_path, "wb") if spool_path else None
+        fanout = StreamFanout(streamed, part_size, int(cfg.get("stream_buffer_parts", 4)), spool)
+        pool = ThreadPoolExecutor(max_workers=len(providers), thread_name_prefix="upload")
+        futures = {
+            p: pool.submit(self._upload_provider, profile, p, file_name, report, parts=fanout.consume(p), fanout=fanout, bucket=bucket)
+            for p in streamed
+        }
+        try:
+            try:
+                with ParallelZipWriter(fanout, workers=workers, policy=policy, throttle=throttle) as writer:
+                    for fp, rel in files:
+                        try:
+                            writer.add_file(fp, rel)
+                        except FileNotFoundError:
                             continue
-                        fp = os.path.join(root, filename)
-                        rel = os.path.relpath(fp, profile_path)
-                        zf.write(fp, rel)
+                fanout.close()
+            except Exception as e:
+                fanout.abort(e)
+                raise
+            finally:
+                if spool:
+                    spool.close()
+            size = fanout.bytes_written
+            # A temporary spool is deleted right after, so only a kept archive gets a resume checkpoint
+            meta = {"profile": profile, "backup_id": backup_id, "file_name": file_name} if keep_local else None
+            for p in spooled:
+                futures[p] = pool.submit(
+                    self._upload_provider, profile, p, file_name, report,
+                    file_path=spool_path, bucket=bucket, meta=meta
+                )
+        except Exception:
+            if spool_path:
+                try:
+                    os.remove(spool_path)
+                except OSError:
+                    pass
+            raise
+        finally:
+            pool.shutdown(wait=True)
 
-        return output_path, file_name, os.path.getsize(output_path)
+        uploads = {p: futures[p].result() for p in providers}
+        if spool_path and not keep_local:
+            try:
+                os.remove(spool_path)
+            except OSError:
+                pass
+            spool_path = None
+        stats = writer.get_stats()
+        stats["stream"] = fanout.get_stats()
+        self._set_progress(
+            profile,
+            success=True,
+            active=True,
+            phase="finalizing",
+            provider=None,
+            progress=96,
+            message="Finalizing backup record..."
+        )
+        return spool_path, file_name, size, stats, uploads
+
+    def _incremental_profile(self, profile, backup_name, backup_type, pack=True, snapshot=None, throttle=None):
+        """
+        Record a deduplicated backup in the chunk store. With pack=True the chunks that are new in
+        this run plus the manifest are bundled into a small zip for the cloud providers.
+        Returns (path, file name, size, stats).
+        """
+        profile_path = os.path.join(self.servers_dir, profile)
+        if not os.path.isdir(profile_path):
+            raise FileNotFoundError("Server profile not found")
 
-    def create_backup(self, profile, backup_name=None, backup_type="full_server", providers=None, source="manual"):
+        safe_name = self._safe_backup_name(profile, backup_name)
+        ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        backup_id = f"{safe_name}_{ts}"
+
+        def _progress(stats):
+            self._set_progress(
+                profile,
+                phase="archiving",
+                message=f"Scanning files... {stats['files']} checked, {stats['new_chunks']} new chunks"
+            )
+
+        files = self._iter_backup_files(profile_path, backup_type, snapshot)
+        policy = CompressionPolicy.from_settings(self._profile_cfg(profile))
+        manifest, manifest_path, new_chunks, stats = self.chunk_store.snapshot(profile, backup_id, files, _progress, policy, throttle)
+        stats["manifest_id"] = backup_id
+        if not pack:
+            return manifest_path, os.path.basename(manifest_path), os.path.getsize(manifest_path), stats
+
+        # Objects are already compressed where it helps, so the pack is stored as-is
+        file_name = f"{backup_id}.incr.zip"
+        output_path = os.path.join(self.backups_dir, file_name)
+        with zipfile.ZipFile(output_path, "w", zipfile.ZIP_STORED, allowZip64=True) as zf:
+            zf.write(manifest_path, f"manifests/{profile}/{backup_id}.json")
+            for digest in new_chunks:
+                zf.write(self.chunk_store.object_path(digest), f"objects/{digest[:2]}/{digest}")
+        return output_path, file_name, os.path.getsize(output_path), stats
+
+    def _apply_retention(self, profile):
+        cfg = self._profile_cfg(profile)
+        retention = {period: cfg.get(f"retention_{period}", default) for period, default in DEFAULT_RETENTION.items()}
+        expired = self.chunk_store.apply_retention(profile, retention)
+        self.catalog.expire(expired)
+        if not expired:
+            return {"expired": [], "chunks_removed": 0, "bytes_freed": 0}
+        removed, freed = self.chunk_store.gc()
+        print(f"[Backup] Retention dropped {len(expired)} backups of {profile}, freed {freed} bytes in {removed} chunks")
+        return {"expired": expired, "chunks_removed": removed, "bytes_freed": freed}
+
+    def attach_server(self, server):
+        """Server manager used to pause saving while a running world is snapshotted"""
+        self._server = server
+
+    def _profile_lock(self, profile):
+        with self._lock:
+            return self._profile_locks.setdefault(profile, threading.Lock())
+
+    def _server_runs(self, profile):
+        server = self._server
+        if server is None or not server.is_running():
+            return False
+        profile_path = os.path.join(self.servers_dir, profile)
+        current = server.current_profile or ""
+        return os.path.normcase(os.path.abspath(current)) == os.path.normcase(os.path.abspath(profile_path))
+
+    def _capture_world(self, profile, throttle=None):
+        """(snapshot, stats) when the server is running this profile, else (None, None): files are at rest"""
+        cfg = self._profile_cfg(profile)
+        if str(cfg.get("snapshot_mode", "auto")).lower() == "off" or not self._server_runs(profile):
+            return None, None
+        server = self._server
+        profile_path = os.path.join(self.servers_dir, profile)
+        self._set_progress(
+            profile,
+            success=True,
+            active=True,
+            phase="archiving",
+            progress=4,
+            message="Flushing world saves for a consistent snapshot..."
+        )
+        snapshot = WorldSnapshot(profile_path, os.path.join(self.snapshots_dir, profile))
+        stats = snapshot.capture(server, float(cfg.get("snapshot_flush_timeout", 60)), throttle)
+        print(f"[Backup] Snapshot of {profile}: saving paused for {stats['window_seconds']}s, consistent={stats['consistent']}")
+        return snapshot, stats
+
+    def get_store_stats(self, profile=None):
+        stats = self.chunk_store.get_stats()
+        if profile:
+            stats["backups"] = self.chunk_store.list_manifests(profile)
+        return {"success": True, "store": stats}
+
+    def _governor(self, profile):
+        cfg = self._profile_cfg(profile)
+        return BackupGovernor(
+            read_limit_kbps=float(cfg.get("throttle_read_kbps", 0) or 0),
+            nice=int(cfg.get("throttle_nice", 10)),
+            io_class=cfg.get("throttle_io_class", "idle"),
+            console=self._server.console if self._server_runs(profile) else None,
+            adaptive=bool(cfg.get("throttle_adaptive", True))
+        )
+
+    def create_backup(self, profile, backup_name=None, backup_type="full_server", providers=None, source="manual", mode=None):
+        """Runs the backup on a thread of its own, since the governor lowers that thread's priority for good"""
+        result = {}
+
+        def _job():
+            try:
+                result.update(self._run_backup(profile, backup_name, backup_type, providers, source, mode))
+            except Exception as e:
+                result.update({"success": False, "error": str(e)})
+
+        job = threading.Thread(target=_job, name=f"backup-{profile}", daemon=True)
+        job.start()
+        job.join()
+        return result
+
+    def _run_backup(self, profile, backup_name, backup_type, providers, source, mode):
         if not profile:
             return {"success": False, "error": "Profile is required"}
         backup_type = "world" if str(backup_type).lower() == "world" else "full_server"
         providers = self._normalize_providers(providers)
+        mode = "incremental" if str(mode or self._profile_cfg(profile).get("backup_mode", "archive")).lower() == "incremental" else "archive"
         if not backup_name:
             backup_name = self._next_default_backup_name(profile)
         self._set_progress(
@@ -309,8 +646,39 @@ class CloudBackupManager:
             message="Creating backup archive..."
         )
 
+        backup_id = str(uuid.uuid4())
+        started = time.time()
+        incremental = None
+        archive_stats = None
+        snapshot_stats = None
+        uploads = None
+        governor = self._governor(profile)
         try:
-            zip_path, zip_name, size = self._archive_profile(profile, backup_name, backup_type)
+            # One backup of a profile at a time; they share the snapshot mirror
+            with self._profile_lock(profile):
+                # The live pre-sync copies the whole world on a first backup; it must not starve the server
+                governor.apply_priority()
+                snapshot, snapshot_stats = self._capture_world(profile, governor.throttle)
+                # The save-off window read nothing through the governor; don't count it in the archive rate
+                governor.restart_clock()
+                if mode == "incremental":
+                    zip_path, zip_name, size, incremental = self._incremental_profile(
+                        profile, backup_name, backup_type, pack=bool(providers), snapshot=snapshot, throttle=governor.throttle
+                    )
+                elif providers and self._profile_cfg(profile).get("stream_uploads", True):
+                    zip_path, zip_name, size, archive_stats, uploads = self._stream_archive(
+                        profile, backup_name, backup_type, providers, backup_id, snapshot, governor.throttle
+                    )
+                else:
+                    zip_path, zip_name, size, archive_stats = self._archive_profile(
+                        profile, backup_name, backup_type, snapshot, governor.throttle
+                    )
+            throttle_stats = governor.get_stats()
+            print(
+                f"[Backup] Throttle for {profile}: read {throttle_stats['read_bytes']} bytes at {throttle_stats['read_mb_per_sec']} MB/s, "
+                f"slept {throttle_stats['throttled_seconds']}s, {throttle_stats['lag_events']} lag events "
+                f"(max {throttle_stats['max_behind_ms']}ms behind), priority {throttle_stats['priority']}"
+            )
         except Exception as e:
             self._set_progress(
                 profile,
@@ -321,21 +689,23 @@ class CloudBackupManager:
                 message=f"Backup failed: {e}"
             )
             return {"success": False, "error": str(e)}
-        self._set_progress(
-            profile,
-            success=True,
-            active=True,
-            phase="uploading",
-            provider=None,
-            progress=8,
-            uploaded_bytes=0,
-            total_bytes=size,
-            message="Archive ready. Starting cloud upload..."
-        )
-        uploads = self._upload_to_providers(profile, zip_path, zip_name, providers)
+        if uploads is None:
+            self._set_progress(
+                profile,
+                success=True,
+                active=True,
+                phase="uploading",
+                provider=None,
+                progress=8,
+                uploaded_bytes=0,
+                total_bytes=size,
+                message="Archive ready. Starting cloud upload..."
+            )
+            meta = {"profile": profile, "backup_id": backup_id, "file_name": zip_name}
+            uploads = self._upload_to_providers(profile, zip_path, zip_name, providers, meta)
         now_ts = int(time.time())
         info = {
-            "id": str(uuid.uuid4()),
+            "id": backup_id,
             "name": backup_name,
             "file_name": zip_name,
             "profile": profile,
@@ -346,23 +716,29 @@ class CloudBackupManager:
             "size": size,
             "source": source,
             "local_path": zip_path,
-            "status": "completed"
+            "status": "completed",
+            "mode": mode,
+            "duration_seconds": round(time.time() - started, 2)
         }
-        success_count = 0
-        for provider_result in uploads.values():
-            if isinstance(provider_result, dict) and provider_result.get("success"):
-                success_count += 1
-        total_targets = len(providers or [])
-        info["cloud_upload"] = {
-            "requested_providers": total_targets,
-            "succeeded": success_count,
-            "failed": max(0, total_targets - success_count),
-            "status": "uploaded" if total_targets and success_count == total_targets else ("partial" if success_count > 0 else ("skipped" if total_targets == 0 else "failed"))
-        }
-        with self._lock:
-            self.history.append(info)
-            self.history = self.history[-500:]
-            self._save_history()
+        info["cloud_upload"] = self._summarize_uploads(providers, uploads)
+        success_count = info["cloud_upload"]["succeeded"]
+        total_targets = info["cloud_upload"]["requested_providers"]
+        if snapshot_stats is not None:
+            info["snapshot"] = snapshot_stats
+        info["throttle"] = throttle_stats
+        if archive_stats is not None:
+            info["archive"] = archive_stats
+        if incremental is not None:
+            info["incremental"] = incremental
+            info["retention"] = self._apply_retention(profile)
+            if zip_path.endswith(".incr.zip") and total_targets and success_count == total_targets:
+                # The chunk store already holds everything in the pack
+                try:
+                    os.remove(zip_path)
+                except OSError:
+                    pass
+                info["local_path"] = self.chunk_store.manifest_path(profile, incremental["manifest_id"])
+        self.catalog.add(info, self._backup_files(info))
         if total_targets > 0 and success_count == 0:
             self._set_progress(
                 profile,
@@ -387,14 +763,102 @@ class CloudBackupManager:
         )
         return {"success": True, "backup": info, "partial": total_targets > 0 and success_count < total_targets}
 
-    def list_backups(self, profile=None):
-        records = list(reversed(self.history))
-        if profile:
-            records = [b for b in records if b.get("profile") == profile]
-        return records
+    def _summarize_uploads(self, providers, uploads):
+        success_count = 0
+        for provider_result in uploads.values():
+            if isinstance(provider_result, dict) and provider_result.get("success"):
+                success_count += 1
+        total_targets = len(providers or [])
+        return {
+            "requested_providers": total_targets,
+            "succeeded": success_count,
+            "failed": max(0, total_targets - success_count),
+            "status": "uploaded" if total_targets and success_count == total_targets else ("partial" if success_count > 0 else ("skipped" if total_targets == 0 else "failed"))
+        }
+
+    def list_backups(self, profile=None, backup_type=None, source=None, mode=None, since=None, until=None, limit=500, offset=0):
+        return self.catalog.list(
+            profile=profile, backup_type=backup_type, source=source, mode=mode,
+            since=since, until=until, limit=limit, offset=offset
+        )
+
+    def get_file_versions(self, profile, path):
+        if not profile or not path:
+            return {"success": False, "error": "Profile and path are required"}
+        return {"success": True, "path": path, "versions": self.catalog.file_versions(profile, path)}
 
-    def restore_backup(self, profile, backup_name):
-        return {"success": False, "error": "Restore not implemented in this version."}
+    def find_backups_with(self, profile, path, version=None, limit=100, offset=0):
+        if not profile or not path:
+            return {"success": False, "error": "Profile and path are required"}
+        return {"success": True, "path": path, "version": version, "backups": self.catalog.backups_with(profile, path, version, limit, offset)}
+
+    def _find_backup(self, profile, backup_ref):
+        return self.catalog.find(profile, backup_ref)
+
+    def restore_backup(self, profile, backup_name, scope=None, keep_undo=True):
+        """
+        Restore a backup (by id, name or file name) into its profile, whole or selectively (see RestoreScope).
+        Replaced files go to backups/.restore_undo/<profile>_<timestamp> unless keep_undo is off.
+        """
+        if not profile:
+            return {"success": False, "error": "Profile is required"}
+        record = self._find_backup(profile, backup_name)
+        if record is None:
+            return {"success": False, "error": "Backup not found"}
+        if self._server_runs(profile):
+            return {"success": False, "error": "Stop the server before restoring; it would overwrite the restored files."}
+        try:
+            scope = RestoreScope.from_request(scope)
+        except RestoreError as e:
+            return {"success": False, "error": str(e)}
+        profile_path = os.path.join(self.servers_dir, profile)
+        os.makedirs(profile_path, exist_ok=True)
+        undo_dir = None
+        if keep_undo:
+            ts = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+            undo_dir = os.path.join(self.backups_dir, ".restore_undo", f"{profile}_{ts}")
+
+        def _progress(done_files, total_files, done_bytes, total_bytes):
+            self._set_progress(
+                profile,
+                success=True,
+                active=True,
+                phase="restoring",
+                progress=int(done_bytes * 100 / total_bytes) if total_bytes else 100,
+                message=f"Restored {done_files}/{total_files} files..."
+            )
+
+        self._set_progress(profile, success=True, active=True, phase="restoring", progress=0, message="Restoring backup...")
+        cfg = self._profile_cfg(profile)
+        restorer = BackupRestorer(
+            profile_path,
+            workers=int(cfg.get("backup_workers", 0)) or min(8, os.cpu_count() or 1) * 2,
+            undo_dir=undo_dir,
+            progress=_progress
+        )
+        try:
+            # Never while the same profile is being backed up
+            with self._profile_lock(profile):
+                incremental = record.get("incremental")
+                if incremental:
+                    try:
+                        manifest = self.chunk_store.load_manifest(profile, incremental["manifest_id"])
+                    except OSError:
+                        raise RestoreError("Backup has expired from the local store")
+                    stats = restorer.restore_manifest(self.chunk_store, manifest, scope)
+                else:
+                    zip_path = record.get("local_path")
+                    if not zip_path or not os.path.isfile(zip_path):
+                        raise RestoreError("Backup archive is not available locally")
+                    stats = restorer.restore_zip(zip_path, scope)
+        except (RestoreError, OSError, zipfile.BadZipFile) as e:
+            self._set_progress(profile, success=True, active=False, phase="failed", progress=0, message=f"Restore failed: {e}")
+            return {"success": False, "error": str(e)}
+        stats["scope"] = scope.describe()
+        stats["backup_id"] = record.get("id")
+        self._set_progress(profile, success=True, active=False, phase="completed", progress=100, message=f"Restored {stats['files']} files.")
+        print(f"[Backup] Restored {stats['files']} files of {profile} from {record.get('name')} in {stats['seconds']}s")
+        return {"success": True, "restore": stats}
 
     def on_server_stop(self, profile):
         if not profile:
@@ -432,6 +896,10 @@ class CloudBackupManager:
         self._profile_resolver = profile_resolver
 
         def _loop():
+            try:
+                self.resume_uploads()
+            except Exception as e:
+                print(f"[Backup] Resuming uploads failed: {e}")
             while True:
                 try:
                     profile = self._profile_resolver() if self._profile_resolver else None
@@ -462,52 +930,108 @@ class CloudBackupManager:
         thread = threading.Thread(target=_loop, daemon=True)
         thread.start()
 
-    def _upload_to_providers(self, profile, file_path, file_name, providers):
-        out = {}
-        total = max(1, len(providers))
-        for idx, provider in enumerate(providers):
-            try:
-                base_progress = 8 + int((idx / total) * 84)
-                self._set_progress(
-                    profile,
-                    success=True,
-                    active=True,
-                    phase="uploading",
-                    provider=provider,
-                    progress=base_progress,
-                    message=f"Uploading to {provider}..."
+    def _api_base(self, provider, default):
+        # Overridable so uploads can be pointed at a local stand-in of the provider API
+        env_name = f"{provider.upper()}_API_BASE"
+        return (self._cfg_or_env(provider, "api_base", env_name) or default).rstrip("/")
+
+    def _part_size(self, profile):
+        return align_part_size(float(self._profile_cfg(profile).get("upload_part_mb", 10)) * 1024 * 1024)
+
+    def _upload_progress(self, profile, providers, total_size):
+        """Progress callback shared by parallel uploads: report(provider, bytes uploaded)"""
+        uploaded = {p: 0 for p in providers}
+        lock = threading.Lock()
+
+        def _report(provider, done):
+            with lock:
+                uploaded[provider] = done
+                fraction = sum(min(1.0, v / max(1, total_size)) for v in uploaded.values()) / max(1, len(uploaded))
+            self._set_progress(
+                profile,
+                success=True,
+                active=True,
+                phase="uploading",
+                provider=provider,
+                progress=8 + int(fraction * 84),
+                uploaded_bytes=done,
+                total_bytes=total_size,
+                message=f"Uploading to {provider}... {int(min(1.0, done / max(1, total_size)) * 100)}%"
+            )
+
+        return _report
+
+    def _upload_session(self, provider, file_name, http, bucket=None, concurrent=False):
+        token = self._get_provider_access_token(provider)
+        if provider == "google_drive":
+            if not token:
+                raise UploadError("Missing GOOGLE_DRIVE_ACCESS_TOKEN")
+            base = self._api_base("google_drive", "https://www.googleapis.com")
+            folder_id = os.getenv("GOOGLE_DRIVE_FOLDER_ID", "").strip()
+            return GoogleDriveSession(http, token, base, file_name, folder_id, bucket)
+        if provider == "dropbox":
+            if not token:
+                raise UploadError("Missing DROPBOX_ACCESS_TOKEN")
+            base = self._api_base("dropbox", "https://content.dropboxapi.com")
+            return DropboxSession(http, token, base, file_name, bucket, concurrent=concurrent)
+        if provider == "onedrive":
+            if not token:
+                raise UploadError("Missing ONEDRIVE_ACCESS_TOKEN")
+            base = self._api_base("onedrive", "https://graph.microsoft.com/v1.0")
+            return OneDriveSession(http, token, base, file_name, bucket)
+        raise UploadError("Unsupported provider")
+
+    def _upload_bucket(self, profile):
+        """Token bucket shared by every upload of one backup, or None when unlimited"""
+        limit_kbps = float(self._profile_cfg(profile).get("upload_limit_kbps", 0) or 0)
+        return TokenBucket(limit_kbps * 1024) if limit_kbps > 0 else None
+
+    def _upload_provider(self, profile, provider, file_name, report, file_path=None, parts=None, fanout=None, bucket=None, meta=None):
+        """
+        Upload a local file (resumable across restarts via a checkpoint) or a stream of
+        (offset, data, last) parts to one provider. Never raises; returns the result dict.
+        """
+        cfg = self._profile_cfg(profile)
+
+        def _on_progress(done):
+            report(provider, done)
+
+        try:
+            with requests.Session() as http:
+                session = self._upload_session(
+                    provider, file_name, http, bucket,
+                    concurrent=file_path is not None and int(cfg.get("upload_parallel_chunks", 3)) > 1
                 )
-                if provider == "google_drive":
-                    out[provider] = self._upload_google_drive(profile, file_path, file_name, base_progress, total)
-                elif provider == "dropbox":
-                    out[provider] = self._upload_dropbox(file_path, file_name)
-                elif provider == "onedrive":
-                    out[provider] = self._upload_onedrive(file_path, file_name)
-                else:
-                    out[provider] = {"success": False, "error": "Unsupported provider"}
-                done_progress = 8 + int(((idx + 1) / total) * 84)
-                if out[provider].get("success"):
-                    self._set_progress(
-                        profile,
-                        success=True,
-                        active=True,
-                        phase="uploading",
-                        provider=provider,
-                        progress=done_progress,
-                        message=f"Uploaded to {provider}."
-                    )
+                uploader = ResumableUpload(
+                    session,
+                    chunk_size=self._part_size(profile),
+                    parallel=int(cfg.get("upload_parallel_chunks", 3)),
+                    checkpoint=UploadCheckpoint(self.uploads_dir, provider, file_path, meta) if file_path else None,
+                    on_progress=_on_progress
+                )
+                if file_path:
+                    result = uploader.upload_file(file_path)
                 else:
-                    self._set_progress(
-                        profile,
-                        success=True,
-                        active=True,
-                        phase="uploading",
-                        provider=provider,
-                        progress=done_progress,
-                        message=f"{provider} upload failed."
-                    )
-            except Exception as e:
-                out[provider] = {"success": False, "error": str(e)}
+                    result = uploader.upload_stream(parts)
+                result["transfer"] = uploader.get_stats()
+        except Exception as e:
+            result = {"success": False, "error": str(e)}
+        if fanout is not None and not result.get("success"):
+            fanout.detach(provider)
+        return result
+
+    def _upload_to_providers(self, profile, file_path, file_name, providers, meta=None):
+        if not providers:
+            return {}
+        total_size = os.path.getsize(file_path)
+        report = self._upload_progress(profile, providers, total_size)
+        bucket = self._upload_bucket(profile)
+        with ThreadPoolExecutor(max_workers=len(providers), thread_name_prefix="upload") as pool:
+            futures = {
+                p: pool.submit(self._upload_provider, profile, p, file_name, report, file_path=file_path, bucket=bucket, meta=meta)
+                for p in providers
+            }
+        out = {p: f.result() for p, f in futures.items()}
         self._set_progress(
             profile,
             success=True,
@@ -519,135 +1043,31 @@ class CloudBackupManager:
         )
         return out
 
-    def _upload_google_drive(self, profile, file_path, file_name, base_progress=8, provider_count=1):
-        token = self._get_provider_access_token("google_drive")
-        folder_id = os.getenv("GOOGLE_DRIVE_FOLDER_ID", "").strip()
-        if not token:
-            return {"success": False, "error": "Missing GOOGLE_DRIVE_ACCESS_TOKEN"}
-        metadata = {"name": file_name}
-        if folder_id:
-            metadata["parents"] = [folder_id]
-        file_size = os.path.getsize(file_path)
-        try:
-            start_resp = requests.post(
-                "https://www.googleapis.com/upload/drive/v3/files?uploadType=resumable&fields=id,webViewLink",
-                headers={
-                    "Authorization": f"Bearer {token}",
-                    "Content-Type": "application/json; charset=UTF-8",
-                    "X-Upload-Content-Type": "application/zip",
-                    "X-Upload-Content-Length": str(file_size),
-                },
-                json=metadata,
-                timeout=(20, 120),
+    def resume_uploads(self):
+        """Finish uploads that failed or were interrupted, from their checkpoints"""
+        resumed = {}
+        for saved in UploadCheckpoint.list(self.uploads_dir):
+            provider = saved.get("provider")
+            file_path = saved.get("path")
+            meta = saved.get("meta", {})
+            profile = meta.get("profile")
+            checkpoint = UploadCheckpoint(self.uploads_dir, provider, file_path or "", meta)
+            if not provider or not profile or not file_path or not os.path.exists(file_path):
+                checkpoint.delete()
+                continue
+            report = self._upload_progress(profile, [provider], os.path.getsize(file_path))
+            result = self._upload_provider(
+                profile, provider, meta.get("file_name") or os.path.basename(file_path), report,
+                file_path=file_path, bucket=self._upload_bucket(profile), meta=meta
             )
-            if start_resp.status_code >= 400:
-                return {"success": False, "error": f"Google upload init failed: {start_resp.text}"}
-            session_url = start_resp.headers.get("Location")
-            if not session_url:
-                return {"success": False, "error": "Google upload init returned no session URL"}
-            chunk_size = 8 * 1024 * 1024
-            uploaded = 0
-            final_resp = None
-            with open(file_path, "rb") as fh:
-                while True:
-                    chunk = fh.read(chunk_size)
-                    if not chunk:
-                        break
-                    start = uploaded
-                    end = uploaded + len(chunk) - 1
-                    headers = {
-                        "Authorization": f"Bearer {token}",
-                        "Content-Type": "application/zip",
-                        "Content-Length": str(len(chunk)),
-                        "Content-Range": f"bytes {start}-{end}/{file_size}",
-                    }
-                    upload_resp = requests.put(
-                        session_url,
-                        headers=headers,
-                        data=chunk,
-                        timeout=(20, 900),
-                    )
-                    if upload_resp.status_code in (200, 201):
-                        uploaded = end + 1
-                        final_resp = upload_resp
-                        self._set_progress(
-                            profile,
-                            success=True,
-                            active=True,
-                            phase="uploading",
-                            provider="google_drive",
-                            progress=base_progress + int((uploaded / max(1, file_size)) * (84 / max(1, provider_count))),
-                            uploaded_bytes=uploaded,
-                            total_bytes=file_size,
-                            message=f"Uploading to google_drive... {int((uploaded / max(1, file_size)) * 100)}%"
-                        )
-                        break
-                    if upload_resp.status_code == 308:
-                        uploaded = end + 1
-                        self._set_progress(
-                            profile,
-                            success=True,
-                            active=True,
-                            phase="uploading",
-                            provider="google_drive",
-                            progress=base_progress + int((uploaded / max(1, file_size)) * (84 / max(1, provider_count))),
-                            uploaded_bytes=uploaded,
-                            total_bytes=file_size,
-                            message=f"Uploading to google_drive... {int((uploaded / max(1, file_size)) * 100)}%"
-                        )
-                        continue
-                    return {"success": False, "error": f"Google upload failed: {upload_resp.text}"}
-
-            if not final_resp:
-                return {"success": False, "error": "Google upload failed: no completion response"}
-            data = final_resp.json()
-            file_id = data.get("id")
-            web_link = data.get("webViewLink")
-            return {
-                "success": True,
-                "file_id": file_id,
-                "url": web_link or (f"https://drive.google.com/file/d/{file_id}/view" if file_id else None),
-            }
-        except Exception as e:
-            return {"success": False, "error": str(e)}
-
-    def _upload_dropbox(self, file_path, file_name):
-        token = self._get_provider_access_token("dropbox")
-        if not token:
-            return {"success": False, "error": "Missing DROPBOX_ACCESS_TOKEN"}
-        with open(file_path, "rb") as f:
-            file_bytes = f.read()
-        dbx_path = f"/MCmadeEasy Backups/{file_name}"
-        req = urlrequest.Request(
-            "https://content.dropboxapi.com/2/files/upload",
-            data=file_bytes,
-            method="POST"
-        )
-        req.add_header("Authorization", f"Bearer {token}")
-        req.add_header("Content-Type", "application/octet-stream")
-        req.add_header("Dropbox-API-Arg", json.dumps({
-            "path": dbx_path,
-            "mode": "add",
-            "autorename": True,
-            "mute": False
-        }))
-        with urlrequest.urlopen(req, timeout=60) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-            return {"success": True, "path": data.get("path_display")}
-
-    def _upload_onedrive(self, file_path, file_name):
-        token = self._get_provider_access_token("onedrive")
-        if not token:
-            return {"success": False, "error": "Missing ONEDRIVE_ACCESS_TOKEN"}
-        with open(file_path, "rb") as f:
-            file_bytes = f.read()
-        target_url = f"https://graph.microsoft.com/v1.0/me/drive/root:/MCmadeEasy Backups/{file_name}:/content"
-        req = urlrequest.Request(target_url, data=file_bytes, method="PUT")
-        req.add_header("Authorization", f"Bearer {token}")
-        req.add_header("Content-Type", "application/zip")
-        with urlrequest.urlopen(req, timeout=60) as resp:
-            data = json.loads(resp.read().decode("utf-8"))
-            return {"success": True, "file_id": data.get("id"), "web_url": data.get("webUrl")}
+            resumed[f"{meta.get('backup_id')}:{provider}"] = result
+            with self._lock:
+                record = self.catalog.get(meta.get("backup_id"))
+                if record is not None:
+                    record.setdefault("uploads", {})[provider] = result
+                    record["cloud_upload"] = self._summarize_uploads(record.get("providers", []), record["uploads"])
+                    self.catalog.update(record)
+        return {"success": True, "resumed": resumed}
 
     def get_provider_connection_status(self, providers):
         normalized = self._normalize_providers(providers)
@@ -0,0 +1,156 @@
+import errno
+import os
+import re
+import shutil
+import time
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+# ioctl that makes dst share src's extents (btrfs, xfs with reflink, bcachefs)
+FICLONE = 0x40049409
+
+SAVE_OFF_PATTERN = re.compile(r"Automatic saving is now disabled|Saving is already turned off", re.IGNORECASE)
+SAVED_PATTERN = re.compile(r"Saved the game", re.IGNORECASE)
+COPY_BLOCK = 1024 * 1024
+
+
+def world_dirs(profile_path):
+    """World folders of a profile (world, world_nether, world_the_end, ...)"""
+    try:
+        names = sorted(os.listdir(profile_path))
+    except OSError:
+        return []
+    return [n for n in names if n.lower().startswith("world") and os.path.isdir(os.path.join(profile_path, n))]
+
+
+class WorldSnapshot:
+    """
+    Consistent copy of a running server's worlds, kept as a mirror under mirror_root:
+    - A plain save-all and a live pre-sync copy everything that changed since the last backup
+      while the server keeps playing normally.
+    - Only then save-off + save-all flush; the few files written since the pre-sync are synced
+      (reflinked where the filesystem can) and save-on is sent straight away.
+    Region files are rewritten in place, so hardlinks would keep changing under the snapshot;
+    the mirror holds real copies. Backups archive from the mirror at leisure.
+    """
+
+    def __init__(self, profile_path, mirror_root):
+        self.profile_path = profile_path
+        self.mirror_root = mirror_root
+        self._clone_ok = fcntl is not None
+
+    def _clone_or_copy(self, src, dst, st, throttle=None):
+        tmp = f"{dst}.snap.tmp"
+        cloned = False
+        if self._clone_ok:
+            try:
+                with open(src, "rb") as s, open(tmp, "wb") as d:
+                    fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+                cloned = True
+            except OSError as e:
+                if e.errno in (errno.EOPNOTSUPP, errno.ENOTTY, errno.EXDEV, errno.EINVAL, errno.ENOSYS):
+                    self._clone_ok = False
+        if not cloned and throttle is None:
+            shutil.copyfile(src, tmp)
+        elif not cloned:
+            with open(src, "rb") as s, open(tmp, "wb") as d:
+                while True:
+                    block = s.read(COPY_BLOCK)
+                    if not block:
+                        break
+                    d.write(block)
+                    throttle(len(block))
+        # Stamp the mtime seen *before* copying: a write racing the copy leaves the source
+        # newer than the mirror, so the next sync copies it again
+        os.utime(tmp, ns=(st.st_atime_ns, st.st_mtime_ns))
+        os.replace(tmp, dst)
+        return cloned
+
+    def sync(self, throttle=None):
+        """
+        Make the mirror match the worlds; copies only files whose size or mtime differ.
+        throttle(n), when given, is called after every block copied (reflinks read nothing).
+        """
+        started = time.time()
+        stats = {"files": 0, "copied": 0, "cloned": 0, "removed": 0, "bytes": 0}
+        names = world_dirs(self.profile_path)
+        os.makedirs(self.mirror_root, exist_ok=True)
+        for stale in set(os.listdir(self.mirror_root)) - set(names):
+            shutil.rmtree(os.path.join(self.mirror_root, stale), ignore_errors=True)
+        for name in names:
+            src_root = os.path.join(self.profile_path, name)
+            dst_root = os.path.join(self.mirror_root, name)
+            for root, dirs, files in os.walk(src_root):
+                rel_root = os.path.relpath(root, src_root)
+                mirror_dir = os.path.normpath(os.path.join(dst_root, rel_root))
+                os.makedirs(mirror_dir, exist_ok=True)
+                existing = set(os.listdir(mirror_dir))
+                for filename in files:
+                    if filename.endswith(".lck"):
+                        continue
+                    src = os.path.join(root, filename)
+                    dst = os.path.join(mirror_dir, filename)
+                    existing.discard(filename)
+                    try:
+                        st = os.stat(src)
+                        mst = os.stat(dst) if os.path.exists(dst) else None
+                        stats["files"] += 1
+                        if mst and mst.st_size == st.st_size and mst.st_mtime_ns == st.st_mtime_ns:
+                            continue
+                        stats["cloned" if self._clone_or_copy(src, dst, st, throttle) else "copied"] += 1
+                        stats["bytes"] += st.st_size
+                    except OSError as e:
+                        # Vanished or locked mid-walk; the flush pass picks it up
+                        print(f"[Backup] Snapshot skipped {src}: {e}")
+                for leftover in existing - set(dirs):
+                    path = os.path.join(mirror_dir, leftover)
+                    if os.path.isdir(path):
+                        shutil.rmtree(path, ignore_errors=True)
+                    else:
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            continue
+                    stats["removed"] += 1
+        stats["seconds"] = round(time.time() - started, 3)
+        return stats
+
+    def capture(self, server, flush_timeout=60.0, throttle=None):
+        """
+        Pre-sync, then freeze saving just long enough to flush and sync the delta.
+        throttle only paces the pre-sync; the delta runs flat out to keep the save-off window short.
+        Returns stats; "consistent" is False when the server did not confirm the flush.
+        """
+        started = time.time()
+        stats = {"consistent": False}
+        # Write out most dirty chunks while the game is still saving normally
+        stats["save_all_confirmed"] = server.query("save-all", pattern=SAVED_PATTERN, timeout=flush_timeout) is not None
+        stats["presync"] = self.sync(throttle)
+
+        window_started = time.time()
+        reply = server.query("save-off", pattern=SAVE_OFF_PATTERN, timeout=5.0)
+        # An admin who had saving off keeps it off afterwards
+        was_off = bool(reply and "already" in reply.lower())
+        try:
+            flushed = server.query("save-all flush", pattern=SAVED_PATTERN, timeout=flush_timeout)
+            stats["flush_seconds"] = round(time.time() - window_started, 3)
+            stats["delta"] = self.sync()
+            stats["consistent"] = reply is not None and flushed is not None
+        finally:
+            if not was_off:
+                server.send_command("save-on")
+            stats["window_seconds"] = round(time.time() - window_started, 3)
+        stats["seconds"] = round(time.time() - started, 3)
+        return stats
+
+    def iter_files(self):
+        """(absolute path, path relative to the profile) for every mirrored world file"""
+        for root, _, files in os.walk(self.mirror_root):
+            for filename in files:
+                if filename.endswith(".snap.tmp"):
+                    continue
+                fp = os.path.join(root, filename)
+                yield fp, os.path.relpath(fp, self.mirror_root)
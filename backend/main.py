@@ -31,6 +31,7 @@ from integrations.drive_backup import backup_manager
 from integrations.grief_protection import grief_protection
 from integrations.web_hosting import hosting_manager
 from core.audit_logger import audit_logger
+from core.task_dispatcher import KeyedTaskDispatcher
 from engine.command_catalog import command_catalog
 from engine.ml_command_engine import ml_command_engine
 
@@ -42,6 +43,15 @@ console_subscribers = []
 
 mod_loader = ModLoader(server)
 
+# AI chat runs off the event loop: one ordered queue per player, bounded overall
+_chat_config = ai_engine.mc_ai.gateway.ai_config
+chat_dispatcher = KeyedTaskDispatcher(
+    max_workers=_chat_config.get("chat_workers", 4),
+    max_queue_per_key=_chat_config.get("chat_queue_per_player", 8),
+    max_queue_total=_chat_config.get("chat_queue_limit", 64),
+    name="AI"
+)
+
 @app.get("/")
 def root():
     return {"message": "MCmadeEasy API", "status": "running"}
@@ -51,6 +61,7 @@ app.add_middleware(
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
 
 async def broadcast_console_message(message: str):
@@ -232,6 +243,8 @@ async def edit_server_profile(name: str, request: Request):
     new_name = (body.get("name") or "").strip()
     version = body.get("version")
     ram = body.get("ram")
+    console_buffer_lines = body.get("console_buffer_lines")
+    player_details_refresh = body.get("player_details_refresh")
     
     if not get_profile(name):
         return {"success": False, "message": f"Profile '{name}' not found"}
@@ -264,6 +277,16 @@ async def edit_server_profile(name: str, request: Request):
         update["version"] = version
     if ram:
         update["ram"] = ram
+    if console_buffer_lines:
+        try:
+            update["console_buffer_lines"] = max(100, int(console_buffer_lines))
+        except (TypeError, ValueError):
+            return {"success": False, "message": "console_buffer_lines must be a number"}
+    if player_details_refresh is not None:
+        try:
+            update["player_details_refresh"] = max(0.0, float(player_details_refresh))
+        except (TypeError, ValueError):
+            return {"success": False, "message": "player_details_refresh must be a number"}
     if update:
         update_profile(name, update)
     
@@ -410,17 +433,25 @@ def stop():
     return {"success": success, "message": msg}
 
 @app.get("/activity")
-def get_activity(limit: int = 20, profile: str = None):
-    logs = audit_logger.get_recent(limit, profile)
-    return [
+def get_activity(limit: int = 20, profile: str = None, player: str = None, type: str = None, intent: str = None,
+                 since: float = None, until: float = None, q: str = None, cursor: int = None):
+    # Newest page first; X-Next-Cursor fetches the page of older events
+    logs, next_cursor = audit_logger.query(profile, player, type, intent, since, until, q, cursor, limit)
+    items = [
         {
+            "id": log.get("id"),
             "type": log.get("type", ""),
             "message": log.get("message", ""),
             "datetime": log.get("datetime", ""),
             "player": log.get("player", "")
         }
-        for log in logs
+        for log in reversed(logs)
     ]
+    return JSONResponse(content=items, headers={"X-Next-Cursor": str(next_cursor)} if next_cursor else None)
+
+@app.get("/activity/stats")
+def get_activity_stats():
+    return audit_logger.get_stats()
 
 @app.post("/dynmap/fullrender")
 def trigger_fullrender():
@@ -454,6 +485,12 @@ async def command(request: Request, cmd: str = None):
 def console_history():
     return server.get_output()
 
+@app.get("/console/stats")
+def console_stats():
+    stats = server.console.get_stats()
+    stats["queries"] = server.correlator.get_stats()
+    return stats
+
 @app.get("/server/stats")
 def get_server_stats():
     return server.get_stats()
@@ -718,6 +755,12 @@ async def ai_chat(request: Request, message: str = None, player: str = "Player")
     if server.current_profile:
         server_name = os.path.basename(server.current_profile)
     
+    future = chat_dispatcher.submit(f"player:{player}", _process_chat_request, message, player, server_name)
+    if future is None:
+        return JSONResponse(status_code=503, content={"response": None, "error": "AI is busy, try again shortly"})
+    return await asyncio.wrap_future(future)
+
+def _process_chat_request(message, player, server_name):
     # Deterministic TP path: execute directly even if intent/AI path misses this turn.
     forced_tp_commands = _build_tp_fallback_commands(message)
     if forced_tp_commands:
@@ -742,6 +785,15 @@ async def ai_chat(request: Request, message: str = None, player: str = "Player")
         return {"response": response_text, "command": result.get("command"), "executed": executed}
     return {"response": None}
 
+@app.get("/ai/queue")
+def ai_queue():
+    return chat_dispatcher.get_stats()
+
+@app.post("/ai/intent/cache/clear")
+def ai_intent_cache_clear():
+    ai_engine.mc_ai.intent_engine.ai_cache.clear()
+    return {"status": "cleared"}
+
 @app.post("/ai/toggle")
 def ai_toggle():
     enabled = ai_engine.mc_ai.toggle()
@@ -772,6 +824,9 @@ def ai_ml_status():
     return {
         "samples": len(model.get("samples", [])),
         "intents": len(model.get("by_intent", {})),
+        "max_samples": ml_command_engine.max_samples,
+        "index": ml_command_engine.index.get_stats(),
+        "persistence": ml_command_engine.get_stats(),
         "data_path": ml_command_engine.data_path
     }
 
@@ -796,33 +851,22 @@ def save_config(data: dict):
 async def console_ws(ws: WebSocket):
     await ws.accept()
     console_subscribers.append(ws)
-    
-    # Send current history first
-    initial_lines = server.get_output()
-    if initial_lines:
-        await ws.send_json({"lines": initial_lines, "is_history": True})
-    
-    last_buffer = list(initial_lines)
+    # Cursor on the console bus; the first read replays recent history
+    subscription = server.console.subscribe(f"websocket:{id(ws)}", replay=500)
     
     try:
+        # Send current history first
+        initial_lines = subscription.read()
+        if initial_lines:
+            await ws.send_json({"lines": initial_lines, "is_history": True, "seq": subscription.cursor})
+        
         while True:
             try:
-                current_lines = server.get_output()
-                if current_lines:
-                    # Calculate delta
-                    overlap = 0
-                    max_overlap = min(len(last_buffer), len(current_lines))
-                    for k in range(max_overlap, 0, -1):
-                        if last_buffer[-k:] == current_lines[:k]:
-                            overlap = k
-                            break
-                    
-                    new_lines = current_lines[overlap:]
-                    if new_lines:
-                        await ws.send_json({"lines": new_lines, "is_delta": True})
-                        last_buffer = list(current_lines)
-                
-                await asyncio.sleep(0.5)
+                new_lines = await subscription.next_batch()
+                if new_lines:
+                    await ws.send_json({"lines": new_lines, "is_delta": True, "seq": subscription.cursor})
+                elif subscription.closed:
+                    break
             except RuntimeError as e:
                 if 'close' in str(e).lower():
                     break
@@ -830,97 +874,105 @@ async def console_ws(ws: WebSocket):
     except WebSocketDisconnect:
         pass
     finally:
+        subscription.close()
         if ws in console_subscribers:
             console_subscribers.remove(ws)
 
+def _handle_console_lines(lines):
+    """Autonomous reactions (joins, deaths, advancements) for a batch of console lines"""
+    for line in lines:
+        autonomous_response = ai_engine.mc_ai.process_console_line(line)
+        if autonomous_response:
+            ai_msg = f"[Ava] {autonomous_response}"
+            server.add_output_line(ai_msg)
+            escaped_response = autonomous_response.replace('"', '\\"')
+            command = f'tellraw @a [{{"text":"[{ai_engine.mc_ai.ai_name}] ","color":"light_purple"}},{{"text":"{escaped_response}","color":"white"}}]'
+            server.send_command(command)
+
+def _handle_chat_line(player, message, server_name):
+    result = ai_engine.mc_ai.process_message(message, player, server_name)
+    
+    print(f"[AI] Player: {player}, Mode: {ai_engine.mc_ai.mode}, Enabled: {ai_engine.mc_ai.is_enabled}")
+    if result:
+        print(f"[AI] Intent: {result.get('intent')}, Command: {result.get('command')}, Executed: {result.get('executed')}")
+    
+    if result and result.get("response"):
+        commands_preview = result.get("commands") or ([result.get("command")] if result.get("command") else [])
+        has_locate_token = any(
+            isinstance(c, str) and (c.startswith("LOCATE:") or c.startswith("LOCATE_TP:"))
+            for c in commands_preview
+        )
+        # Avoid duplicate/contradictory chatter for locate; we'll send a clean result after command execution.
+        if has_locate_token:
+            response = None
+        else:
+            response = result["response"]
+            try:
+                response = ai_engine.mc_ai.response_engine.naturalize_for_chat(
+                    response, player, result.get("intent")
+                )
+            except Exception:
+                pass
+        if response and len(response) > 150:
+            response = response[:150] + "..."
+        # Log AI response to console
+        if response:
+            ai_msg = f"[Ava -> {player}] {response}"
+            server.add_output_line(ai_msg)
+            escaped_response = response.replace('"', '\\"')
+            command = f'tellraw {player} [{{"text":"[{ai_engine.mc_ai.ai_name}] ","color":"light_purple"}},{{"text":"{escaped_response}","color":"white"}}]'
+            server.send_command(command)
+    
+    if result:
+        commands_to_run = result.get("commands") or ([result.get("command")] if result.get("command") else [])
+        if not commands_to_run:
+            commands_to_run = _build_tp_fallback_commands(message)
+        for cmd in commands_to_run:
+            print(f"[AI] Executing command: {cmd}")
+        _execute_ai_commands(commands_to_run, player)
+
 async def broadcast_console():
-    previous_lines = []
+    subscription = server.console.subscribe("ai_dispatcher")
     while True:
         try:
-            lines = server.get_output()
-            if lines:
-                # Process true delta between snapshots so repeated identical lines
-                # (e.g. same chat command twice) are not dropped.
-                overlap = 0
-                max_overlap = min(len(previous_lines), len(lines))
-                for k in range(max_overlap, -1, -1):
-                    if previous_lines[-k:] == lines[:k]:
-                        overlap = k
-                        break
-                new_lines = lines[overlap:]
-                previous_lines = list(lines)
-
-                for new_line in new_lines:
-                    if not new_line:
-                        continue
-                    
-                    # Get server name for server-specific AI
-                    server_name = None
-                    if server.current_profile:
-                        server_name = os.path.basename(server.current_profile)
-                    
-                    autonomous_response = ai_engine.mc_ai.process_console_line(new_line)
-                    if autonomous_response:
-                        ai_msg = f"[Ava] {autonomous_response}"
-                        server.add_output_line(ai_msg)
-                        escaped_response = autonomous_response.replace('"', '\\"')
-                        command = f'tellraw @a [{{"text":"[{ai_engine.mc_ai.ai_name}] ","color":"light_purple"}},{{"text":"{escaped_response}","color":"white"}}]'
-                        server.send_command(command)
-                    
-                    chat_match = re.search(r'(?:\[.*?\]\s*)?<([^>]+)> (.+)', new_line)
-                    if chat_match:
-                        player = chat_match.group(1)
-                        message = chat_match.group(2).strip()
-                        
-                        result = ai_engine.mc_ai.process_message(message, player, server_name)
-                        
-                        print(f"[AI] Player: {player}, Mode: {ai_engine.mc_ai.mode}, Enabled: {ai_engine.mc_ai.is_enabled}")
-                        if result:
-                            print(f"[AI] Intent: {result.get('intent')}, Command: {result.get('command')}, Executed: {result.get('executed')}")
-                        
-                        if result and result.get("response"):
-                            commands_preview = result.get("commands") or ([result.get("command")] if result.get("command") else [])
-                            has_locate_token = any(
-                                isinstance(c, str) and (c.startswith("LOCATE:") or c.startswith("LOCATE_TP:"))
-                                for c in commands_preview
-                            )
-                            # Avoid duplicate/contradictory chatter for locate; we'll send a clean result after command execution.
-                            if has_locate_token:
-                                response = None
-                            else:
-                                response = result["response"]
-                                try:
-                                    response = ai_engine.mc_ai.response_engine.naturalize_for_chat(
-                                        response, player, result.get("intent")
-                                    )
-                                except Exception:
-                                    pass
-                            if response and len(response) > 150:
-                                response = response[:150] + "..."
-                            # Log AI response to console
-                            if response:
-                                ai_msg = f"[Ava -> {player}] {response}"
-                                server.add_output_line(ai_msg)
-                                escaped_response = response.replace('"', '\\"')
-                                command = f'tellraw {player} [{{"text":"[{ai_engine.mc_ai.ai_name}] ","color":"light_purple"}},{{"text":"{escaped_response}","color":"white"}}]'
-                                server.send_command(command)
-                        
-                        if result:
-                            commands_to_run = result.get("commands") or ([result.get("command")] if result.get("command") else [])
-                            if not commands_to_run:
-                                commands_to_run = _build_tp_fallback_commands(message)
-                            for cmd in commands_to_run:
-                                print(f"[AI] Executing command: {cmd}")
-                            _execute_ai_commands(commands_to_run, player)
-            await asyncio.sleep(0.5)
+            # Woken by the console bus as soon as the reader thread publishes lines.
+            # AI work is handed to the chat dispatcher so this loop never waits on a model.
+            new_lines = await subscription.next_batch()
+            new_lines = [line for line in new_lines if line]
+            if not new_lines:
+                continue
+            
+            # Get server name for server-specific AI
+            server_name = None
+            if server.current_profile:
+                server_name = os.path.basename(server.current_profile)
+            
+            if chat_dispatcher.submit("__console__", _handle_console_lines, new_lines) is None:
+                print(f"[AI] Queue full, skipped {len(new_lines)} console lines")
+            
+            for new_line in new_lines:
+                chat_match = re.search(r'(?:\[.*?\]\s*)?<([^>]+)> (.+)', new_line)
+                if chat_match:
+                    player = chat_match.group(1)
+                    message = chat_match.group(2).strip()
+                    # One queue per player keeps their messages in order; players don't wait on each other
+                    if chat_dispatcher.submit(f"player:{player}", _handle_chat_line, player, message, server_name) is None:
+                        print(f"[AI] Queue full, dropped message from {player}: {message}")
         except Exception:
             await asyncio.sleep(0.5)
 
 @app.on_event("startup")
 async def startup():
+    backup_manager.attach_server(server)
     backup_manager.start_scheduler(lambda: os.path.basename(server.current_profile) if server.current_profile else None)
     asyncio.create_task(broadcast_console())
 
+@app.on_event("shutdown")
+def shutdown():
+    ai_engine.mc_ai.intent_engine.ai_cache.save(force=True)
+    audit_logger.close()
+    ml_command_engine.close()
+
 @app.get("/mods/search")
 def search_mods(query: str):
     results = mod_loader.get_modrinth_search(query)
@@ -966,8 +1018,17 @@ def create_backup(profile: str):
     return backup_manager.create_backup(profile, backup_type="full_server", providers=["google_drive"], source="legacy")
 
 @app.get("/backup/list")
-def list_backups(profile: str = None):
-    return backup_manager.list_backups(profile)
+def list_backups(profile: str = None, backup_type: str = None, source: str = None, mode: str = None,
+                 since: int = None, until: int = None, limit: int = 500, offset: int = 0):
+    return backup_manager.list_backups(profile, backup_type, source, mode, since, until, limit, offset)
+
+@app.get("/backup/catalog/versions")
+def backup_file_versions(profile: str, path: str):
+    return backup_manager.get_file_versions(profile, path)
+
+@app.get("/backup/catalog/search")
+def backup_catalog_search(profile: str, path: str, version: str = None, limit: int = 100, offset: int = 0):
+    return backup_manager.find_backups_with(profile, path, version, limit, offset)
 
 @app.post("/backup/create")
 async def create_backup_advanced(request: Request):
@@ -979,17 +1040,39 @@ async def create_backup_advanced(request: Request):
     backup_name = data.get("backup_name")
     backup_type = data.get("backup_type", "full_server")
     providers = data.get("providers", ["google_drive"])
-    return backup_manager.create_backup(
+    # Joins the backup thread, snapshot flush included; keep the event loop serving consoles
+    return await asyncio.to_thread(
+        backup_manager.create_backup,
         profile=profile,
         backup_name=backup_name,
         backup_type=backup_type,
         providers=providers,
-        source="manual"
+        source="manual",
+        mode=data.get("mode")
     )
 
+@app.post("/backup/uploads/resume")
+def resume_backup_uploads():
+    return backup_manager.resume_uploads()
+
+@app.get("/backup/store/stats")
+def backup_store_stats(profile: str = None):
+    return backup_manager.get_store_stats(profile)
+
 @app.post("/backup/restore")
-def restore_backup(request: Request):
-    return {"success": True, "message": "Restore functionality requires Google Drive integration"}
+async def restore_backup(request: Request):
+    try:
+        data = await request.json()
+    except Exception:
+        data = {}
+    # Extraction and verification take minutes on big worlds; keep the event loop serving consoles
+    return await asyncio.to_thread(
+        backup_manager.restore_backup,
+        data.get("profile"),
+        data.get("backup_id") or data.get("backup_name"),
+        scope=data.get("scope"),
+        keep_undo=bool(data.get("keep_undo", True))
+    )
 
 @app.get("/backup/settings")
 def get_backup_settings(profile: str):
@@ -5,22 +5,46 @@ import time
 import re
 import socket
 import json
+from collections.abc import Sequence
+
+from core.console_bus import ConsoleBus
+from core.console_correlator import ConsoleCorrelator
+from world import snbt
 
 JAVA_PATH = r"C:\Users\hrupe\AppData\Local\Programs\Eclipse Adoptium\jdk-17.0.17.10-hotspot\bin\java.exe"
 
+# Console lines kept in memory unless the profile sets "console_buffer_lines"
+DEFAULT_CONSOLE_BUFFER_LINES = 2000
+# Seconds a /players/details snapshot is reused unless the profile sets "player_details_refresh"
+DEFAULT_PLAYER_DETAILS_REFRESH = 5
+
 class ServerManager:
     def __init__(self):
         self.process = None
         self.current_profile = self._load_saved_profile()
         self.current_ram = None
-        self.output_lines = []
+        # Sequence-numbered ring buffer that pushes new console lines to consumers
+        self.console = ConsoleBus(capacity=DEFAULT_CONSOLE_BUFFER_LINES)
         self._reading = False
         self._reader_thread = None
         # Cache for player list to prevent spam
         self._players_cache = []
         self._players_cache_time = 0
         self._players_cache_ttl = 5  # Cache for 5 seconds
-        self._query_lock = threading.Lock()
+        # Matches command responses as the reader thread sees them
+        self.correlator = ConsoleCorrelator()
+        # Keeps matcher registration order identical to command send order
+        self._send_lock = threading.Lock()
+        # AI workers, the API and queries all write to stdin; keep commands whole
+        self._stdin_lock = threading.Lock()
+        # Cached snapshot for get_players_details
+        self._details_cache = None
+        self._details_cache_time = 0
+        self._details_refresh_interval = DEFAULT_PLAYER_DETAILS_REFRESH
+        self._details_lock = threading.Lock()
+        # Entity queries in flight, {"name", "path", "query"}; failure replies name no player, see _entity_rivals
+        self._entity_queries = []
+        self._entity_lock = threading.Lock()
     
     def _load_saved_profile(self):
         """Load the saved profile path from file"""
@@ -35,6 +59,17 @@ class ServerManager:
             pass
         return None
 
+    def _load_profile_settings(self, profile_path):
+        """Read optional tuning keys from the profile's profile.json"""
+        try:
+            config_path = os.path.join(profile_path, "profile.json")
+            if os.path.exists(config_path):
+                with open(config_path, "r") as f:
+                    return json.load(f)
+        except:
+            pass
+        return {}
+
     def is_running(self):
         return self.process is not None and self.process.poll() is None
 
@@ -124,6 +159,17 @@ class ServerManager:
 
         self.current_profile = profile_path
         self.current_ram = ram
+
+        settings = self._load_profile_settings(profile_path)
+        try:
+            buffer_lines = int(settings.get("console_buffer_lines") or DEFAULT_CONSOLE_BUFFER_LINES)
+        except (TypeError, ValueError):
+            buffer_lines = DEFAULT_CONSOLE_BUFFER_LINES
+        self.console.resize(buffer_lines)
+        try:
+            self._details_refresh_interval = float(settings.get("player_details_refresh", DEFAULT_PLAYER_DETAILS_REFRESH))
+        except (TypeError, ValueError):
+            self._details_refresh_interval = DEFAULT_PLAYER_DETAILS_REFRESH
         
         # Save current profile to file so we can read it when server is offline
         data_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
@@ -148,9 +194,8 @@ class ServerManager:
                     clean_line = re.sub(r'\x1b\[[0-9;]*[a-zA-Z]', '', line.strip())
                     clean_line = re.sub(r'\x1b\]\d+;[^\x07]*\x07', '', clean_line)  # OSC sequences
                     clean_line = re.sub(r'\x1b\[?[\d;]*[JKmsu]', '', clean_line)  # Other CSI sequences
-                    self.output_lines.append(clean_line)
-                    if len(self.output_lines) > 2000:
-                        self.output_lines = self.output_lines[-1000:]
+                    self.console.publish(clean_line)
+                    self.correlator.feed(clean_line)
             except Exception:
                 break
 
@@ -167,16 +212,19 @@ class ServerManager:
 
         self.process = None
         self._reading = False
+        self.correlator.cancel_all()
         # Clear player cache
         self._players_cache = []
         self._players_cache_time = 0
+        self._details_cache = None
+        self._details_cache_time = 0
         # Clear console output
-        self.output_lines = []
+        self.console.clear()
         return True, "Server stopped"
 
     def clear_output(self):
         """Clear console output history"""
-        self.output_lines = []
+        self.console.clear()
 
     def send_command(self, cmd):
         if not self.is_running():
@@ -185,20 +233,41 @@ class ServerManager:
         try:
             # Strip leading slash for console commands (Paper expects no leading /)
             cmd_to_send = cmd.lstrip('/')
-            self.process.stdin.write(cmd_to_send + "\n")
-            self.process.stdin.flush()
+            with self._stdin_lock:
+                self.process.stdin.write(cmd_to_send + "\n")
+                self.process.stdin.flush()
             return True, "Command sent"
         except Exception as e:
             return False, str(e)
 
+    def submit_query(self, command, pattern=None, predicate=None, name=None):
+        """
+        Register a response matcher and then send the command.
+        Returns a PendingQuery whose future resolves with the matching line (None if offline).
+        """
+        if not self.is_running():
+            return None
+        with self._send_lock:
+            query = self.correlator.expect(pattern, predicate, name or command)
+            success, _ = self.send_command(command)
+        if not success:
+            self.correlator.cancel(query)
+            return None
+        return query
+
+    def query(self, command, pattern=None, predicate=None, timeout=1.0):
+        """Send a command and wait for the first matching response line"""
+        return self.correlator.wait(self.submit_query(command, pattern, predicate), timeout)
+
+    async def query_async(self, command, pattern=None, predicate=None, timeout=1.0):
+        return await self.correlator.wait_async(self.submit_query(command, pattern, predicate), timeout)
+
     def get_output(self):
-        return self.output_lines[-500:]
+        return self.console.tail(500)
     
     def add_output_line(self, line):
         """Add a custom line to output (for AI responses)"""
-        self.output_lines.append(line.strip())
-        if len(self.output_lines) > 2000:
-            self.output_lines = self.output_lines[-1000:]
+        self.console.publish(line.strip())
 
     def get_status(self):
         if self.is_running():
@@ -209,116 +278,176 @@ class ServerManager:
         """Get player coordinates"""
         if not self.is_running():
             return None
-        self.send_command(f"execute at {player_name} run data get entity {player_name} Pos")
-        time.sleep(0.5)
-        # Get from recent output
-        for line in reversed(self.output_lines[-20:]):
-            if player_name in line and "Pos" in line:
-                return line
-        return None
+        query = self._submit_entity_query(
+            player_name, "Pos", command=f"execute at {player_name} run data get entity {player_name} Pos"
+        )
+        return self.correlator.wait(query, 2.0)
+
+    def _entity_response_predicate(self, player_name, path=None, entry=None):
+        # "<name> has the following entity data: ..."; the name as a whole word, so Bob's query skips Bobby's reply
+        reply = re.compile(rf"(?<![A-Za-z0-9_]){re.escape(player_name)} has the following entity data", re.IGNORECASE)
+        missing = f"found no elements matching {path}".lower() if path else None
+
+        def predicate(line, match=None):
+            if reply.search(line):
+                return True
+            # Failure feedback resolves the query early instead of waiting out the timeout,
+            # but it names no player: only when no other query in flight could be the one it answers
+            low = line.lower()
+            if missing is not None and missing in low:
+                return not self._entity_rivals(entry, path)
+            if "no entity was found" in low:
+                return not self._entity_rivals(entry)
+            return False
+        return predicate
+
+    def _entity_rivals(self, entry, path=None):
+        """Whether a query about another player (for path, or any path) is still waiting for its reply"""
+        with self._entity_lock:
+            self._entity_queries = [
+                e for e in self._entity_queries if e["query"] is None or not e["query"].future.done()
+            ]
+            return any(
+                e["name"] != entry["name"] and (path is None or e["path"] == path) for e in self._entity_queries
+            )
+
+    def _submit_entity_query(self, player_name, path=None, command=None):
+        if command is None:
+            command = f"data get entity {player_name} {path}" if path else f"data get entity {player_name}"
+        # Registered before sending, so a reply racing the registration still sees this query as a rival
+        entry = {"name": player_name.lower(), "path": path, "query": None}
+        with self._entity_lock:
+            self._entity_queries.append(entry)
+        query = self.submit_query(command, predicate=self._entity_response_predicate(player_name, path, entry))
+        with self._entity_lock:
+            if query is None:
+                self._entity_queries.remove(entry)
+            else:
+                entry["query"] = query
+        return query
+
+    def _await_entity_query(self, query, timeout=1.0):
+        line = self.correlator.wait(query, timeout)
+        if not line or "entity data" not in line.lower():
+            return None
+        return re.sub(r'\x1b\[[0-9;]*m', '', line)
 
     def _query_entity_data(self, player_name, path, timeout=1.0):
         if not self.is_running():
             return None
-        
-        with self._query_lock:
-            # Send the command and wait a bit
-            start_idx = len(self.output_lines)
-            self.send_command(f"data get entity {player_name} {path}")
-            
-            deadline = time.time() + timeout
-            checked_idx = start_idx
-            while time.time() < deadline:
-                time.sleep(0.05)
-                new_lines = self.output_lines[checked_idx:]
-                if new_lines:
-                    for line in new_lines:
-                        clean_line = re.sub(r'\x1b\[[0-9;]*m', '', line)
-                        low = clean_line.lower()
-                        if player_name.lower() in low and 'entity data' in low:
-                            return clean_line
-                        if player_name.lower() in low and path.lower() in low:
-                            return clean_line
-                    checked_idx = len(self.output_lines)
-            
-            # Fallback: search forward from start_idx for the first matching entity data line
-            for line in self.output_lines[start_idx:]:
-                clean_line = re.sub(r'\x1b\[[0-9;]*m', '', line)
-                low = clean_line.lower()
-                if player_name.lower() in low and 'entity data' in low:
-                    return clean_line
-            
-            return None
+        return self._await_entity_query(self._submit_entity_query(player_name, path), timeout)
+
+    def _query_entity_fields(self, player_name, paths, timeout=1.0):
+        """Send several entity queries at once and collect {path: line} as responses arrive"""
+        if not self.is_running():
+            return {}
+        pending = [(path, self._submit_entity_query(player_name, path)) for path in paths]
+        deadline = time.time() + timeout
+        results = {}
+        for path, query in pending:
+            results[path] = self._await_entity_query(query, max(0.0, deadline - time.time()))
+        return results
+
+    def _fetch_player_snapshots(self, player_names, timeout=2.0):
+        """
+        Fetch each player's full entity NBT with a single `data get entity <name>`.
+        All players are queried at once; returns {name: decoded compound} (None if no reply).
+        """
+        if not self.is_running():
+            return {}
+        pending = [(name, self._submit_entity_query(name)) for name in player_names]
+        deadline = time.time() + timeout
+        snapshots = {}
+        for name, query in pending:
+            line = self._await_entity_query(query, max(0.0, deadline - time.time()))
+            data = self._parse_entity_data(line)
+            snapshots[name] = data if isinstance(data, dict) and data else None
+        return snapshots
+
+    def _fetch_player_fields(self, player_name, paths, timeout=1.0):
+        """Per-field fallback for servers where the full entity dump is unavailable"""
+        lines = self._query_entity_fields(player_name, paths, timeout)
+        fields = {}
+        for path, line in lines.items():
+            value = self._parse_entity_data(line)
+            if value is not None:
+                fields[path] = value
+        return fields
+
+    def _summarize_player(self, player_name, fields):
+        gamemode = fields.get("playerGameType")
+        if gamemode is None:
+            gamemode = fields.get("gameType", fields.get("PlayerGameType"))
+        return {
+            "name": player_name,
+            "coords": self._parse_pos(fields.get("Pos")),
+            "gamemode": self._parse_gamemode(gamemode),
+            "health": self._parse_nbt_number(fields.get("Health"), float),
+            "hunger": self._parse_nbt_number(fields.get("foodLevel"), int),
+            "xp_level": self._parse_nbt_number(fields.get("xpLevel"), int)
+        }
 
     def _parse_entity_data(self, line):
-        if not line:
-            return None
-        match = re.search(r"entity data:\s*(.*)$", line)
-        if not match:
-            return None
-        return match.group(1).strip()
+        """Decode the SNBT payload of a `data get entity` reply"""
+        return snbt.parse_entity_data(line)
 
     def _parse_pos(self, data):
-        if not data:
+        if not data or len(data) != 3:
             return None
-        match = re.search(r"\[([^\]]+)\]", data)
-        if not match:
+        try:
+            return {"x": float(data[0]), "y": float(data[1]), "z": float(data[2])}
+        except Exception:
             return None
-        parts = [p.strip().rstrip('dD') for p in match.group(1).split(",")]
-        if len(parts) != 3:
+
+    def _parse_nbt_number(self, data, cast=float):
+        if data is None or isinstance(data, (dict, str, Sequence)):
             return None
         try:
-            return {"x": float(parts[0]), "y": float(parts[1]), "z": float(parts[2])}
+            return cast(data)
         except Exception:
             return None
 
     def _parse_gamemode(self, data):
-        if not data:
-            return None
-        match = re.search(r"(-?\d+)", data)
-        if not match:
+        val = self._parse_nbt_number(data, int)
+        if val is None:
             return None
+        return {0: "survival", 1: "creative", 2: "adventure", 3: "spectator"}.get(val, "unknown")
+
+    def _parse_item(self, compound):
+        """Item compound -> (name, count). Handles both Count (pre-1.20.5) and count."""
+        if not isinstance(compound, dict) or not isinstance(compound.get("id"), str):
+            return None, 0
+        name = compound["id"].replace("minecraft:", "")
+        count = compound.get("Count", compound.get("count", 1))
         try:
-            val = int(match.group(1))
+            count = int(count)
         except Exception:
-            return None
-        return {0: "survival", 1: "creative", 2: "adventure", 3: "spectator"}.get(val, "unknown")
+            count = 1
+        return name, count
 
     def _parse_inventory(self, data):
-        if not data:
+        if not data or isinstance(data, (dict, str)):
             return []
         items = []
+        unslotted = {}
 
-        for chunk in self._split_nbt_list(data):
-            slot_match = re.search(r"Slot:\s*(-?\d+)b?", chunk)
-            id_match = re.search(r'id:\s*"([^"]+)"', chunk)
-            count_match = re.search(r"Count:\s*(\d+)b?", chunk)
-            if id_match and count_match and slot_match:
-                name = id_match.group(1).replace("minecraft:", "")
-                items.append({
-                    "slot": int(slot_match.group(1)),
-                    "item": name,
-                    "count": int(count_match.group(1))
-                })
+        for compound in data:
+            name, count = self._parse_item(compound)
+            if not name:
+                continue
+            slot = compound.get("Slot")
+            if isinstance(slot, int):
+                items.append({"slot": slot, "item": name, "count": count})
+            else:
+                unslotted[name] = unslotted.get(name, 0) + count
 
         if items:
             return items
 
         # Fallback: Simple id/count pairs without slot info
-        pattern2 = r'id:\s*"([^"]+)",\s*Count:\s*(\d+)b?'
-        matches = re.findall(pattern2, data)
-        if matches:
-            counts = {}
-            for item_id, count in matches:
-                name = item_id.replace("minecraft:", "")
-                counts[name] = counts.get(name, 0) + int(count)
-            slot = 0
-            for k, v in counts.items():
-                items.append({"slot": slot, "item": k, "count": v})
-                slot += 1
-            return items
-
-        return []
+        for slot, (name, count) in enumerate(unslotted.items()):
+            items.append({"slot": slot, "item": name, "count": count})
+        return items
 
     def _parse_inventory_full(self, data):
         """Parse full inventory with slot information - uses _parse_inventory"""
@@ -328,120 +457,41 @@ class ServerManager:
 
     def _parse_item_list(self, data):
         """Parse a list of item compounds without Slot fields (e.g., ArmorItems/Offhand)."""
-        if not data:
+        if not data or isinstance(data, (dict, str)):
             return []
         items = []
-        for chunk in self._split_nbt_list(data):
-            id_match = re.search(r'id:\s*"([^"]+)"', chunk)
-            count_match = re.search(r"Count:\s*(\d+)b?", chunk)
-            if not id_match:
+        for compound in data:
+            name, count = self._parse_item(compound)
+            if not name:
                 items.append(None)
                 continue
-            name = id_match.group(1).replace("minecraft:", "")
-            count = int(count_match.group(1)) if count_match else 1
             items.append({"item": name, "count": count})
         return items
 
-    def _split_nbt_list(self, data):
-        """Split a top-level NBT list into item chunks without being confused by nested braces."""
-        if not data:
-            return []
-        start = data.find('[')
-        end = data.rfind(']')
-        if start == -1 or end == -1 or end <= start:
-            return [data]
-        inner = data[start + 1:end]
-        chunks = []
-        buf = []
-        depth = 0
-        i = 0
-        while i < len(inner):
-            ch = inner[i]
-            if ch == '{':
-                depth += 1
-            elif ch == '}':
-                depth = max(0, depth - 1)
-            if ch == ',' and depth == 0:
-                chunk = ''.join(buf).strip()
-                if chunk:
-                    chunks.append(chunk)
-                buf = []
-                i += 1
-                continue
-            buf.append(ch)
-            i += 1
-        tail = ''.join(buf).strip()
-        if tail:
-            chunks.append(tail)
-        return chunks
-
     def get_player_details(self, player_name):
         if not self.is_running():
             return None
-        pos_line = self._query_entity_data(player_name, "Pos")
-        gm_line = (
-            self._query_entity_data(player_name, "playerGameType")
-            or self._query_entity_data(player_name, "gameType")
-            or self._query_entity_data(player_name, "PlayerGameType")
-        )
-        inv_line = self._query_entity_data(player_name, "Inventory")
-        armor_line = self._query_entity_data(player_name, "ArmorItems")
-        hand_line = (
-            self._query_entity_data(player_name, "HandItems")
-            or self._query_entity_data(player_name, "HandItem")
-        )
-        offhand_line = (
-            self._query_entity_data(player_name, "Offhand")
-            or self._query_entity_data(player_name, "OffhandItems")
-            or self._query_entity_data(player_name, "OffHand")
-        )
-        
-        # Get additional stats
-        health_line = self._query_entity_data(player_name, "Health", timeout=0.6)
-        food_line = self._query_entity_data(player_name, "foodLevel", timeout=0.6)
-        xp_line = self._query_entity_data(player_name, "xpLevel", timeout=0.6)
-        xp_total_line = self._query_entity_data(player_name, "totalExperience", timeout=0.6)
-
-        pos = self._parse_pos(self._parse_entity_data(pos_line))
-        gamemode = self._parse_gamemode(self._parse_entity_data(gm_line))
-        inventory = self._parse_inventory_full(self._parse_entity_data(inv_line))
+        fields = self._fetch_player_snapshots([player_name]).get(player_name)
+        if fields is None:
+            # All fields are in flight at once; alternate gamemode keys cover older versions
+            fields = self._fetch_player_fields(
+                player_name,
+                ["Pos", "playerGameType", "gameType", "PlayerGameType", "Inventory", "Health", "foodLevel", "xpLevel"],
+                timeout=1.5
+            )
+
+        summary = self._summarize_player(player_name, fields)
+        inventory = self._parse_inventory_full(fields.get("Inventory"))
 
         # Some versions store offhand in slot -106 inside Inventory
         for item in inventory:
             if item.get("slot") == -106:
                 inventory.append({"slot": 40, "item": item.get("item"), "count": item.get("count", 1)})
                 break
-        
-        # Parse health
-        health = None
-        if health_line:
-            health_match = re.search(r"(\d+\.?\d*)f?", self._parse_entity_data(health_line) or "")
-            if health_match:
-                health = float(health_match.group(1))
-        
-        # Parse food/hunger
-        hunger = None
-        if food_line:
-            hunger_match = re.search(r"(\d+)", self._parse_entity_data(food_line) or "")
-            if hunger_match:
-                hunger = int(hunger_match.group(1))
-        
-        # Parse XP level
-        xp_level = None
-        if xp_line:
-            xp_match = re.search(r"(\d+)", self._parse_entity_data(xp_line) or "")
-            if xp_match:
-                xp_level = int(xp_match.group(1))
 
-        return {
-            "name": player_name,
-            "coords": pos,
-            "gamemode": gamemode or "unknown",
-            "inventory": inventory,
-            "health": health,
-            "hunger": hunger,
-            "xp_level": xp_level
-        }
+        summary["gamemode"] = summary["gamemode"] or "unknown"
+        summary["inventory"] = inventory
+        return summary
 
     def get_player_inventory_fast(self, player_name):
         """Fast inventory fetch: only query Inventory and map offhand slot -106."""
@@ -464,64 +514,38 @@ class ServerManager:
         }
 
     def get_players_details(self, limit: int = 0):
-        """Get details for currently online players with basic stats"""
+        """Get details for currently online players with basic stats, served from a cached snapshot"""
+        with self._details_lock:
+            now = time.time()
+            if self._details_cache is None or now - self._details_cache_time >= self._details_refresh_interval:
+                self._details_cache = self._build_players_snapshot()
+                self._details_cache_time = time.time()
+            details = self._details_cache
+        if limit and limit > 0:
+            return details[:limit]
+        return list(details)
+
+    def _build_players_snapshot(self):
         stats = self.get_stats()
         players = stats.get("players", [])
         
         # Ensure players is always a list
         if not isinstance(players, list):
             players = []
+        names = [name for name in players if isinstance(name, str)]
         
+        snapshots = self._fetch_player_snapshots(names)
         details = []
-        max_players = len(players) if not limit or limit <= 0 else min(limit, len(players))
-        for name in players[:max_players]:
-            if not isinstance(name, str):
-                continue
+        for name in names:
             try:
-                pos_line = self._query_entity_data(name, "Pos")
-                gm_line = self._query_entity_data(name, "playerGameType")
-                if not gm_line:
-                    gm_line = self._query_entity_data(name, "gameType")
-                health_line = self._query_entity_data(name, "Health")
-                food_line = self._query_entity_data(name, "foodLevel")
-                xp_line = self._query_entity_data(name, "xpLevel")
-                
-                pos = self._parse_pos(self._parse_entity_data(pos_line))
-                gm_data = self._parse_entity_data(gm_line) if gm_line else ""
-                gamemode = self._parse_gamemode(gm_data)
-                
-                # Parse health
-                health = None
-                if health_line:
-                    health_data = self._parse_entity_data(health_line) or ""
-                    health_match = re.search(r"(\d+\.?\d*)f?", health_data)
-                    if health_match:
-                        health = float(health_match.group(1))
-                
-                # Parse food/hunger
-                hunger = None
-                if food_line:
-                    food_data = self._parse_entity_data(food_line) or ""
-                    hunger_match = re.search(r"(\d+)", food_data)
-                    if hunger_match:
-                        hunger = int(hunger_match.group(1))
-                
-                # Parse XP level
-                xp_level = None
-                if xp_line:
-                    xp_data = self._parse_entity_data(xp_line) or ""
-                    xp_match = re.search(r"(\d+)", xp_data)
-                    if xp_match:
-                        xp_level = int(xp_match.group(1))
-                
-                details.append({
-                    "name": name,
-                    "coords": pos,
-                    "gamemode": gamemode or "survival",
-                    "health": health,
-                    "hunger": hunger,
-                    "xp_level": xp_level
-                })
+                fields = snapshots.get(name)
+                if fields is None:
+                    fields = self._fetch_player_fields(
+                        name, ["Pos", "playerGameType", "gameType", "Health", "foodLevel", "xpLevel"]
+                    )
+                summary = self._summarize_player(name, fields)
+                summary["gamemode"] = summary["gamemode"] or "survival"
+                details.append(summary)
             except Exception as e:
                 # If anything fails, just add the player name
                 details.append({"name": name})
@@ -532,12 +556,11 @@ class ServerManager:
         """Get nearby entities"""
         if not self.is_running():
             return None
-        self.send_command(f"execute at {player_name} run testfor @e[distance=..{distance}]")
-        time.sleep(0.5)
-        for line in reversed(self.output_lines[-20:]):
-            if "entities" in line.lower() or "@e" in line:
-                return line
-        return None
+        return self.query(
+            f"execute at {player_name} run testfor @e[distance=..{distance}]",
+            predicate=lambda line, match: "entities" in line.lower() or "@e" in line,
+            timeout=2.0
+        )
     
     def locate_structure(self, player_name, structure_type):
         """Locate nearest structure"""
@@ -577,38 +600,30 @@ class ServerManager:
         elif requested_lower in ["fortress", "minecraft:fortress", "bastion", "minecraft:bastion"]:
             dimension = "minecraft:the_nether"
 
+        def _is_locate_response(line, match=None):
+            low = line.lower()
+            if "[ava" in low or "ava ->" in low:
+                return False
+            if "entity data" in low or "found no elements matching" in low:
+                return False
+            if "located" in low or "nearest minecraft:" in low:
+                return True
+            if (
+                "could not" in low
+                or "unable" in low
+                or "no structures" in low
+                or "no such" in low
+                or "no entity was found" in low
+                or "incorrect argument for command" in low
+                or "unknown or incomplete command" in low
+            ):
+                return True
+            if requested_lower and requested_lower in low and (" at " in low or "(" in low):
+                return True
+            return False
+
         def _run_and_wait(command, timeout=8.0):
-            start_idx = len(self.output_lines)
-            self.send_command(command)
-            deadline = time.time() + timeout
-            checked_idx = start_idx
-            while time.time() < deadline:
-                time.sleep(0.15)
-                new_lines = self.output_lines[checked_idx:]
-                if not new_lines:
-                    continue
-                checked_idx = len(self.output_lines)
-                for line in new_lines:
-                    low = line.lower()
-                    if "[ava" in low or "ava ->" in low:
-                        continue
-                    if "entity data" in low or "found no elements matching" in low:
-                        continue
-                    if "located" in low or "nearest minecraft:" in low:
-                        return line
-                    if (
-                        "could not" in low
-                        or "unable" in low
-                        or "no structures" in low
-                        or "no such" in low
-                        or "no entity was found" in low
-                        or "incorrect argument for command" in low
-                        or "unknown or incomplete command" in low
-                    ):
-                        return line
-                    if requested_lower and requested_lower in low and (" at " in low or "(" in low):
-                        return line
-            return None
+            return self.query(command, predicate=_is_locate_response, timeout=timeout)
 
         for candidate in candidates:
             # Primary: anchor search around player's current position.
@@ -729,7 +744,7 @@ class ServerManager:
     def _parse_players_from_console(self):
         """Parse player list from console output"""
         players = []
-        for line in self.output_lines[-50:]:
+        for line in self.console.tail(50):
             if "joined the game" in line.lower():
                 name = line.split("joined")[0].split("]")[-1].strip()
                 name = re.sub(r'\x1b\[[0-9;]*m', '', name)
@@ -0,0 +1,248 @@
+import re
+from collections.abc import Sequence
+
+# Lists whose raw text is longer than this are kept undecoded until first access
+LAZY_THRESHOLD = 4096
+
+_UNQUOTED = re.compile(r"[A-Za-z0-9._+\-]+")
+_INT = re.compile(r"[-+]?\d+[bBsSlLiI]?$")
+_FLOAT = re.compile(r"[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?[fFdD]?$")
+_STRUCTURAL = re.compile(r"[\"'\[\]{}]")
+_ENTITY_DATA = re.compile(r"entity data:\s*", re.IGNORECASE)
+_WHITESPACE = " \t\r\n"
+
+
+class SnbtError(ValueError):
+    pass
+
+
+class LazyList(Sequence):
+    """A list parsed from SNBT whose elements are only decoded when first accessed"""
+
+    __slots__ = ("raw", "_items", "_threshold")
+
+    def __init__(self, raw, threshold=LAZY_THRESHOLD):
+        self.raw = raw
+        self._items = None
+        self._threshold = threshold
+
+    @property
+    def decoded(self):
+        return self._items is not None
+
+    def _decode(self):
+        if self._items is None:
+            self._items = _Parser(self.raw, self._threshold).list_eager()
+        return self._items
+
+    def __getitem__(self, index):
+        return self._decode()[index]
+
+    def __len__(self):
+        return len(self._decode())
+
+    def __iter__(self):
+        return iter(self._decode())
+
+    def __eq__(self, other):
+        if isinstance(other, (list, LazyList)):
+            return list(self) == list(other)
+        return NotImplemented
+
+    def __repr__(self):
+        if self._items is None:
+            return f"LazyList(<{len(self.raw)} chars undecoded>)"
+        return f"LazyList({self._items!r})"
+
+
+class _Parser:
+    def __init__(self, text, lazy_threshold=LAZY_THRESHOLD):
+        self.text = text
+        self.pos = 0
+        self.lazy_threshold = lazy_threshold
+
+    def _skip_ws(self):
+        text = self.text
+        pos = self.pos
+        end = len(text)
+        while pos < end and text[pos] in _WHITESPACE:
+            pos += 1
+        self.pos = pos
+
+    def _peek(self):
+        self._skip_ws()
+        if self.pos >= len(self.text):
+            raise SnbtError("Unexpected end of SNBT")
+        return self.text[self.pos]
+
+    def _expect(self, ch):
+        if self._peek() != ch:
+            raise SnbtError(f"Expected '{ch}' at {self.pos}")
+        self.pos += 1
+
+    def value(self):
+        ch = self._peek()
+        if ch == "{":
+            return self.compound()
+        if ch == "[":
+            return self.list()
+        if ch == '"' or ch == "'":
+            return self.quoted()
+        return self.scalar()
+
+    def compound(self):
+        self._expect("{")
+        result = {}
+        if self._peek() == "}":
+            self.pos += 1
+            return result
+        while True:
+            ch = self._peek()
+            if ch == '"' or ch == "'":
+                key = self.quoted()
+            else:
+                match = _UNQUOTED.match(self.text, self.pos)
+                if not match:
+                    raise SnbtError(f"Expected key at {self.pos}")
+                key = match.group(0)
+                self.pos = match.end()
+            self._expect(":")
+            result[key] = self.value()
+            ch = self._peek()
+            self.pos += 1
+            if ch == ",":
+                continue
+            if ch == "}":
+                return result
+            raise SnbtError(f"Expected ',' or '}}' at {self.pos - 1}")
+
+    def list(self):
+        start = self.pos
+        if self.lazy_threshold and len(self.text) - start > self.lazy_threshold:
+            end = self._find_close(start)
+            if end - start > self.lazy_threshold:
+                self.pos = end
+                return LazyList(self.text[start:end], self.lazy_threshold)
+        return self.list_eager()
+
+    def list_eager(self):
+        self._expect("[")
+        items = []
+        # Typed arrays: [B; 1b, 2b], [I; 1, 2], [L; 1L, 2L]
+        self._skip_ws()
+        text = self.text
+        if self.pos + 1 < len(text) and text[self.pos] in "BIL":
+            probe = self.pos + 1
+            while probe < len(text) and text[probe] in _WHITESPACE:
+                probe += 1
+            if probe < len(text) and text[probe] == ";":
+                self.pos = probe + 1
+        if self._peek() == "]":
+            self.pos += 1
+            return items
+        while True:
+            items.append(self.value())
+            ch = self._peek()
+            self.pos += 1
+            if ch == ",":
+                continue
+            if ch == "]":
+                return items
+            raise SnbtError(f"Expected ',' or ']' at {self.pos - 1}")
+
+    def quoted(self):
+        text = self.text
+        quote = text[self.pos]
+        pos = self.pos + 1
+        chunks = []
+        while True:
+            end = text.find(quote, pos)
+            if end == -1:
+                raise SnbtError("Unterminated string")
+            backslash = text.find("\\", pos, end)
+            if backslash == -1:
+                chunks.append(text[pos:end])
+                self.pos = end + 1
+                return "".join(chunks)
+            chunks.append(text[pos:backslash])
+            if backslash + 1 < len(text):
+                chunks.append(text[backslash + 1])
+            pos = backslash + 2
+
+    def scalar(self):
+        match = _UNQUOTED.match(self.text, self.pos)
+        if not match:
+            raise SnbtError(f"Unexpected character at {self.pos}")
+        token = match.group(0)
+        self.pos = match.end()
+        if token == "true":
+            return True
+        if token == "false":
+            return False
+        if _INT.match(token):
+            return int(token.rstrip("bBsSlLiI"))
+        if _FLOAT.match(token):
+            return float(token.rstrip("fFdD"))
+        return token
+
+    def _find_close(self, start):
+        """Index just past the bracket that closes the one at start, skipping quoted text"""
+        text = self.text
+        depth = 0
+        pos = start
+        while True:
+            match = _STRUCTURAL.search(text, pos)
+            if not match:
+                raise SnbtError("Unbalanced brackets")
+            ch = match.group(0)
+            pos = match.end()
+            if ch == '"' or ch == "'":
+                while True:
+                    end = text.find(ch, pos)
+                    if end == -1:
+                        raise SnbtError("Unterminated string")
+                    backslashes = 0
+                    while text[end - 1 - backslashes] == "\\":
+                        backslashes += 1
+                    pos = end + 1
+                    if backslashes % 2 == 0:
+                        break
+            elif ch in "[{":
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return pos
+
+
+def parse(text, lazy_threshold=LAZY_THRESHOLD):
+    """Parse an SNBT value into dict/list/int/float/str/bool. Large lists come back as LazyList."""
+    if text is None:
+        raise SnbtError("No SNBT given")
+    parser = _Parser(text, lazy_threshold)
+    return parser.value()
+
+
+def try_parse(text, lazy_threshold=LAZY_THRESHOLD):
+    """parse() that returns None instead of raising"""
+    if not text:
+        return None
+    try:
+        return parse(text, lazy_threshold)
+    except (SnbtError, IndexError, ValueError):
+        return None
+
+
+def extract_entity_data(line):
+    """Raw SNBT after '<name> has the following entity data:' or None"""
+    if not line:
+        return None
+    match = _ENTITY_DATA.search(line)
+    if not match:
+        return None
+    return line[match.end():].strip()
+
+
+def parse_entity_data(line, lazy_threshold=LAZY_THRESHOLD):
+    """Decode the value of a `data get entity` response line"""
+    return try_parse(extract_entity_data(line), lazy_threshold)
@@ -1,10 +1,11 @@
 import time
 import sys
 import os
-import re
 
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+from world import snbt
+
 try:
     from integrations.dynmap_engine import dynmap
     DYNMAP_AVAILABLE = True
@@ -97,31 +98,20 @@ class WorldIntelligence:
         if not _server_manager or not _server_manager.is_running():
             return None
         
-        _server_manager.send_command(f"execute at {player_name} run data get entity {player_name} Pos")
-        time.sleep(0.8)
-        
-        recent_lines = _server_manager.output_lines[-80:]
-        
-        ansi_escape = re.compile(r'\x1b\[[0-9;]*m')
+        # Entity-query path: whole-name reply match, so Bob's query never takes Bobby's position
+        query = _server_manager._submit_entity_query(
+            player_name, "Pos", command=f"execute at {player_name} run data get entity {player_name} Pos"
+        )
+        line = _server_manager._await_entity_query(query, timeout=2.0)
+        if not line:
+            return None
         
-        for line in recent_lines:
-            clean_line = ansi_escape.sub('', line)
-            
-            if player_name.lower() in clean_line.lower() and "entity data" in clean_line.lower():
-                if ":" in clean_line:
-                    data_part = clean_line.split(":", 1)[1]
-                    match = re.search(r'\[([^\]]+)\]', data_part)
-                    if match:
-                        coords_str = match.group(1)
-                        parts = [p.strip().rstrip('d').rstrip('D') for p in coords_str.split(',')]
-                        if len(parts) >= 3:
-                            try:
-                                x = float(parts[0])
-                                y = float(parts[1])
-                                z = float(parts[2])
-                                return {"x": x, "y": y, "z": z, "world": "world"}
-                            except:
-                                pass
+        pos = snbt.parse_entity_data(line)
+        if isinstance(pos, list) and len(pos) >= 3:
+            try:
+                return {"x": float(pos[0]), "y": float(pos[1]), "z": float(pos[2]), "world": "world"}
+            except (TypeError, ValueError):
+                pass
         return None
     
     def get_player_info(self, player_name):